@@ -0,0 +1,63 @@
+"""
+app/cache.py
+Cache LRU de respostas JSON com orçamento em bytes
+
+As respostas ficam já serializadas (bytes), então o tamanho contabilizado é
+o tamanho real da entrada e um acerto não precisa serializar de novo. Ao
+ultrapassar o orçamento, as entradas menos usadas recentemente são
+descartadas; respostas maiores que `fracao_max_entrada` do orçamento não são
+guardadas, para que um único grafo grande não esvazie o cache.
+"""
+
+from collections import OrderedDict
+
+class CacheResultados:
+    """Cache LRU (por processo) limitado pelo total de bytes armazenados"""
+
+    def __init__(self, limite_bytes: int, fracao_max_entrada: float = 0.1):
+        self.limite_bytes = limite_bytes
+        self.max_entrada = int(limite_bytes * fracao_max_entrada)
+        self._entradas = OrderedDict()
+        self.tamanho = 0
+        self.acertos = 0
+        self.falhas = 0
+
+    @property
+    def ativo(self) -> bool:
+        return self.limite_bytes > 0
+
+    def obter(self, chave):
+        """Retorna os bytes guardados para `chave` ou None"""
+        conteudo = self._entradas.get(chave)
+        if conteudo is None:
+            self.falhas += 1
+            return None
+        self._entradas.move_to_end(chave)
+        self.acertos += 1
+        return conteudo
+
+    def guardar(self, chave, conteudo: bytes):
+        """Guarda a resposta e descarta as menos recentes acima do orçamento"""
+        if len(conteudo) > self.max_entrada:
+            return
+        anterior = self._entradas.pop(chave, None)
+        if anterior is not None:
+            self.tamanho -= len(anterior)
+        self._entradas[chave] = conteudo
+        self.tamanho += len(conteudo)
+        while self.tamanho > self.limite_bytes:
+            _, removido = self._entradas.popitem(last=False)
+            self.tamanho -= len(removido)
+
+    def limpar(self):
+        self._entradas.clear()
+        self.tamanho = 0
+
+    def estatisticas(self) -> dict:
+        return {
+            "entradas": len(self._entradas),
+            "tamanho_bytes": self.tamanho,
+            "limite_bytes": self.limite_bytes,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+        }
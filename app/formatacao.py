@@ -0,0 +1,189 @@
+"""
+app/formatacao.py
+Formatação do documento completo de CNPJ (compartilhada entre API e importador)
+"""
+
+import re
+
+# ============ MAPEAMENTOS ============
+PORTE_EMPRESA_MAP = {
+    "00": "00 - NÃO INFORMADO",
+    "01": "01 - MICRO EMPRESA",
+    "03": "03 - EMPRESA DE PEQUENO PORTE",
+    "05": "05 - DEMAIS"
+}
+
+MATRIZ_FILIAL_MAP = {
+    "1": "1 - MATRIZ",
+    "2": "2 - FILIAL"
+}
+
+SITUACAO_CADASTRAL_MAP = {
+    "01": "01 - NULA",
+    "02": "02 - ATIVA",
+    "03": "03 - SUSPENSA",
+    "04": "04 - INAPTA",
+    "08": "08 - BAIXADA"
+}
+
+IDENTIFICADOR_SOCIO_MAP = {
+    "1": "1 - PESSOA JURÍDICA",
+    "2": "2 - PESSOA FÍSICA",
+    "3": "3 - ESTRANGEIRO"
+}
+
+FAIXA_ETARIA_MAP = {
+    "0": "0 - Não se aplica",
+    "1": "1 - 0 a 12 anos",
+    "2": "2 - 13 a 20 anos",
+    "3": "3 - 21 a 30 anos",
+    "4": "4 - 31 a 40 anos",
+    "5": "5 - 41 a 50 anos",
+    "6": "6 - 51 a 60 anos",
+    "7": "7 - Acima de 60 anos",
+    "8": "8 - 71 a 80 anos",
+    "9": "9 - Acima de 80 anos"
+}
+
+QUALIFICACAO_REPRESENTANTE_MAP = {
+    "00": "00 - Não informada"
+}
+
+# ============ FUNÇÕES AUXILIARES ============
+
+def mascarar_cpf(cpf_cnpj: str) -> str:
+    """Mascara CPF/CNPJ para privacidade"""
+    if not cpf_cnpj:
+        return cpf_cnpj
+    if len(cpf_cnpj) == 11:
+        return f"***{cpf_cnpj[3:9]}**"
+    elif len(cpf_cnpj) == 14:
+        return f"***{cpf_cnpj[6:9]}**"
+    return cpf_cnpj
+
+def limpar_espacos(texto):
+    """Remove espaços extras"""
+    if not texto:
+        return ""
+    return re.sub(r'\s+', ' ', str(texto)).strip()
+
+def formatar_descricao(codigo, descricao):
+    """Formata código + descrição de tabela auxiliar ("codigo - descricao")"""
+    if not codigo:
+        return None
+    if descricao:
+        return f"{codigo} - {descricao}"
+    return codigo
+
+def codigos_necessarios(est_dict, emp_dict, socios_dicts):
+    """Lista os pares (tabela, codigo) usados na formatação do documento"""
+    pares = {
+        ("municipio", est_dict.get("municipio")),
+        ("natureza_juridica", emp_dict.get("natureza_juridica")),
+        ("motivo", est_dict.get("motivo_situacao_cadastral")),
+        ("cnae", est_dict.get("cnae_fiscal")),
+        ("qualificacao_socio", emp_dict.get("qualificacao_responsavel")),
+    }
+    if est_dict.get("cnae_fiscal_secundaria"):
+        for cnae_sec in est_dict["cnae_fiscal_secundaria"].split(","):
+            if cnae_sec.strip():
+                pares.add(("cnae", cnae_sec.strip()))
+    for socio_dict in socios_dicts:
+        pares.add(("qualificacao_socio", socio_dict.get("qualificacao_socio")))
+        pares.add(("pais", socio_dict.get("pais")))
+        pares.add(("qualificacao_socio", socio_dict.get("qualificacao_representante_legal")))
+    return {(tabela, codigo) for tabela, codigo in pares if codigo}
+
+def formatar_cnpj_completo(cnpj, est_dict, emp_dict, simp_dict, socios_dicts, descricoes):
+    """
+    Monta o documento completo do CNPJ a partir das linhas já carregadas.
+
+    `descricoes` mapeia (tabela, codigo) para o texto já formatado por
+    `formatar_descricao`; códigos ausentes resultam em None.
+    """
+    def descricao(tabela, codigo):
+        return descricoes.get((tabela, codigo)) if codigo else None
+
+    # Formatações básicas
+    porte_empresa_formatado = PORTE_EMPRESA_MAP.get(emp_dict.get("porte_empresa"), emp_dict.get("porte_empresa"))
+    matriz_filial_formatado = MATRIZ_FILIAL_MAP.get(est_dict.get("matriz_filial"), est_dict.get("matriz_filial"))
+    situacao_cadastral_formatado = SITUACAO_CADASTRAL_MAP.get(est_dict.get("situacao_cadastral"), est_dict.get("situacao_cadastral"))
+    opcao_simples_formatado = "SIM" if simp_dict.get("opcao_simples") == "S" else "NÃO"
+    opcao_mei_formatado = "SIM" if simp_dict.get("opcao_mei") == "S" else "NÃO"
+
+    complemento_limpo = limpar_espacos(est_dict.get("complemento"))
+
+    # CNAEs secundários
+    cnae_fiscal_secundaria_formatado = []
+    if est_dict.get("cnae_fiscal_secundaria"):
+        for cnae_sec in est_dict["cnae_fiscal_secundaria"].split(","):
+            cnae_sec = cnae_sec.strip()
+            if cnae_sec:
+                descricao_cnae = descricao("cnae", cnae_sec)
+                if descricao_cnae:
+                    cnae_fiscal_secundaria_formatado.append(descricao_cnae)
+
+    # Monta objeto empresa
+    empresa = {
+        "cnpj": cnpj,
+        "cnpj_basico": est_dict.get("cnpj_basico"),
+        "razao_social": emp_dict.get("razao_social"),
+        "nome_fantasia": est_dict.get("nome_fantasia"),
+        "porte_empresa": porte_empresa_formatado,
+        "tipo_logradouro": est_dict.get("tipo_logradouro"),
+        "logradouro": est_dict.get("logradouro"),
+        "numero": est_dict.get("numero"),
+        "complemento": complemento_limpo,
+        "bairro": est_dict.get("bairro"),
+        "cep": est_dict.get("cep"),
+        "uf": est_dict.get("uf"),
+        "municipio": descricao("municipio", est_dict.get("municipio")),
+        "ddd1": est_dict.get("ddd1"),
+        "telefone1": est_dict.get("telefone1"),
+        "ddd2": est_dict.get("ddd2"),
+        "telefone2": est_dict.get("telefone2"),
+        "ddd_fax": est_dict.get("ddd_fax"),
+        "fax": est_dict.get("fax"),
+        "correio_eletronico": est_dict.get("correio_eletronico"),
+        "data_inicio_atividades": est_dict.get("data_inicio_atividades"),
+        "cnpj_ordem": est_dict.get("cnpj_ordem"),
+        "cnpj_dv": est_dict.get("cnpj_dv"),
+        "matriz_filial": matriz_filial_formatado,
+        "capital_social": float(emp_dict.get("capital_social", 0)) if emp_dict.get("capital_social") else 0,
+        "ente_federativo_responsavel": emp_dict.get("ente_federativo_responsavel"),
+        "situacao_cadastral": situacao_cadastral_formatado,
+        "pais": est_dict.get("pais"),
+        "nome_cidade_exterior": est_dict.get("nome_cidade_exterior"),
+        "data_situacao_cadastral": est_dict.get("data_situacao_cadastral"),
+        "motivo_situacao_cadastral": descricao("motivo", est_dict.get("motivo_situacao_cadastral")),
+        "cnae_fiscal": descricao("cnae", est_dict.get("cnae_fiscal")),
+        "cnae_fiscal_secundaria": cnae_fiscal_secundaria_formatado,
+        "situacao_especial": est_dict.get("situacao_especial"),
+        "data_situacao_especial": est_dict.get("data_situacao_especial"),
+        "natureza_juridica": descricao("natureza_juridica", emp_dict.get("natureza_juridica")),
+        "qualificacao_responsavel": descricao("qualificacao_socio", emp_dict.get("qualificacao_responsavel")),
+        "opcao_simples": opcao_simples_formatado,
+        "data_opcao_simples": simp_dict.get("data_opcao_simples"),
+        "data_exclusao_simples": simp_dict.get("data_exclusao_simples"),
+        "opcao_mei": opcao_mei_formatado,
+        "data_opcao_mei": simp_dict.get("data_opcao_mei"),
+        "data_exclusao_mei": simp_dict.get("data_exclusao_mei")
+    }
+
+    socios_list = []
+    for socio_dict in socios_dicts:
+        socios_list.append({
+            "cnpj": socio_dict.get("cnpj"),
+            "identificador_de_socio": IDENTIFICADOR_SOCIO_MAP.get(socio_dict.get("identificador_de_socio"), socio_dict.get("identificador_de_socio")),
+            "nome_socio": socio_dict.get("nome_socio"),
+            "cnpj_cpf_socio": mascarar_cpf(socio_dict.get("cnpj_cpf_socio")),
+            "qualificacao_socio": descricao("qualificacao_socio", socio_dict.get("qualificacao_socio")),
+            "data_entrada_sociedade": socio_dict.get("data_entrada_sociedade"),
+            "pais": descricao("pais", socio_dict.get("pais")),
+            "representante_legal": mascarar_cpf(socio_dict.get("representante_legal")),
+            "nome_representante": socio_dict.get("nome_representante"),
+            "qualificacao_representante_legal": descricao("qualificacao_socio", socio_dict.get("qualificacao_representante_legal")),
+            "faixa_etaria": FAIXA_ETARIA_MAP.get(socio_dict.get("faixa_etaria"), socio_dict.get("faixa_etaria"))
+        })
+
+    return {"empresa": empresa, "socios": socios_list}
@@ -0,0 +1,179 @@
+"""
+app/jobs.py
+Jobs assíncronos para análises pesadas (ex.: rede com nivel 4-6)
+
+O job é gravado em security.jobs e executado em um ProcessPoolExecutor à
+parte: o processo filho abre as próprias conexões (sem pool, com
+statement_timeout), respeita o orçamento de tempo JOBS_TEMPO_MAX_S e grava o
+resultado (JSON comprimido com gzip) na linha do job. A API só insere e
+consulta a tabela, então status e resultado são vistos por qualquer worker.
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger(__name__)
+
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+JOBS_TEMPO_MAX_S = float(os.getenv("JOBS_TEMPO_MAX_S", "300"))
+JOBS_RETENCAO_H = int(os.getenv("JOBS_RETENCAO_H", "24"))
+JOBS_MAX_POR_USUARIO = int(os.getenv("JOBS_MAX_POR_USUARIO", "3"))
+
+# Identifica o pool deste processo da API: cada job guarda o processo que o
+# enfileirou, para saber quais jobs nenhum pool vivo vai mais executar
+PROCESSO_ID = uuid.uuid4().hex
+
+SQL_CRIAR_JOB = text("""
+    INSERT INTO security.jobs (id, user_email, tipo, parametros, status, processo)
+    VALUES (:id, :email, :tipo, CAST(:parametros AS JSONB), 'pendente', :processo)
+""")
+
+SQL_JOBS_ATIVOS = text("""
+    SELECT COUNT(*)
+    FROM security.jobs
+    WHERE user_email = :email AND status IN ('pendente', 'executando')
+""")
+
+# Remove jobs antigos e marca como erro os que ficaram presos. Um job em
+# execução além do limite indica que o pool que o rodava morreu (o filho
+# respeita JOBS_TEMPO_MAX_S); os pendentes do mesmo pool não vão mais
+# iniciar. Pendentes de pools vivos nunca expiram pela idade: só esperam na
+# fila. No shutdown, SQL_ENCERRAR_JOBS_PROCESSO marca os do próprio pool.
+SQL_REMOVER_JOBS_ANTIGOS = text("""
+    DELETE FROM security.jobs
+    WHERE criado_em < now() - make_interval(hours => :retencao_h)
+""")
+
+SQL_MARCAR_JOBS_PRESOS = text("""
+    UPDATE security.jobs
+    SET status = 'erro',
+        erro = CASE WHEN status = 'pendente' THEN 'Job não iniciado' ELSE 'Job interrompido' END,
+        concluido_em = now()
+    WHERE (status = 'executando' AND iniciado_em < now() - make_interval(secs => :limite_s))
+       OR (status = 'pendente' AND processo IN (
+            SELECT processo FROM security.jobs
+            WHERE status = 'executando'
+              AND iniciado_em < now() - make_interval(secs => :limite_s)
+       ))
+""")
+
+SQL_ENCERRAR_JOBS_PROCESSO = text("""
+    UPDATE security.jobs
+    SET status = 'erro', erro = 'Job interrompido (API encerrada)', concluido_em = now()
+    WHERE processo = :processo AND status IN ('pendente', 'executando')
+""")
+
+SQL_STATUS_JOB = text("""
+    SELECT id, tipo, parametros::TEXT AS parametros, status, erro, criado_em, iniciado_em, concluido_em,
+           octet_length(resultado) AS tamanho_bytes
+    FROM security.jobs
+    WHERE id = :id AND user_email = :email
+""")
+
+SQL_RESULTADO_JOB = text("""
+    SELECT status, resultado
+    FROM security.jobs
+    WHERE id = :id AND user_email = :email
+""")
+
+SQL_INICIAR_JOB = text("""
+    UPDATE security.jobs
+    SET status = 'executando', iniciado_em = now()
+    WHERE id = :id AND status = 'pendente'
+""")
+
+SQL_CONCLUIR_JOB = text("""
+    UPDATE security.jobs
+    SET status = :status, erro = :erro, resultado = :resultado, concluido_em = now()
+    WHERE id = :id
+""")
+
+_executor = None
+
+def executor():
+    """Pool de processos dos jobs (criado no primeiro uso)"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=JOBS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+async def encerrar(session):
+    """Encerra o pool de processos e marca seus jobs como interrompidos (shutdown da API)"""
+    if _executor is None:
+        return
+    _executor.shutdown(wait=False, cancel_futures=True)
+    try:
+        await session.execute(SQL_ENCERRAR_JOBS_PROCESSO, {"processo": PROCESSO_ID})
+        await session.commit()
+    except Exception as e:
+        logger.warning(f"Não foi possível marcar os jobs interrompidos: {e}")
+
+async def criar_job(session, email, tipo, parametros):
+    """Grava o job como pendente e o envia ao pool; retorna o id"""
+    await session.execute(SQL_REMOVER_JOBS_ANTIGOS, {"retencao_h": JOBS_RETENCAO_H})
+    await session.execute(SQL_MARCAR_JOBS_PRESOS, {"limite_s": JOBS_TEMPO_MAX_S * 2})
+    ativos = (await session.execute(SQL_JOBS_ATIVOS, {"email": email})).scalar()
+    if ativos >= JOBS_MAX_POR_USUARIO:
+        return None
+
+    job_id = uuid.uuid4().hex
+    await session.execute(SQL_CRIAR_JOB, {
+        "id": job_id, "email": email, "tipo": tipo, "parametros": json.dumps(parametros),
+        "processo": PROCESSO_ID
+    })
+    await session.commit()
+    executor().submit(executar_job, job_id, tipo, parametros)
+    return job_id
+
+def executar_job(job_id, tipo, parametros):
+    """Ponto de entrada no processo filho"""
+    asyncio.run(_executar_job(job_id, tipo, parametros))
+
+async def _executar_job(job_id, tipo, parametros):
+    # Importado no filho: o router carrega as consultas e o grafo CSR
+    from .routers import cruzamentos
+
+    engine = create_async_engine(
+        cruzamentos.DATABASE_URL,
+        poolclass=NullPool,
+        connect_args={"server_settings": {"statement_timeout": str(int(JOBS_TEMPO_MAX_S * 1000))}}
+    )
+    sessoes = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with engine.begin() as conn:
+            iniciado = await conn.execute(SQL_INICIAR_JOB, {"id": job_id})
+        if iniciado.rowcount == 0:
+            # Já marcado como erro (API encerrada) ou removido
+            return
+
+        status, erro, resultado = "concluido", None, None
+        try:
+            produzir = cruzamentos.TIPOS_JOB[tipo]
+            dados = await asyncio.wait_for(produzir(sessoes, **parametros), JOBS_TEMPO_MAX_S)
+            resultado = gzip.compress(json.dumps(dados, ensure_ascii=False, default=str).encode("utf-8"))
+        except asyncio.TimeoutError:
+            status, erro = "erro", f"Tempo máximo de {JOBS_TEMPO_MAX_S:.0f}s excedido"
+        except Exception as e:
+            logger.exception(f"Job {job_id} ({tipo}) falhou")
+            status, erro = "erro", str(e)
+
+        async with engine.begin() as conn:
+            await conn.execute(SQL_CONCLUIR_JOB, {
+                "id": job_id, "status": status, "erro": erro, "resultado": resultado
+            })
+    finally:
+        await engine.dispose()
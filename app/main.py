@@ -24,6 +24,7 @@ load_dotenv()
 # Importa routers
 from app.routers import cnpj_router, cruzamentos
 from app.auth import security_api
+from app import jobs
 from app.auth.dependencies import get_current_user
 
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -348,11 +349,22 @@ async def root():
                 "enderecos_compartilhados": "GET /api/cruzamentos/enderecos/compartilhados",
                 "emails_compartilhados": "GET /api/cruzamentos/emails/compartilhados",
                 "telefones_compartilhados": "GET /api/cruzamentos/telefones/compartilhados",
+                "emails_compartilhados_lote": "POST /api/cruzamentos/emails/compartilhados/lote",
+                "telefones_compartilhados_lote": "POST /api/cruzamentos/telefones/compartilhados/lote",
+                "enderecos_compartilhados_lote": "POST /api/cruzamentos/enderecos/compartilhados/lote",
                 "enderecos_duplicados": "GET /api/cruzamentos/enderecos/duplicados",
                 "telefones_duplicados": "GET /api/cruzamentos/telefones/duplicados",
                 "emails_duplicados": "GET /api/cruzamentos/emails/duplicados",
                 "vinculos": "GET /api/cruzamentos/vinculos/{cnpj}",
                 "rede": "GET /api/cruzamentos/rede/{cnpj}",
+                "rede_pessoa": "GET /api/cruzamentos/rede/pessoa?cpf_mascarado=&nome=",
+                "ranking": "GET /api/cruzamentos/ranking?tipo=pj|pf|pe|todos",
+                "similares": "GET /api/cruzamentos/similares/{cnpj}",
+                "subgrafo": "POST /api/cruzamentos/subgrafo",
+                "jobs": "POST /api/cruzamentos/jobs, GET /api/cruzamentos/jobs/{id}[/resultado]",
+                "rede_export": "GET /api/cruzamentos/rede/{cnpj}/export?formato=graphml|gexf|cytoscape|ndjson",
+                "caminho": "GET /api/cruzamentos/caminho?origem=&destino=",
+                "grupo": "GET /api/cruzamentos/grupo/{cnpj}",
                 "grupo_economico": "GET /api/cruzamentos/analise/grupo_economico/{cnpj}"
             }
         },
@@ -596,6 +608,8 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Executa ao desligar a aplicação"""
+    async with cruzamentos.AsyncSessionLocal() as session:
+        await jobs.encerrar(session)
     logger.info("=" * 60)
     logger.info("👋 CNPJ API encerrando...")
     logger.info("=" * 60)
@@ -0,0 +1,189 @@
+"""
+app/normalizacao.py
+Normalização de endereços, telefones e emails (compartilhada entre API e
+importador)
+
+As chaves de links.link_ete (EN_..., TE_..., EM_...) são geradas pelo
+importador com estas funções; a API usa as mesmas regras para montar as
+chaves de busca.
+"""
+
+import re
+import string
+import unicodedata
+
+dicAbreviaturas = {
+    "A":"AREA", "AC":"ACESSO", "ACA":"ACAMPAMENTO", "AD":"ADRO",
+    "AE":"AREA ESPECIAL", "AER":"AEROPORTO", "AL":"ALAMEDA", "AR":"AREA",
+    "ART":"ARTERIA", "AT":"ALTO", "ATL":"ATALHO", "AV":"AVENIDA",
+    "AVEN":"AVENIDA", "AVC":"AVENIDA CONTORNO", "BAL":"BALNEARIO", "BC":"BECO",
+    "BEL":"BELVEDERE", "BL":"BLOCO", "BSQ":"BOSQUE", "BVD":"BOULEVARD",
+    "BX":"BAIXA", "CAL":"CALCADA", "CAM":"CAMINHO", "CAN":"CANAL",
+    "CH":"CHACARA", "CHA":"CHAPADAO", "CIR":"CIRCULAR", "CJ":"CONJUNTO",
+    "CMP":"COMPLEXO VIARIO", "CND":"CONDOMINIO", "COL":"COLONIA",
+    "CON":"CONDOMINIO", "COR":"CORREDOR", "CPO":"CAMPO", "CRG":"CORREGO",
+    "DSC":"DESCIDA", "DSV":"DESVIO", "DT":"DISTRITO", "ENT":"ENTRADA PARTICULAR",
+    "EQ":"ENTREQUADRA", "ESC":"ESCADA", "ESP":"ESPLANADA", "EST":"ESTRADA",
+    "ETC":"ESTACAO", "ETD":"ESTADIO", "ETN":"ESTANCIA", "EVD":"ELEVADA",
+    "FAV":"FAVELA", "FAZ":"FAZENDA", "FER":"FERROVIA", "FNT":"FONTE",
+    "FRA":"FEIRA", "FTE":"FORTE", "GJA":"GRANJA", "HAB":"HABITACIONAL",
+    "IA":"ILHA", "JD":"JARDIM", "LAD":"LADEIRA", "LD":"LADEIRA",
+    "LG":"LAGO", "LGA":"LAGO", "LGO":"LARGO", "LOT":"LOTEAMENTO",
+    "LRG":"LARGO", "MNA":"MARINA", "MOD":"MODULO", "MRO":"MORRO",
+    "MTE":"MONTE", "NUC":"NUCLEO", "OTR":"OUTROS", "PAR":"PARALELA",
+    "PAS":"PASSARELA", "PAT":"PATIO", "PC":"PRACA", "PCA":"PRACA",
+    "PDA":"PARADA", "PDO":"PARADOURO", "PNT":"PONTA", "PQ":"PARQUE",
+    "PR":"PRAIA", "PRL":"PROLONGAMENTO", "PRQ":"PARQUE", "PSA":"PASSARELA",
+    "PSG":"PASSAGEM", "PTE":"PONTE", "PTO":"PATIO", "Q":"QUADRA",
+    "QD":"QUADRA", "QTA":"QUINTAS", "R":"RUA", "RAM":"RAMAL",
+    "RDV":"RODOVIA", "REC":"RECANTO", "RER":"RETIRO", "RES":"RESIDENCIAL",
+    "RET":"RETA", "RMP":"RAMPA", "ROD":"RODOVIA", "ROT":"ROTULA",
+    "RTN":"RETORNO", "RTT":"ROTATORIA", "SIT":"SITIO", "SRV":"SERVIDAO",
+    "ST":"SETOR", "SUB":"SUBIDA", "TCH":"TRINCHEIRA", "TER":"TERMINAL",
+    "TR":"TRAVESSA", "TRV":"TREVO", "TV":"TRAVESSA", "UNI":"UNIDADE",
+    "V":"VIA", "VAL":"VALE", "VD":"VIADUTO", "VER":"VEREDA",
+    "VEV":"VIELA", "VEX":"VIAEXPRESSA", "VIA":"VIA", "VL":"VILA",
+    "VLA":"VIELA", "VLE":"VALE", "VRT":"VARIANTE"
+}
+
+def soCaracteres(data):
+    if data is None:
+        return ''
+    t = ''.join(x for x in unicodedata.normalize('NFKD', data) if x in string.printable)
+    return re.sub(r'\W', ' ', t)
+
+def normalizaEndereco(enderecoIn, ignoraEnderecoSoComNumeros=True, ignoraEnderecoSemNumeros=True):
+    if not enderecoIn:
+        return ''
+    
+    enderecoAux = re.sub(r'([0-9]+)[.]([0-9]+)', '\\1\\2', enderecoIn).upper()
+    enderecoAux = re.sub(r'([A-Z])(\d)', '\\1 \\2', enderecoAux)
+    enderecoAux = re.sub(r'(\d)([A-Z])', '\\1 \\2', enderecoAux)
+    
+    enderecoAux = " %s " % (soCaracteres(enderecoAux))
+    enderecoAux = enderecoAux.replace(' S N ', ' ')
+    lendereco = enderecoAux.split()
+    
+    if len(lendereco) == 0:
+        return ''
+    
+    if lendereco[0] == 'LOC':
+        lendereco[0] = ''
+    
+    palavras = set()
+    numeros = []
+    
+    for k, pedaco in enumerate(lendereco):
+        pedacoAjustado = pedaco
+        if pedaco in dicAbreviaturas:
+            if len(pedaco) > 1 or k <= 1:
+                pedacoAjustado = dicAbreviaturas[pedaco]
+        
+        if pedacoAjustado:
+            if pedacoAjustado.isdigit():
+                pedacoAjustado = pedacoAjustado.lstrip('0')
+                if pedacoAjustado:
+                    numeros.append(pedacoAjustado)
+            else:
+                palavras.add(pedacoAjustado)
+    
+    palavrasOrdenadas = sorted(list(palavras))
+    
+    if ignoraEnderecoSemNumeros and not numeros:
+        return ''
+    
+    if ignoraEnderecoSoComNumeros and not palavrasOrdenadas:
+        return ''
+    
+    palavrasOrdenadas.extend(numeros)
+    endereco = ' '.join(palavrasOrdenadas)
+    return endereco
+
+def ajustaTelefone(telefoneIn):
+    if not telefoneIn or telefoneIn == '0 0':
+        return ''
+    
+    telefoneIn = ' '.join(telefoneIn.split()).strip()
+    
+    if telefoneIn[-7:] in ('0000000', '1111111', '2222222', '3333333', '4444444',
+                           '5555555', '6666666', '7777777', '8888888', '9999999'):
+        return ''
+    
+    if ' ' in telefoneIn:
+        pos = telefoneIn.find(' ')
+        ddd, t = telefoneIn[:pos], re.sub(' ', '', telefoneIn[pos:])
+        if len(ddd) > 2:
+            ddd = ddd[-2:]
+        if len(t) < 4:
+            return ''
+        return ddd + ' ' + t
+    elif len(telefoneIn) < 9:
+        return ''
+    else:
+        return telefoneIn
+
+def ajusta_email(emailin):
+    if not emailin:
+        return ''
+    
+    emailin = str(emailin).strip()
+    if emailin.startswith("'"):
+        emailin = emailin[1:]
+    if emailin.endswith("'"):
+        emailin = emailin[:-1]
+    
+    if '@' not in emailin:
+        return ''
+    
+    return emailin.lower()
+
+def telefone_de_entrada(valor):
+    """
+    Normaliza telefone informado pelo usuário com as regras do importador.
+
+    Aceita "11 3456-7890", "(11) 34567890", "1134567890" etc.: se houver um
+    primeiro bloco curto separado, ele é o DDD; senão, os dois primeiros
+    dígitos.
+    """
+    blocos = re.sub(r'[^\d ]', ' ', valor or '').split()
+    if not blocos:
+        return ''
+    if len(blocos) > 1 and len(blocos[0]) <= 3:
+        ddd, numero = blocos[0], ''.join(blocos[1:])
+    else:
+        digitos = ''.join(blocos)
+        ddd, numero = digitos[:2], digitos[2:]
+    return ajustaTelefone(f"{ddd} {numero}")
+
+def municipio_de_entrada(valor):
+    """Município/UF como gravados pela Receita: maiúsculas, sem acentos"""
+    sem_acento = ''.join(
+        c for c in unicodedata.normalize('NFKD', valor or '') if not unicodedata.combining(c)
+    )
+    return ' '.join(sem_acento.upper().split())
+
+# Tipos de logradouro (abreviados ou por extenso); na base da Receita ficam
+# em tipo_logradouro, fora do logradouro usado na chave do importador
+TIPOS_LOGRADOURO = set(dicAbreviaturas) | set(dicAbreviaturas.values())
+
+def sem_tipo_logradouro(logradouro):
+    """Remove o tipo no início do logradouro ('Av. Paulista' -> 'PAULISTA')"""
+    palavras = soCaracteres(logradouro).upper().split()
+    if len(palavras) > 1 and palavras[0] in TIPOS_LOGRADOURO:
+        palavras = palavras[1:]
+    return ' '.join(palavras)
+
+def endereco_de_entrada(logradouro, numero='', complemento='', municipio='', uf=''):
+    """
+    Monta a chave de endereço (sem o prefixo EN_) a partir dos campos brutos.
+
+    Mesmo formato do importador: normalizaEndereco("logradouro número
+    complemento") + "-MUNICÍPIO-UF", com o logradouro sem o tipo (AV, RUA
+    etc.), que o importador não inclui. Retorna '' se o endereço for
+    descartado pela normalização (sem número, só números etc.).
+    """
+    logradouro = sem_tipo_logradouro(logradouro)
+    endereco = normalizaEndereco(' '.join(p for p in (logradouro, numero, complemento) if p))
+    if not endereco:
+        return ''
+    return f"{endereco}-{municipio_de_entrada(municipio)}-{municipio_de_entrada(uf)}"
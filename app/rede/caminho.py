@@ -0,0 +1,101 @@
+"""
+app/rede/caminho.py
+Menor caminho entre duas entidades da rede (BFS bidirecional)
+
+O algoritmo não conhece o banco: recebe uma função assíncrona
+`vizinhos(fronteira)` que devolve tuplas
+(no, vizinho, origem_real, destino_real, tipo) para todos os nós da
+fronteira. As arestas são percorridas nos dois sentidos; `origem_real` e
+`destino_real` preservam a direção original da ligação.
+"""
+
+import time
+
+def _caminhos_ate(no, pais, limite):
+    """Enumera até `limite` caminhos (listas de passos) da raiz até `no`"""
+    if not pais.get(no):
+        return [[]]
+    caminhos = []
+    for anterior, origem, destino, tipo in pais[no]:
+        for caminho in _caminhos_ate(anterior, pais, limite):
+            caminhos.append(caminho + [(anterior, no, origem, destino, tipo)])
+            if len(caminhos) >= limite:
+                return caminhos
+    return caminhos
+
+def _montar_caminhos(encontros, pais_origem, pais_destino, origem, max_caminhos):
+    """Combina os caminhos dos dois lados em cada nó de encontro"""
+    resultado = []
+    vistos = set()
+    for encontro in encontros:
+        for ida in _caminhos_ate(encontro, pais_origem, max_caminhos):
+            for volta in _caminhos_ate(encontro, pais_destino, max_caminhos):
+                # Passos do lado do destino são percorridos ao contrário
+                passos = ida + [(no, anterior, o, d, t) for anterior, no, o, d, t in reversed(volta)]
+                nos = [origem] + [passo[1] for passo in passos]
+                assinatura = tuple((o, d, t) for _, _, o, d, t in passos)
+                if assinatura in vistos:
+                    continue
+                vistos.add(assinatura)
+                resultado.append({
+                    "nos": nos,
+                    "arestas": [
+                        {"origem": o, "destino": d, "tipo": t}
+                        for _, _, o, d, t in passos
+                    ]
+                })
+                if len(resultado) >= max_caminhos:
+                    return resultado
+    return resultado
+
+async def buscar_caminhos(vizinhos, origem, destino, max_saltos, max_fronteira, prazo, max_caminhos=10):
+    """
+    BFS bidirecional: expande sempre o lado com a menor fronteira.
+
+    Para ao encontrar os menores caminhos, ao atingir `max_saltos`, quando a
+    fronteira a expandir passa de `max_fronteira` nós ou quando
+    `time.monotonic()` ultrapassa `prazo`.
+    """
+    resultado = {"distancia": None, "caminhos": [], "limite_atingido": None}
+    if origem == destino:
+        resultado.update(distancia=0, caminhos=[{"nos": [origem], "arestas": []}])
+        return resultado
+
+    dist = [{origem: 0}, {destino: 0}]
+    pais = [{origem: []}, {destino: []}]
+    fronteiras = [[origem], [destino]]
+
+    for _ in range(max_saltos):
+        if time.monotonic() > prazo:
+            resultado["limite_atingido"] = "tempo"
+            break
+
+        lado = 0 if len(fronteiras[0]) <= len(fronteiras[1]) else 1
+        fronteira = fronteiras[lado]
+        if not fronteira:
+            break
+        if len(fronteira) > max_fronteira:
+            resultado["limite_atingido"] = "fronteira"
+            break
+
+        d, p = dist[lado], pais[lado]
+        nova = []
+        for no, vizinho, origem_real, destino_real, tipo in await vizinhos(fronteira):
+            if vizinho not in d:
+                d[vizinho] = d[no] + 1
+                p[vizinho] = []
+                nova.append(vizinho)
+            if d[vizinho] == d[no] + 1:
+                p[vizinho].append((no, origem_real, destino_real, tipo))
+        fronteiras[lado] = nova
+
+        outro = dist[1 - lado]
+        encontros = [no for no in nova if no in outro]
+        if encontros:
+            menor = min(dist[0][no] + dist[1][no] for no in encontros)
+            encontros = [no for no in encontros if dist[0][no] + dist[1][no] == menor]
+            resultado["distancia"] = menor
+            resultado["caminhos"] = _montar_caminhos(encontros, pais[0], pais[1], origem, max_caminhos)
+            break
+
+    return resultado
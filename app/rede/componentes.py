@@ -0,0 +1,46 @@
+"""
+app/rede/componentes.py
+Componentes conexos da rede com union-find vetorizado (NumPy)
+
+Os nós são inteiros de 0 a n-1 (ids de rede.no). As uniões são feitas em
+lotes de arestas: a cada rodada, a raiz de maior índice de cada par é
+pendurada na de menor índice (np.minimum.at resolve conflitos; os pares que
+perderem voltam na rodada seguinte). Como toda raiz aponta para um índice
+menor, não há ciclos, e a compressão de caminho é feita junto com a busca
+das raízes.
+"""
+
+import numpy as np
+
+class UniaoBusca:
+    """Union-find sobre `n` nós inteiros, com uniões em lote"""
+
+    def __init__(self, n: int):
+        self.pai = np.arange(n, dtype=np.int64)
+
+    def raizes(self, nos=None):
+        """Raiz de cada nó informado (todos, se None), comprimindo os caminhos"""
+        pai = self.pai
+        if nos is None:
+            nos = np.arange(len(pai), dtype=np.int64)
+        r = pai[nos]
+        while True:
+            acima = pai[r]
+            if np.array_equal(acima, r):
+                break
+            r = acima
+        pai[nos] = r
+        return r
+
+    def unir(self, a, b):
+        """Une os pares (a[i], b[i]) de dois arrays de nós"""
+        a = np.asarray(a, dtype=np.int64)
+        b = np.asarray(b, dtype=np.int64)
+        while len(a):
+            ra, rb = self.raizes(a), self.raizes(b)
+            diferentes = ra != rb
+            if not diferentes.any():
+                break
+            a, b = a[diferentes], b[diferentes]
+            ra, rb = ra[diferentes], rb[diferentes]
+            np.minimum.at(self.pai, np.maximum(ra, rb), np.minimum(ra, rb))
@@ -0,0 +1,187 @@
+"""
+app/rede/exportacao.py
+Exportação da rede em streaming (GraphML, GEXF, Cytoscape JSON, NDJSON)
+
+A travessia gera eventos ("node", dict) e ("edge", dict) à medida que cada
+nível é lido; `exportar_stream` os converte em blocos de texto sem montar o
+documento em memória. Formatos que exigem todos os nós antes das arestas
+(GEXF e Cytoscape) acumulam as arestas em um arquivo temporário que só vai
+para o disco acima de LIMITE_MEMORIA_ARESTAS bytes.
+"""
+
+import json
+import tempfile
+from xml.sax.saxutils import escape, quoteattr
+
+TAMANHO_BLOCO = 64 * 1024
+LIMITE_MEMORIA_ARESTAS = 8 * 1024 * 1024
+
+class ExportadorNDJSON:
+    """Um objeto JSON por linha, nós e arestas intercalados"""
+    extensao = "ndjson"
+    media_type = "application/x-ndjson"
+    arestas_no_fim = False
+
+    def inicio(self):
+        return ""
+
+    def no(self, node):
+        return json.dumps({"elemento": "node", **node}, ensure_ascii=False) + "\n"
+
+    def aresta(self, edge):
+        return json.dumps({"elemento": "edge", **edge}, ensure_ascii=False) + "\n"
+
+    def meio(self):
+        return ""
+
+    def fim(self):
+        return ""
+
+class ExportadorGraphML:
+    """GraphML (Gephi, yEd, NetworkX); nós e arestas podem vir intercalados"""
+    extensao = "graphml"
+    media_type = "application/graphml+xml"
+    arestas_no_fim = False
+
+    def inicio(self):
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+            '  <key id="tipo" for="node" attr.name="tipo" attr.type="string"/>\n'
+            '  <key id="label" for="node" attr.name="label" attr.type="string"/>\n'
+            '  <key id="tipo_ligacao" for="edge" attr.name="tipo" attr.type="string"/>\n'
+            '  <graph id="rede" edgedefault="directed">\n'
+        )
+
+    def no(self, node):
+        return (
+            f'    <node id={quoteattr(node["id"])}>'
+            f'<data key="tipo">{escape(node["tipo"])}</data>'
+            f'<data key="label">{escape(node["label"])}</data></node>\n'
+        )
+
+    def aresta(self, edge):
+        return (
+            f'    <edge id={quoteattr(edge["id"])} source={quoteattr(edge["origem"])} '
+            f'target={quoteattr(edge["destino"])}>'
+            f'<data key="tipo_ligacao">{escape(edge["tipo"] or "")}</data></edge>\n'
+        )
+
+    def meio(self):
+        return ""
+
+    def fim(self):
+        return '  </graph>\n</graphml>\n'
+
+class ExportadorGEXF:
+    """GEXF 1.3 (Gephi); exige a seção de nós antes da de arestas"""
+    extensao = "gexf"
+    media_type = "application/gexf+xml"
+    arestas_no_fim = True
+
+    def inicio(self):
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<gexf xmlns="http://gexf.net/1.3" version="1.3">\n'
+            '  <graph defaultedgetype="directed">\n'
+            '    <attributes class="node">\n'
+            '      <attribute id="tipo" title="tipo" type="string"/>\n'
+            '    </attributes>\n'
+            '    <nodes>\n'
+        )
+
+    def no(self, node):
+        return (
+            f'      <node id={quoteattr(node["id"])} label={quoteattr(node["label"])}>'
+            f'<attvalues><attvalue for="tipo" value={quoteattr(node["tipo"])}/></attvalues></node>\n'
+        )
+
+    def aresta(self, edge):
+        return (
+            f'      <edge id={quoteattr(edge["id"])} source={quoteattr(edge["origem"])} '
+            f'target={quoteattr(edge["destino"])} label={quoteattr(edge["tipo"] or "")}/>\n'
+        )
+
+    def meio(self):
+        return '    </nodes>\n    <edges>\n'
+
+    def fim(self):
+        return '    </edges>\n  </graph>\n</gexf>\n'
+
+class ExportadorCytoscape:
+    """Cytoscape JSON ({"elements": {"nodes": [...], "edges": [...]}})"""
+    extensao = "cyjs"
+    media_type = "application/json"
+    arestas_no_fim = True
+
+    def __init__(self):
+        self._primeiro_no = True
+        self._primeira_aresta = True
+
+    def inicio(self):
+        return '{"elements": {"nodes": [\n'
+
+    def no(self, node):
+        separador = "" if self._primeiro_no else ",\n"
+        self._primeiro_no = False
+        return separador + json.dumps({"data": node}, ensure_ascii=False)
+
+    def aresta(self, edge):
+        separador = "" if self._primeira_aresta else ",\n"
+        self._primeira_aresta = False
+        dados = {"id": edge["id"], "source": edge["origem"], "target": edge["destino"], "tipo": edge["tipo"]}
+        return separador + json.dumps({"data": dados}, ensure_ascii=False)
+
+    def meio(self):
+        return '\n], "edges": [\n'
+
+    def fim(self):
+        return '\n]}}\n'
+
+FORMATOS_EXPORTACAO = {
+    "graphml": ExportadorGraphML,
+    "gexf": ExportadorGEXF,
+    "cytoscape": ExportadorCytoscape,
+    "ndjson": ExportadorNDJSON,
+}
+
+async def exportar_stream(exportador, eventos):
+    """Converte os eventos da travessia em blocos de texto do formato escolhido"""
+    bloco = [exportador.inicio()]
+    tamanho = 0
+    arestas = None
+    if exportador.arestas_no_fim:
+        arestas = tempfile.SpooledTemporaryFile(
+            max_size=LIMITE_MEMORIA_ARESTAS, mode="w+", encoding="utf-8"
+        )
+
+    try:
+        async for elemento, dados in eventos:
+            if elemento == "node":
+                trecho = exportador.no(dados)
+            elif arestas is not None:
+                arestas.write(exportador.aresta(dados))
+                continue
+            else:
+                trecho = exportador.aresta(dados)
+            bloco.append(trecho)
+            tamanho += len(trecho)
+            if tamanho >= TAMANHO_BLOCO:
+                yield "".join(bloco)
+                bloco, tamanho = [], 0
+
+        bloco.append(exportador.meio())
+        if arestas is not None:
+            yield "".join(bloco)
+            bloco = []
+            arestas.seek(0)
+            while True:
+                trecho = arestas.read(TAMANHO_BLOCO)
+                if not trecho:
+                    break
+                yield trecho
+        bloco.append(exportador.fim())
+        yield "".join(bloco)
+    finally:
+        if arestas is not None:
+            arestas.close()
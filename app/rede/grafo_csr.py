@@ -0,0 +1,242 @@
+"""
+app/rede/grafo_csr.py
+Grafo de rede.ligacao em memória no formato CSR (NumPy)
+
+Os nós são as chaves de texto de rede.ligacao (PJ_..., PF_..., PE_...),
+ordenadas e numeradas de 0 a n-1. As chaves ficam concatenadas em um único
+blob UTF-8 com offsets, e a busca chave -> índice é binária. As arestas ficam
+em dois CSR (saída por id1, entrada por id2) com um array de tipo que indexa
+o dicionário de (descricao, comentario).
+
+O grafo é construído pelo importador a partir de rede.no e rede.ligacao_id
+(arestas já com ids inteiros, sem strings por aresta) e salvo em arquivos
+.npy; a API abre os arquivos com mmap, compartilhando as páginas entre os
+workers.
+"""
+
+import json
+import os
+from array import array
+
+import numpy as np
+
+ARQUIVOS = [
+    "chaves_blob", "chaves_offsets",
+    "saida_indptr", "saida_indices", "saida_tipo",
+    "entrada_indptr", "entrada_indices", "entrada_tipo",
+]
+
+def _montar_csr(origem, destino, tipo, n):
+    """Ordena as arestas pela origem e monta (indptr, indices, tipo)"""
+    ordem = np.argsort(origem, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(origem, minlength=n), out=indptr[1:])
+    return indptr, destino[ordem].astype(np.int32), tipo[ordem].astype(np.int16)
+
+class GrafoCSR:
+    """Grafo dirigido de ligações com consultas de vizinhança e travessia"""
+
+    def __init__(self, arrays: dict, tipos: list):
+        self.chaves_blob = arrays["chaves_blob"]
+        self.chaves_offsets = arrays["chaves_offsets"]
+        self.saida_indptr = arrays["saida_indptr"]
+        self.saida_indices = arrays["saida_indices"]
+        self.saida_tipo = arrays["saida_tipo"]
+        self.entrada_indptr = arrays["entrada_indptr"]
+        self.entrada_indices = arrays["entrada_indices"]
+        self.entrada_tipo = arrays["entrada_tipo"]
+        self.tipos = [tuple(t) for t in tipos]
+
+    # ============ CONSTRUÇÃO E PERSISTÊNCIA ============
+
+    @staticmethod
+    def codificar_chaves(chaves):
+        """
+        Concatena as chaves em (blob UTF-8, offsets).
+
+        `chaves` deve vir em ordem crescente de código (a mesma da comparação
+        de str do Python, ex.: ORDER BY chave COLLATE "C"), usada pela busca
+        binária.
+        """
+        blob = bytearray()
+        offsets = array("q", [0])
+        for chave in chaves:
+            blob += chave.encode("utf-8")
+            offsets.append(len(blob))
+        return np.frombuffer(blob, dtype=np.uint8), np.frombuffer(offsets, dtype=np.int64)
+
+    @classmethod
+    def construir(cls, chaves_blob, chaves_offsets, origem, destino, tipo, tipos):
+        """
+        Constrói o grafo a partir das chaves codificadas e das arestas numeradas.
+
+        `origem`/`destino` são arrays inteiros com o índice de cada nó na
+        ordem das chaves; `tipo` indexa a lista `tipos` de (descricao,
+        comentario).
+        """
+        n = len(chaves_offsets) - 1
+        origem = np.asarray(origem, dtype=np.int32)
+        destino = np.asarray(destino, dtype=np.int32)
+        tipo = np.asarray(tipo, dtype=np.int16)
+        saida_indptr, saida_indices, saida_tipo = _montar_csr(origem, destino, tipo, n)
+        entrada_indptr, entrada_indices, entrada_tipo = _montar_csr(destino, origem, tipo, n)
+
+        arrays = {
+            "chaves_blob": chaves_blob,
+            "chaves_offsets": chaves_offsets,
+            "saida_indptr": saida_indptr,
+            "saida_indices": saida_indices,
+            "saida_tipo": saida_tipo,
+            "entrada_indptr": entrada_indptr,
+            "entrada_indices": entrada_indices,
+            "entrada_tipo": entrada_tipo,
+        }
+        return cls(arrays, tipos)
+
+    def salvar(self, pasta: str):
+        """Grava os arrays (.npy) e o dicionário de tipos (.json) em `pasta`"""
+        os.makedirs(pasta, exist_ok=True)
+        for nome in ARQUIVOS:
+            np.save(os.path.join(pasta, f"{nome}.npy"), getattr(self, nome))
+        with open(os.path.join(pasta, "tipos.json"), "w", encoding="utf-8") as f:
+            json.dump([list(t) for t in self.tipos], f, ensure_ascii=False)
+
+    @staticmethod
+    def tamanho_em_disco(pasta: str) -> int:
+        """Soma dos tamanhos dos arquivos do grafo (bytes)"""
+        return sum(os.path.getsize(os.path.join(pasta, f"{nome}.npy")) for nome in ARQUIVOS)
+
+    @classmethod
+    def carregar(cls, pasta: str, mmap: bool = True):
+        """Abre o grafo salvo em `pasta` (mmap somente-leitura por padrão)"""
+        modo = "r" if mmap else None
+        arrays = {nome: np.load(os.path.join(pasta, f"{nome}.npy"), mmap_mode=modo) for nome in ARQUIVOS}
+        with open(os.path.join(pasta, "tipos.json"), encoding="utf-8") as f:
+            tipos = json.load(f)
+        return cls(arrays, tipos)
+
+    # ============ DICIONÁRIO DE NÓS ============
+
+    @property
+    def total_nos(self) -> int:
+        return len(self.chaves_offsets) - 1
+
+    @property
+    def total_arestas(self) -> int:
+        return len(self.saida_indices)
+
+    def chave(self, indice: int) -> str:
+        """Chave de texto do nó `indice`"""
+        inicio, fim = self.chaves_offsets[indice], self.chaves_offsets[indice + 1]
+        return bytes(self.chaves_blob[inicio:fim]).decode("utf-8")
+
+    def indice(self, chave: str):
+        """Índice do nó com a chave informada, ou None (busca binária)"""
+        baixo, alto = 0, self.total_nos
+        while baixo < alto:
+            meio = (baixo + alto) // 2
+            if self.chave(meio) < chave:
+                baixo = meio + 1
+            else:
+                alto = meio
+        if baixo < self.total_nos and self.chave(baixo) == chave:
+            return baixo
+        return None
+
+    # ============ CONSULTAS ============
+
+    def grau(self, chave: str):
+        """Retorna (grau_saida, grau_entrada) do nó; (0, 0) se não existir"""
+        i = self.indice(chave)
+        if i is None:
+            return 0, 0
+        return (int(self.saida_indptr[i + 1] - self.saida_indptr[i]),
+                int(self.entrada_indptr[i + 1] - self.entrada_indptr[i]))
+
+    def _grau_indices(self, indices):
+        """Grau total (saída + entrada) de um array de índices de nós"""
+        return ((self.saida_indptr[indices + 1] - self.saida_indptr[indices])
+                + (self.entrada_indptr[indices + 1] - self.entrada_indptr[indices]))
+
+    def _vizinhos_indice(self, i: int, direcao: str, limite: int = None, ranquear: bool = False):
+        if direcao == "saida":
+            indptr, indices, tipos = self.saida_indptr, self.saida_indices, self.saida_tipo
+        else:
+            indptr, indices, tipos = self.entrada_indptr, self.entrada_indices, self.entrada_tipo
+        inicio, fim = int(indptr[i]), int(indptr[i + 1])
+        if ranquear:
+            # Vizinhos do menor para o maior grau
+            vizinhos, vizinhos_tipo = indices[inicio:fim], tipos[inicio:fim]
+            ordem = np.argsort(self._grau_indices(vizinhos.astype(np.int64)), kind="stable")[:limite]
+            return vizinhos[ordem], vizinhos_tipo[ordem]
+        if limite is not None:
+            fim = min(fim, inicio + limite)
+        return indices[inicio:fim], tipos[inicio:fim]
+
+    def vizinhos(self, chave: str, direcao: str = "saida", limite: int = None):
+        """Lista (chave_vizinho, descricao, comentario) na direção informada"""
+        i = self.indice(chave)
+        if i is None:
+            return []
+        indices, tipos = self._vizinhos_indice(i, direcao, limite)
+        return [(self.chave(int(j)),) + self.tipos[int(t)] for j, t in zip(indices, tipos)]
+
+    def buscar_rede(self, origens, nivel, limite_por_no, grau_max_hub=0):
+        """
+        Travessia em largura equivalente a `buscar_rede_bfs` do router.
+
+        Retorna (nodes, edges, hubs) com as chaves de texto. Com
+        `grau_max_hub`, nós acima do grau (exceto as origens) não são
+        expandidos e os vizinhos são escolhidos do menor para o maior grau.
+        """
+        nodes = set(origens)
+        edges = []
+        edges_ids = set()
+        hubs = {}
+        visitados = set()
+        fronteira = [i for i in (self.indice(o) for o in dict.fromkeys(origens)) if i is not None]
+        indices_origens = set(fronteira)
+        ranquear = bool(grau_max_hub)
+
+        def adicionar_edge(origem, destino, t, direcao):
+            edge_id = f"{origem}->{destino}"
+            if edge_id not in edges_ids:
+                edges_ids.add(edge_id)
+                edges.append({
+                    "id": edge_id,
+                    "origem": origem,
+                    "destino": destino,
+                    "tipo": self.tipos[int(t)][0],
+                    "direcao": direcao
+                })
+
+        for _ in range(nivel):
+            fronteira = [i for i in fronteira if i not in visitados]
+            if not fronteira:
+                break
+            visitados.update(fronteira)
+
+            proxima = []
+            for i in fronteira:
+                chave_i = self.chave(i)
+                if grau_max_hub and i not in indices_origens:
+                    grau = int(self._grau_indices(np.int64(i)))
+                    if grau > grau_max_hub:
+                        hubs[chave_i] = grau
+                        continue
+                indices, tipos = self._vizinhos_indice(i, "saida", limite_por_no, ranquear)
+                for j, t in zip(indices.tolist(), tipos.tolist()):
+                    chave_j = self.chave(j)
+                    nodes.add(chave_j)
+                    adicionar_edge(chave_i, chave_j, t, "saida")
+                    proxima.append(j)
+                indices, tipos = self._vizinhos_indice(i, "entrada", limite_por_no, ranquear)
+                for j, t in zip(indices.tolist(), tipos.tolist()):
+                    chave_j = self.chave(j)
+                    nodes.add(chave_j)
+                    adicionar_edge(chave_j, chave_i, t, "entrada")
+                    proxima.append(j)
+
+            fronteira = list(dict.fromkeys(proxima))
+
+        return nodes, edges, hubs
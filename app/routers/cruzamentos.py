@@ -4,18 +4,37 @@ Router completo para cruzamentos de dados - PostgreSQL
 """
 
 from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
+import asyncio
+import gzip
+import json
 import os
 import re
+import time
+import logging
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from pydantic import BaseModel
+from typing import List, Optional
 from dotenv import load_dotenv
 
 # Importa as dependências de autenticação
 from ..auth.dependencies import get_current_user, check_and_update_rate_limit
+from ..cache import CacheResultados
+from ..formatacao import SITUACAO_CADASTRAL_MAP
+from .. import jobs
+from ..normalizacao import ajusta_email, endereco_de_entrada, telefone_de_entrada
+from ..rede.caminho import buscar_caminhos
+from ..rede.exportacao import FORMATOS_EXPORTACAO, exportar_stream
+from ..rede.grafo_csr import GrafoCSR
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Configuração do banco de dados
 DB_USER = os.getenv("DB_USER", "admin")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "admin123")
@@ -30,6 +49,32 @@ AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=F
 
 router = APIRouter()
 
+# Grafo CSR de rede.ligacao (opcional). Quando carregado, /rede e /vinculos
+# não consultam rede.ligacao; sem ele (ou acima do orçamento), usa SQL.
+GRAFO_CSR_PATH = os.getenv("GRAFO_CSR_PATH", "")
+GRAFO_CSR_MEMORIA_MB = int(os.getenv("GRAFO_CSR_MEMORIA_MB", "4096"))
+
+def carregar_grafo_csr():
+    """Abre o grafo CSR se configurado e dentro do orçamento de memória"""
+    if not GRAFO_CSR_PATH:
+        return None
+    try:
+        tamanho_mb = GrafoCSR.tamanho_em_disco(GRAFO_CSR_PATH) / 1024 / 1024
+        if tamanho_mb > GRAFO_CSR_MEMORIA_MB:
+            logger.warning(
+                f"Grafo CSR ({tamanho_mb:.0f} MB) acima do orçamento "
+                f"GRAFO_CSR_MEMORIA_MB={GRAFO_CSR_MEMORIA_MB}; usando SQL"
+            )
+            return None
+        grafo = GrafoCSR.carregar(GRAFO_CSR_PATH)
+        logger.info(f"Grafo CSR carregado: {grafo.total_nos:,} nós, {grafo.total_arestas:,} arestas")
+        return grafo
+    except (OSError, ValueError) as e:
+        logger.error(f"Falha ao carregar grafo CSR de {GRAFO_CSR_PATH}: {e}; usando SQL")
+        return None
+
+grafo_csr = carregar_grafo_csr()
+
 # ============ FUNÇÕES AUXILIARES ============
 
 async def require_active_user(user: dict = Depends(get_current_user)):
@@ -38,100 +83,843 @@ async def require_active_user(user: dict = Depends(get_current_user)):
         raise HTTPException(403, "Acesso restrito a usuários ativos (planos limitados ou ilimitados).")
     return user
 
-def normalize_email(email: str) -> str:
-    """Normaliza email para busca"""
-    return email.strip().lower()
+def escapar_like(valor: str) -> str:
+    """Escapa curingas de LIKE (\\, % e _) para busca por prefixo"""
+    return valor.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+# ============ CACHE DE RESULTADOS ============
+
+# Respostas de /rede, /vinculos e dos grupos ficam em cache por processo,
+# com chave (data da base, endpoint, cnpj, parâmetros). A data da base
+# (cnpj.referencia) é relida a cada CACHE_RELEASE_TTL_S; se mudar, o cache é
+# esvaziado. CACHE_CRUZAMENTOS_MB=0 desativa.
+CACHE_CRUZAMENTOS_MB = int(os.getenv("CACHE_CRUZAMENTOS_MB", "256"))
+CACHE_RELEASE_TTL_S = 300
+
+cache_cruzamentos = CacheResultados(CACHE_CRUZAMENTOS_MB * 1024 * 1024)
+_versao_base = {"valor": None, "verificado_em": None}
+
+async def versao_base():
+    """Data de atualização da base carregada (cnpj.referencia), com TTL"""
+    agora = time.monotonic()
+    verificado_em = _versao_base["verificado_em"]
+    if verificado_em is None or agora - verificado_em > CACHE_RELEASE_TTL_S:
+        async with AsyncSessionLocal() as session:
+            valor = (await session.execute(text(
+                "SELECT valor FROM cnpj.referencia WHERE referencia = 'data_atualizacao' LIMIT 1"
+            ))).scalar()
+        if valor != _versao_base["valor"]:
+            cache_cruzamentos.limpar()
+        _versao_base.update(valor=valor, verificado_em=agora)
+    return _versao_base["valor"]
+
+async def responder_com_cache(chave, produzir):
+    """Retorna a resposta em cache para `chave` ou chama `produzir()` e guarda"""
+    if not cache_cruzamentos.ativo:
+        return await produzir()
+    chave = (await versao_base(),) + chave
+    conteudo = cache_cruzamentos.obter(chave)
+    if conteudo is None:
+        resultado = jsonable_encoder(await produzir())
+        conteudo = json.dumps(resultado, ensure_ascii=False).encode("utf-8")
+        cache_cruzamentos.guardar(chave, conteudo)
+    return Response(content=conteudo, media_type="application/json")
+
+# ============ TRAVESSIA DA REDE ============
+
+LIMITE_LIGACOES_POR_NO = 50
+
+# Com REDE_IDS_INTEIROS=true as travessias usam rede.ligacao_id (id1/id2
+# BIGINT e tipo SMALLINT) e traduzem chaves <-> ids via rede.no só na
+# entrada e na saída. Requer as tabelas criadas pelo importador.
+REDE_IDS_INTEIROS = os.getenv("REDE_IDS_INTEIROS", "false") == "true"
+
+# Uma consulta por direção e por nível: a fronteira inteira vai em um array e
+# o LATERAL aplica o limite de ligações por nó usando o índice de id1/id2.
+SQL_LIGACOES_SAIDA = text("""
+    SELECT f.id AS origem, l.id2 AS destino, l.descricao
+    FROM unnest(CAST(:fronteira AS TEXT[])) AS f(id)
+    CROSS JOIN LATERAL (
+        SELECT id2, descricao
+        FROM rede.ligacao
+        WHERE id1 = f.id
+        LIMIT :limite
+    ) l
+""")
+
+SQL_LIGACOES_ENTRADA = text("""
+    SELECT l.id1 AS origem, f.id AS destino, l.descricao
+    FROM unnest(CAST(:fronteira AS TEXT[])) AS f(id)
+    CROSS JOIN LATERAL (
+        SELECT id1, descricao
+        FROM rede.ligacao
+        WHERE id2 = f.id
+        LIMIT :limite
+    ) l
+""")
+
+SQL_LIGACOES_ID_SAIDA = text("""
+    SELECT f.id AS origem, l.id2 AS destino, l.tipo
+    FROM unnest(CAST(:fronteira AS BIGINT[])) AS f(id)
+    CROSS JOIN LATERAL (
+        SELECT id2, tipo
+        FROM rede.ligacao_id
+        WHERE id1 = f.id
+        LIMIT :limite
+    ) l
+""")
+
+SQL_LIGACOES_ID_ENTRADA = text("""
+    SELECT l.id1 AS origem, f.id AS destino, l.tipo
+    FROM unnest(CAST(:fronteira AS BIGINT[])) AS f(id)
+    CROSS JOIN LATERAL (
+        SELECT id1, tipo
+        FROM rede.ligacao_id
+        WHERE id2 = f.id
+        LIMIT :limite
+    ) l
+""")
+
+# Travessia ciente do grau (rede.grau, criada pelo importador): nós com mais
+# de REDE_GRAU_MAX_HUB ligações não são expandidos (são retornados como hubs
+# colapsados) e os vizinhos de cada nó são escolhidos do menor para o maior
+# grau. 0 desativa.
+REDE_GRAU_MAX_HUB = int(os.getenv("REDE_GRAU_MAX_HUB", "0"))
+
+SQL_HUBS = text("""
+    SELECT chave, grau FROM rede.grau
+    WHERE chave = ANY(CAST(:nos AS TEXT[])) AND grau > :grau_max
+""")
+
+SQL_HUBS_ID = text("""
+    SELECT id, grau FROM rede.grau
+    WHERE id = ANY(CAST(:nos AS BIGINT[])) AND grau > :grau_max
+""")
+
+SQL_LIGACOES_RANK_SAIDA = text("""
+    SELECT f.id AS origem, l.id2 AS destino, l.descricao
+    FROM unnest(CAST(:fronteira AS TEXT[])) AS f(id)
+    CROSS JOIN LATERAL (
+        SELECT li.id2, li.descricao
+        FROM rede.ligacao li
+        LEFT JOIN rede.grau g ON g.chave = li.id2
+        WHERE li.id1 = f.id
+        ORDER BY COALESCE(g.grau, 0), li.id2
+        LIMIT :limite
+    ) l
+""")
+
+SQL_LIGACOES_RANK_ENTRADA = text("""
+    SELECT l.id1 AS origem, f.id AS destino, l.descricao
+    FROM unnest(CAST(:fronteira AS TEXT[])) AS f(id)
+    CROSS JOIN LATERAL (
+        SELECT li.id1, li.descricao
+        FROM rede.ligacao li
+        LEFT JOIN rede.grau g ON g.chave = li.id1
+        WHERE li.id2 = f.id
+        ORDER BY COALESCE(g.grau, 0), li.id1
+        LIMIT :limite
+    ) l
+""")
+
+SQL_LIGACOES_ID_RANK_SAIDA = text("""
+    SELECT f.id AS origem, l.id2 AS destino, l.tipo
+    FROM unnest(CAST(:fronteira AS BIGINT[])) AS f(id)
+    CROSS JOIN LATERAL (
+        SELECT li.id2, li.tipo
+        FROM rede.ligacao_id li
+        LEFT JOIN rede.grau g ON g.id = li.id2
+        WHERE li.id1 = f.id
+        ORDER BY COALESCE(g.grau, 0), li.id2
+        LIMIT :limite
+    ) l
+""")
+
+SQL_LIGACOES_ID_RANK_ENTRADA = text("""
+    SELECT l.id1 AS origem, f.id AS destino, l.tipo
+    FROM unnest(CAST(:fronteira AS BIGINT[])) AS f(id)
+    CROSS JOIN LATERAL (
+        SELECT li.id1, li.tipo
+        FROM rede.ligacao_id li
+        LEFT JOIN rede.grau g ON g.id = li.id1
+        WHERE li.id2 = f.id
+        ORDER BY COALESCE(g.grau, 0), li.id1
+        LIMIT :limite
+    ) l
+""")
+
+_tipos_ligacao = {}
+
+async def obter_tipos_ligacao(session):
+    """Dicionário id -> descricao de rede.tipo_ligacao (carregado uma vez)"""
+    if not _tipos_ligacao:
+        result = await session.execute(text("SELECT id, descricao FROM rede.tipo_ligacao"))
+        _tipos_ligacao.update({row[0]: row[1] for row in result.fetchall()})
+    return _tipos_ligacao
+
+async def chaves_para_ids(session, chaves):
+    """Traduz chaves de texto (PJ_..., PF_...) para ids de rede.no"""
+    result = await session.execute(
+        text("SELECT chave, id FROM rede.no WHERE chave = ANY(:chaves)"),
+        {"chaves": list(chaves)}
+    )
+    return {row[0]: row[1] for row in result.fetchall()}
+
+async def ids_para_chaves(session, ids):
+    """Traduz ids de rede.no para as chaves de texto"""
+    result = await session.execute(
+        text("SELECT id, chave FROM rede.no WHERE id = ANY(:ids)"),
+        {"ids": list(ids)}
+    )
+    return {row[0]: row[1] for row in result.fetchall()}
+
+def montar_edges(arestas):
+    """Converte tuplas (origem, destino, tipo, direcao) em edges únicas por id"""
+    edges = []
+    edges_ids = set()
+    for origem, destino, tipo, direcao in arestas:
+        edge_id = f"{origem}->{destino}"
+        if edge_id not in edges_ids:
+            edges_ids.add(edge_id)
+            edges.append({
+                "id": edge_id,
+                "origem": origem,
+                "destino": destino,
+                "tipo": tipo,
+                "direcao": direcao
+            })
+    return edges
+
+def sqls_bfs(ids_inteiros, grau_max_hub=0):
+    """Consultas (saída, entrada, hubs) do BFS para o modo de ids e de grau"""
+    if ids_inteiros:
+        if grau_max_hub:
+            return SQL_LIGACOES_ID_RANK_SAIDA, SQL_LIGACOES_ID_RANK_ENTRADA, SQL_HUBS_ID
+        return SQL_LIGACOES_ID_SAIDA, SQL_LIGACOES_ID_ENTRADA, None
+    if grau_max_hub:
+        return SQL_LIGACOES_RANK_SAIDA, SQL_LIGACOES_RANK_ENTRADA, SQL_HUBS
+    return SQL_LIGACOES_SAIDA, SQL_LIGACOES_ENTRADA, None
+
+async def _niveis_bfs(session, sql_saida, sql_entrada, origens, nivel, limite_por_no,
+                      sql_hubs=None, grau_max_hub=0, lote_fronteira=None):
+    """
+    Laço do BFS por nível; gera (arestas do nível em tuplas, hubs do nível).
+
+    Com `sql_hubs` e `grau_max_hub`, nós da fronteira (exceto as origens)
+    acima do grau máximo não são expandidos e vão para os hubs (nó -> grau).
+    Com `lote_fronteira`, cada nível é lido em blocos da fronteira desse
+    tamanho e gera um item por bloco (hubs só no primeiro).
+    """
+    visitados = set()
+    fronteira = list(dict.fromkeys(origens))
+
+    for _ in range(nivel):
+        fronteira = [n for n in fronteira if n not in visitados]
+        if not fronteira:
+            break
+        visitados.update(fronteira)
+
+        hubs = {}
+        if sql_hubs is not None and grau_max_hub:
+            result = await session.execute(sql_hubs, {"nos": fronteira, "grau_max": grau_max_hub})
+            for no, grau in result.fetchall():
+                if no not in origens:
+                    hubs[no] = grau
+            fronteira = [n for n in fronteira if n not in hubs]
+            if not fronteira:
+                yield [], hubs
+                break
+
+        passo = lote_fronteira or len(fronteira)
+        proxima = []
+        for inicio in range(0, len(fronteira), passo):
+            params = {"fronteira": fronteira[inicio:inicio + passo], "limite": limite_por_no}
+
+            rows_saida = (await session.execute(sql_saida, params)).fetchall()
+            rows_entrada = (await session.execute(sql_entrada, params)).fetchall()
+
+            arestas = []
+            for origem, destino, tipo in rows_saida:
+                arestas.append((origem, destino, tipo, "saida"))
+                proxima.append(destino)
+            for origem, destino, tipo in rows_entrada:
+                arestas.append((origem, destino, tipo, "entrada"))
+                proxima.append(origem)
+            yield arestas, hubs
+            hubs = {}
+
+        fronteira = list(dict.fromkeys(proxima))
+
+async def _percorrer_bfs(session, sql_saida, sql_entrada, origens, nivel, limite_por_no,
+                         sql_hubs=None, grau_max_hub=0):
+    """Executa todos os níveis; retorna (nodes, lista de arestas em tuplas, hubs)"""
+    nodes = set(origens)
+    arestas = []
+    hubs = {}
+    async for arestas_nivel, hubs_nivel in _niveis_bfs(
+        session, sql_saida, sql_entrada, origens, nivel, limite_por_no, sql_hubs, grau_max_hub
+    ):
+        for origem, destino, _, _ in arestas_nivel:
+            nodes.add(origem)
+            nodes.add(destino)
+        arestas.extend(arestas_nivel)
+        hubs.update(hubs_nivel)
+    return nodes, arestas, hubs
+
+async def buscar_rede_bfs(session, origens, nivel, limite_por_no=LIMITE_LIGACOES_POR_NO, grau_max_hub=0):
+    """
+    Percorre rede.ligacao em largura a partir de `origens` até `nivel`.
+
+    Cada nível faz duas consultas (saída e entrada) para toda a fronteira.
+    Nós já expandidos não voltam à fronteira. Retorna (nodes, edges, hubs),
+    com edges únicas por "origem->destino" e `direcao` relativa ao nó
+    expandido; `hubs` (chave -> grau) só é preenchido com `grau_max_hub`.
+    """
+    sql_saida, sql_entrada, sql_hubs = sqls_bfs(REDE_IDS_INTEIROS, grau_max_hub)
+    if not REDE_IDS_INTEIROS:
+        nodes, arestas, hubs = await _percorrer_bfs(
+            session, sql_saida, sql_entrada, origens, nivel, limite_por_no, sql_hubs, grau_max_hub
+        )
+        return nodes, montar_edges(arestas), hubs
+
+    ids_origens = await chaves_para_ids(session, origens)
+    nodes_ids, arestas, hubs_ids = await _percorrer_bfs(
+        session, sql_saida, sql_entrada, list(ids_origens.values()), nivel, limite_por_no,
+        sql_hubs, grau_max_hub
+    )
+    chaves = await ids_para_chaves(session, nodes_ids)
+    tipos = await obter_tipos_ligacao(session)
+
+    nodes = set(origens) | set(chaves.values())
+    return nodes, montar_edges(
+        (chaves[origem], chaves[destino], tipos.get(tipo), direcao)
+        for origem, destino, tipo, direcao in arestas
+    ), {chaves[no]: grau for no, grau in hubs_ids.items()}
+
+# Mesma travessia (bidirecional, limite por nó, profundidade) em uma única
+# consulta. O UNION da CTE descarta pares (nó, nível) repetidos, o que corta
+# ciclos dentro de cada nível; a profundidade encerra a recursão e
+# `expandidos` guarda o menor nível de cada nó para expandi-lo uma única vez.
+SQL_REDE_CTE = text("""
+    WITH RECURSIVE fronteira(no, nivel) AS (
+        SELECT o.id, 1
+        FROM unnest(CAST(:origens AS TEXT[])) AS o(id)
+      UNION
+        SELECT v.no, f.nivel + 1
+        FROM fronteira f
+        CROSS JOIN LATERAL (
+            (SELECT id2 AS no FROM rede.ligacao WHERE id1 = f.no LIMIT :limite)
+            UNION ALL
+            (SELECT id1 AS no FROM rede.ligacao WHERE id2 = f.no LIMIT :limite)
+        ) v
+        WHERE f.nivel < :nivel
+    ),
+    expandidos AS (
+        SELECT no, MIN(nivel) AS nivel
+        FROM fronteira
+        GROUP BY no
+    )
+    SELECT e.nivel, 0 AS ordem, e.no AS origem, l.id2 AS destino, l.descricao
+    FROM expandidos e
+    CROSS JOIN LATERAL (
+        SELECT id2, descricao FROM rede.ligacao WHERE id1 = e.no LIMIT :limite
+    ) l
+    UNION ALL
+    SELECT e.nivel, 1 AS ordem, l.id1 AS origem, e.no AS destino, l.descricao
+    FROM expandidos e
+    CROSS JOIN LATERAL (
+        SELECT id1, descricao FROM rede.ligacao WHERE id2 = e.no LIMIT :limite
+    ) l
+    ORDER BY 1, 2
+""")
+
+# Versão sobre rede.ligacao_id: traduz as origens e o resultado via rede.no
+# dentro da própria consulta, mantendo uma única ida ao banco.
+SQL_REDE_CTE_ID = text("""
+    WITH RECURSIVE fronteira(no, nivel) AS (
+        SELECT n.id, 1
+        FROM rede.no n
+        WHERE n.chave = ANY(CAST(:origens AS TEXT[]))
+      UNION
+        SELECT v.no, f.nivel + 1
+        FROM fronteira f
+        CROSS JOIN LATERAL (
+            (SELECT id2 AS no FROM rede.ligacao_id WHERE id1 = f.no LIMIT :limite)
+            UNION ALL
+            (SELECT id1 AS no FROM rede.ligacao_id WHERE id2 = f.no LIMIT :limite)
+        ) v
+        WHERE f.nivel < :nivel
+    ),
+    expandidos AS (
+        SELECT no, MIN(nivel) AS nivel
+        FROM fronteira
+        GROUP BY no
+    ),
+    arestas AS (
+        SELECT e.nivel, 0 AS ordem, e.no AS origem, l.id2 AS destino, l.tipo
+        FROM expandidos e
+        CROSS JOIN LATERAL (
+            SELECT id2, tipo FROM rede.ligacao_id WHERE id1 = e.no LIMIT :limite
+        ) l
+        UNION ALL
+        SELECT e.nivel, 1 AS ordem, l.id1 AS origem, e.no AS destino, l.tipo
+        FROM expandidos e
+        CROSS JOIN LATERAL (
+            SELECT id1, tipo FROM rede.ligacao_id WHERE id2 = e.no LIMIT :limite
+        ) l
+    )
+    SELECT a.nivel, a.ordem, n1.chave AS origem, n2.chave AS destino, t.descricao
+    FROM arestas a
+    JOIN rede.no n1 ON n1.id = a.origem
+    JOIN rede.no n2 ON n2.id = a.destino
+    LEFT JOIN rede.tipo_ligacao t ON t.id = a.tipo
+    ORDER BY 1, 2
+""")
+
+async def buscar_rede_cte(session, origens, nivel, limite_por_no=LIMITE_LIGACOES_POR_NO, grau_max_hub=0):
+    """
+    Percorre rede.ligacao com WITH RECURSIVE executado no PostgreSQL.
+
+    Uma única ida ao banco; retorna (nodes, edges, hubs) no mesmo formato de
+    `buscar_rede_bfs`. A travessia ciente do grau usa o BFS.
+    """
+    if grau_max_hub:
+        return await buscar_rede_bfs(session, origens, nivel, limite_por_no, grau_max_hub)
+
+    result = await session.execute(
+        SQL_REDE_CTE_ID if REDE_IDS_INTEIROS else SQL_REDE_CTE,
+        {"origens": list(dict.fromkeys(origens)), "nivel": nivel, "limite": limite_por_no}
+    )
+
+    nodes = set(origens)
+    arestas = []
+    for _, ordem, origem, destino, tipo in result.fetchall():
+        nodes.add(origem)
+        nodes.add(destino)
+        arestas.append((origem, destino, tipo, "saida" if ordem == 0 else "entrada"))
+
+    return nodes, montar_edges(arestas), {}
+
+async def buscar_rede_csr(session, origens, nivel, limite_por_no=LIMITE_LIGACOES_POR_NO, grau_max_hub=0):
+    """Percorre o grafo CSR em memória (não usa a sessão)"""
+    return grafo_csr.buscar_rede(origens, nivel, limite_por_no, grau_max_hub)
+
+# Motor de travessia SQL padrão: "bfs" (um par de consultas por nível) ou
+# "cte" (WITH RECURSIVE, uma consulta). "csr" usa o grafo em memória.
+MOTORES_REDE = {
+    "bfs": buscar_rede_bfs,
+    "cte": buscar_rede_cte,
+    "csr": buscar_rede_csr,
+}
+REDE_MOTOR = os.getenv("REDE_MOTOR", "bfs")
+
+def obter_motor_rede(motor=None):
+    """
+    Retorna a função de travessia escolhida.
 
-def normalize_phone(ddd: str, phone: str) -> str:
-    """Normaliza telefone removendo formatação"""
-    full = (ddd or "") + (phone or "")
-    return re.sub(r'\D', '', full)
+    Sem parâmetro, usa o grafo CSR se estiver carregado e REDE_MOTOR caso
+    contrário; "csr" sem grafo carregado cai para REDE_MOTOR.
+    """
+    if motor and motor not in MOTORES_REDE:
+        raise HTTPException(422, f"Motor de rede inválido: {motor}. Opções: {', '.join(MOTORES_REDE)}")
+    if not motor:
+        motor = "csr" if grafo_csr is not None else REDE_MOTOR
+    if motor == "csr" and grafo_csr is None:
+        motor = REDE_MOTOR if REDE_MOTOR != "csr" else "bfs"
+    return MOTORES_REDE[motor]
+
+def formatar_node(node):
+    """Formata um node da rede com tipo e label a partir do prefixo do id"""
+    if node.startswith("PJ_"):
+        tipo_node = "Pessoa Jurídica"
+        label = node[3:]
+    elif node.startswith("PF_"):
+        tipo_node = "Pessoa Física"
+        label = node[3:]
+    elif node.startswith("PE_"):
+        tipo_node = "Pessoa Estrangeira"
+        label = node[3:]
+    else:
+        tipo_node = "Desconhecido"
+        label = node
+    
+    return {
+        "id": node,
+        "tipo": tipo_node,
+        "label": label
+    }
+
+def formatar_nodes(nodes):
+    """Formata nodes da rede com tipo e label a partir do prefixo do id"""
+    return [formatar_node(node) for node in nodes]
+
+# ============ MENOR CAMINHO ============
+
+# Limites da busca de caminho: nós na fronteira a expandir, ligações por nó e
+# direção, tempo total (também aplicado como statement_timeout) e caminhos
+# retornados quando há empate na menor distância.
+CAMINHO_MAX_FRONTEIRA = int(os.getenv("CAMINHO_MAX_FRONTEIRA", "2000"))
+CAMINHO_LIMITE_POR_NO = int(os.getenv("CAMINHO_LIMITE_POR_NO", "200"))
+CAMINHO_TEMPO_MAX_S = float(os.getenv("CAMINHO_TEMPO_MAX_S", "5"))
+CAMINHO_MAX_CAMINHOS = 10
+
+PREFIXOS_NO = ("PJ_", "PF_", "PE_", "EN_", "TE_", "EM_")
+
+# Ligações de endereço/telefone/email: PJ_ -> EN_/TE_/EM_ e o inverso.
+# link_ete.id2 é a chave BIGINT de links.atributo, que guarda o texto do nó.
+SQL_ETE_SAIDA = text("""
+    SELECT f.id AS origem, l.id2 AS destino, l.descricao
+    FROM unnest(CAST(:fronteira AS TEXT[])) AS f(id)
+    CROSS JOIN LATERAL (
+        SELECT a.id2, le.descricao
+        FROM links.link_ete le
+        JOIN links.atributo a ON a.chave = le.id2
+        WHERE le.id1 = f.id
+        LIMIT :limite
+    ) l
+""")
+
+SQL_ETE_ENTRADA = text("""
+    SELECT l.id1 AS origem, f.id AS destino, l.descricao
+    FROM unnest(CAST(:fronteira AS TEXT[])) AS f(id)
+    CROSS JOIN LATERAL (
+        SELECT le.id1, le.descricao
+        FROM links.atributo a
+        JOIN links.link_ete le ON le.descricao = a.descricao AND le.id2 = a.chave
+        WHERE a.hash = hashtextextended(f.id, 0) AND a.id2 = f.id
+        LIMIT :limite
+    ) l
+""")
+
+def chave_no(valor: str) -> str:
+    """Converte CNPJ (com ou sem formatação) ou chave com prefixo na chave do nó"""
+    valor = valor.strip()
+    if valor[:3].upper() in PREFIXOS_NO:
+        return valor[:3].upper() + valor[3:]
+    if re.fullmatch(r'[\d./-]+', valor):
+        return "PJ_" + re.sub(r'\D', '', valor)
+    raise HTTPException(422, f"Entidade inválida: {valor}. Use um CNPJ ou uma chave com prefixo ({', '.join(PREFIXOS_NO)})")
+
+async def vizinhos_caminho(session, fronteira, incluir_ete, limite_por_no=CAMINHO_LIMITE_POR_NO):
+    """
+    Vizinhos de todos os nós da fronteira, nos dois sentidos.
+
+    Retorna tuplas (no, vizinho, origem, destino, tipo) no formato esperado
+    por `buscar_caminhos`.
+    """
+    vizinhos = []
+    if grafo_csr is not None:
+        for no in fronteira:
+            for destino, descricao, _ in grafo_csr.vizinhos(no, "saida", limite_por_no):
+                vizinhos.append((no, destino, no, destino, descricao))
+            for origem, descricao, _ in grafo_csr.vizinhos(no, "entrada", limite_por_no):
+                vizinhos.append((no, origem, origem, no, descricao))
+        consultas = []
+    else:
+        consultas = [SQL_LIGACOES_SAIDA, SQL_LIGACOES_ENTRADA]
+    if incluir_ete:
+        consultas += [SQL_ETE_SAIDA, SQL_ETE_ENTRADA]
+
+    params = {"fronteira": list(fronteira), "limite": limite_por_no}
+    for i, sql in enumerate(consultas):
+        result = await session.execute(sql, params)
+        saida = i % 2 == 0
+        for origem, destino, descricao in result.fetchall():
+            if saida:
+                vizinhos.append((origem, destino, origem, destino, descricao))
+            else:
+                vizinhos.append((destino, origem, origem, destino, descricao))
+    return vizinhos
 
 # ============ ENDPOINTS DE COMPARTILHAMENTO ============
 
+# Valores compartilhados por mais CNPJs que isso (escritórios de
+# contabilidade, endereços de domiciliação) são "hubs": só a primeira página
+# é retornada, sem cursor para as seguintes.
+COMPARTILHADOS_LIMITE_HUB = int(os.getenv("COMPARTILHADOS_LIMITE_HUB", "10000"))
+
+# Chave BIGINT de link_ete.id2 para o texto do valor (EN_..., TE_..., EM_...)
+# e total pré-calculado pelo importador (CNPJs ativos com o valor)
+SQL_CHAVE_ATRIBUTO = text("""
+    SELECT chave, qtd
+    FROM links.atributo
+    WHERE hash = hashtextextended(:id2, 0) AND id2 = :id2
+""")
+
+# Paginação por cursor (id1 > :apos) no índice (id2, id1) da partição
+SQL_PAGINA_COMPARTILHADOS = text("""
+    SELECT id1
+    FROM links.link_ete
+    WHERE descricao = :descricao
+      AND id2 = :chave
+      AND id1 > :apos
+    ORDER BY id1
+    LIMIT :limite
+""")
+
+async def pagina_compartilhados(descricao, id2, apos, limite):
+    """Uma página de CNPJs que compartilham `id2`, com total e cursor da próxima"""
+    async with AsyncSessionLocal() as session:
+        atributo = (await session.execute(SQL_CHAVE_ATRIBUTO, {"id2": id2})).first()
+        chave, total = atributo if atributo else (None, 0)
+        hub = total > COMPARTILHADOS_LIMITE_HUB
+        if hub:
+            apos = None
+
+        ids = []
+        if chave is not None:
+            result = await session.execute(SQL_PAGINA_COMPARTILHADOS, {
+                "descricao": descricao,
+                "chave": chave,
+                "apos": f"PJ_{apos}" if apos else "",
+                "limite": limite + 1
+            })
+            ids = [row[0] for row in result.fetchall()]
+
+    tem_proxima = len(ids) > limite and not hub
+    cnpjs = [id1[3:] for id1 in ids[:limite] if id1.startswith('PJ_')]
+    return {
+        "total": total,
+        "hub": hub,
+        "limite": limite,
+        "cnpjs": cnpjs,
+        "proximo": cnpjs[-1] if tem_proxima and cnpjs else None
+    }
+
+# Busca aproximada de endereço: chaves EN_ do mesmo município/UF em
+# rede.id_search (índice GIN pg_trgm), ordenadas por similaridade
+ENDERECO_SIMILARIDADE_MIN = float(os.getenv("ENDERECO_SIMILARIDADE_MIN", "0.6"))
+LIMITE_SUGESTOES_ENDERECO = 5
+
+SQL_ENDERECOS_SIMILARES = text("""
+    SELECT id_descricao, similarity(id_descricao, :chave) AS similaridade
+    FROM rede.id_search
+    WHERE id_descricao % :chave
+      AND id_descricao LIKE 'EN\\_%' || :sufixo
+    ORDER BY similaridade DESC
+    LIMIT :limite
+""")
+
+async def enderecos_similares(chave):
+    """Chaves EN_ parecidas com `chave` no mesmo município/UF"""
+    sufixo = chave[chave.index('-'):]
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(SQL_ENDERECOS_SIMILARES, {
+            "chave": f"EN_{chave}",
+            "sufixo": escapar_like(sufixo),
+            "limite": LIMITE_SUGESTOES_ENDERECO
+        })
+        return [
+            {"endereco": id_descricao[3:], "similaridade": round(similaridade, 3)}
+            for id_descricao, similaridade in result.fetchall()
+            if similaridade >= ENDERECO_SIMILARIDADE_MIN
+        ]
+
 @router.get("/enderecos/compartilhados")
 async def cnpjs_por_endereco(
-    endereco: str, 
+    endereco: str = Query(None, description="Chave de endereço já normalizada (formato do importador)"),
+    logradouro: str = Query(None, description="Logradouro sem o tipo, ex.: 'Paulista' (AV, RUA etc. no início são ignorados)"),
+    numero: str = Query(None, description="Número"),
+    complemento: str = Query(None, description="Complemento"),
+    municipio: str = Query(None, description="Município, ex.: 'São Paulo'"),
+    uf: str = Query(None, description="UF, ex.: 'SP'"),
+    aproximado: bool = Query(False, description="Sem resultado exato, usa o endereço mais parecido (pg_trgm)"),
+    apos: str = Query(None, description="Cursor: valor de 'proximo' da página anterior"),
+    limite: int = Query(100, ge=1, le=1000, description="CNPJs por página"),
     user: dict = Depends(require_active_user)
 ):
-    """Retorna CNPJs que compartilham o mesmo endereço"""
+    """
+    Retorna CNPJs que compartilham o mesmo endereço (paginado por cursor).
+
+    Aceita a chave normalizada (`endereco`) ou os campos brutos, que são
+    normalizados com as mesmas regras do importador.
+    """
     await check_and_update_rate_limit(user, qtd_reqs=1)
     
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            text("SELECT id1 FROM links.link_ete WHERE id2 = :id2 AND descricao = 'end'"),
-            {"id2": f"EN_{endereco}"}
-        )
-        rows = result.fetchall()
-        cnpjs = [row[0].replace("PJ_", "") for row in rows if row[0].startswith("PJ_")]
+    if endereco is None:
+        if not (logradouro and municipio and uf):
+            raise HTTPException(422, "Informe 'endereco' ou 'logradouro', 'municipio' e 'uf'.")
+        endereco = endereco_de_entrada(logradouro, numero, complemento, municipio, uf)
+        if not endereco:
+            raise HTTPException(422, "Endereço inválido após normalização (sem número ou sem logradouro).")
     
-    return {
+    pagina = await pagina_compartilhados('end', f"EN_{endereco}", apos, limite)
+    
+    sugestoes = None
+    if aproximado and not pagina["total"] and '-' in endereco:
+        sugestoes = await enderecos_similares(endereco)
+        if sugestoes:
+            endereco = sugestoes[0]["endereco"]
+            pagina = await pagina_compartilhados('end', f"EN_{endereco}", apos, limite)
+    
+    resposta = {
         "endereco": endereco,
-        "total": len(cnpjs),
-        "cnpjs": cnpjs
+        **pagina
     }
+    if sugestoes is not None:
+        resposta["sugestoes"] = sugestoes
+    return resposta
 
 @router.get("/emails/compartilhados")
 async def emails_compartilhados(
     email: str,
+    apos: str = Query(None, description="Cursor: valor de 'proximo' da página anterior"),
+    limite: int = Query(100, ge=1, le=1000, description="CNPJs por página"),
     user: dict = Depends(require_active_user)
 ):
-    """Retorna CNPJs que compartilham o mesmo email"""
-    await check_and_update_rate_limit(user, qtd_reqs=1)
+    """Retorna CNPJs que compartilham o mesmo email (paginado por cursor)"""
+    # Mesma normalização do importador e da consulta em lote
+    normalized_email = ajusta_email(email)
+    if not normalized_email:
+        raise HTTPException(422, "Email inválido após normalização.")
     
-    normalized_email = normalize_email(email)
-    id2 = f"EM_{normalized_email}"
+    await check_and_update_rate_limit(user, qtd_reqs=1)
     
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            text("SELECT id1 FROM links.link_ete WHERE id2 = :id2 AND descricao = 'email'"),
-            {"id2": id2}
-        )
-        rows = result.fetchall()
-        cnpjs = []
-        for row in rows:
-            if row[0].startswith('PJ_'):
-                cnpjs.append(row[0][3:])
+    pagina = await pagina_compartilhados('email', f"EM_{normalized_email}", apos, limite)
     
     return {
         "email": normalized_email,
-        "total": len(cnpjs),
-        "cnpjs": cnpjs
+        **pagina
     }
 
 @router.get("/telefones/compartilhados")
 async def telefones_compartilhados(
     ddd: str = Query(..., description="DDD do telefone"),
     telefone: str = Query(..., description="Número do telefone"),
+    apos: str = Query(None, description="Cursor: valor de 'proximo' da página anterior"),
+    limite: int = Query(100, ge=1, le=1000, description="CNPJs por página"),
     user: dict = Depends(require_active_user)
 ):
-    """Retorna CNPJs que compartilham o mesmo telefone"""
-    await check_and_update_rate_limit(user, qtd_reqs=1)
+    """Retorna CNPJs que compartilham o mesmo telefone (paginado por cursor)"""
+    # Mesma normalização do importador ("DDD NÚMERO", ex.: TE_11 33334444)
+    normalized_phone = telefone_de_entrada(f"{ddd} {telefone}")
+    if not normalized_phone:
+        raise HTTPException(422, "Telefone inválido após normalização.")
     
-    normalized_phone = normalize_phone(ddd, telefone)
-    id2 = f"TE_{normalized_phone}"
+    await check_and_update_rate_limit(user, qtd_reqs=1)
     
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            text("SELECT id1 FROM links.link_ete WHERE id2 = :id2 AND descricao = 'tel'"),
-            {"id2": id2}
-        )
-        rows = result.fetchall()
-        cnpjs = []
-        for row in rows:
-            if row[0].startswith('PJ_'):
-                cnpjs.append(row[0][3:])
+    pagina = await pagina_compartilhados('tel', f"TE_{normalized_phone}", apos, limite)
     
     return {
         "telefone": normalized_phone,
         "ddd": ddd,
         "numero": telefone,
-        "total": len(cnpjs),
-        "cnpjs": cnpjs
+        **pagina
     }
 
+# ============ CONSULTAS EM LOTE ============
+
+# Máximo de valores por requisição em lote; cada bloco de
+# VALORES_POR_UNIDADE_LOTE valores consome uma unidade do rate limit.
+LIMITE_VALORES_LOTE = 1000
+VALORES_POR_UNIDADE_LOTE = 100
+
+# CNPJs retornados por valor (mesma página padrão da consulta individual);
+# as seguintes vêm pelo endpoint individual, com o cursor "proximo"
+LIMITE_CNPJS_POR_VALOR_LOTE = 100
+
+class ConsultaLote(BaseModel):
+    valores: List[str]
+
+async def buscar_compartilhados_lote(user, valores, descricao, prefixo, normalizar):
+    """
+    Resolve uma lista de valores em uma única consulta (id2 = ANY).
+
+    Retorna os resultados agrupados pelo valor informado, com a chave
+    normalizada usada na busca (None se o valor for inválido) e a primeira
+    página de CNPJs; "proximo" é o cursor (`apos`) da consulta individual.
+    """
+    if not valores:
+        raise HTTPException(422, "Informe ao menos um valor.")
+    if len(valores) > LIMITE_VALORES_LOTE:
+        raise HTTPException(422, f"Máximo de {LIMITE_VALORES_LOTE} valores por requisição.")
+
+    await check_and_update_rate_limit(user, qtd_reqs=-(-len(valores) // VALORES_POR_UNIDADE_LOTE))
+
+    chaves = {valor: normalizar(valor) for valor in valores}
+    ids2 = sorted({prefixo + chave for chave in chaves.values() if chave})
+
+    cnpjs_por_id2 = {}
+    if ids2:
+        async with AsyncSessionLocal() as session:
+            # Cada valor traz no máximo uma página (+1 para saber se há mais)
+            result = await session.execute(
+                text("""
+                    SELECT f.id2, l.id1, a.qtd
+                    FROM unnest(CAST(:ids2 AS TEXT[])) AS f(id2)
+                    JOIN links.atributo a
+                      ON a.hash = hashtextextended(f.id2, 0) AND a.id2 = f.id2
+                    CROSS JOIN LATERAL (
+                        SELECT id1
+                        FROM links.link_ete
+                        WHERE descricao = :descricao AND id2 = a.chave
+                        ORDER BY id1
+                        LIMIT :limite
+                    ) l
+                """),
+                {"descricao": descricao, "ids2": ids2, "limite": LIMITE_CNPJS_POR_VALOR_LOTE + 1}
+            )
+            for id2, id1, valor in result.fetchall():
+                _, cnpjs = cnpjs_por_id2.setdefault(id2, (valor, []))
+                if id1.startswith('PJ_'):
+                    cnpjs.append(id1[3:])
+
+    resultados = {}
+    for valor, chave in chaves.items():
+        total, cnpjs = cnpjs_por_id2.get(prefixo + chave, (0, [])) if chave else (0, [])
+        hub = total > COMPARTILHADOS_LIMITE_HUB
+        tem_proxima = len(cnpjs) > LIMITE_CNPJS_POR_VALOR_LOTE and not hub
+        cnpjs = cnpjs[:LIMITE_CNPJS_POR_VALOR_LOTE]
+        resultados[valor] = {
+            "chave": chave or None,
+            "total": total,
+            "hub": hub,
+            "cnpjs": cnpjs,
+            "proximo": cnpjs[-1] if tem_proxima and cnpjs else None
+        }
+
+    return {
+        "total_valores": len(chaves),
+        "total_encontrados": sum(1 for r in resultados.values() if r["total"]),
+        "resultados": resultados
+    }
+
+@router.post("/emails/compartilhados/lote")
+async def emails_compartilhados_lote(
+    consulta: ConsultaLote,
+    user: dict = Depends(require_active_user)
+):
+    """Retorna, para cada email da lista, os CNPJs que o compartilham"""
+    return await buscar_compartilhados_lote(user, consulta.valores, 'email', 'EM_', ajusta_email)
+
+@router.post("/telefones/compartilhados/lote")
+async def telefones_compartilhados_lote(
+    consulta: ConsultaLote,
+    user: dict = Depends(require_active_user)
+):
+    """Retorna, para cada telefone da lista ("DDD NÚMERO"), os CNPJs que o compartilham"""
+    return await buscar_compartilhados_lote(user, consulta.valores, 'tel', 'TE_', telefone_de_entrada)
+
+@router.post("/enderecos/compartilhados/lote")
+async def enderecos_compartilhados_lote(
+    consulta: ConsultaLote,
+    user: dict = Depends(require_active_user)
+):
+    """Retorna, para cada endereço da lista (já normalizado), os CNPJs que o compartilham"""
+    return await buscar_compartilhados_lote(user, consulta.valores, 'end', 'EN_', str.strip)
+
 # ============ ENDPOINTS DE DUPLICADOS ============
 
+# links.atributo_compartilhado tem uma linha por valor distinto; o índice
+# (tipo, qtd_cnpjs DESC) INCLUDE (chave) torna o top-k um index-only scan.
+SQL_ATRIBUTOS_DUPLICADOS = text("""
+    SELECT chave, qtd_cnpjs
+    FROM links.atributo_compartilhado
+    WHERE tipo = :tipo AND qtd_cnpjs >= :minimo
+    ORDER BY qtd_cnpjs DESC
+    LIMIT :limite
+""")
+
 @router.get("/enderecos/duplicados")
 async def enderecos_duplicados(
     minimo: int = Query(2, ge=2, description="Quantidade mínima de CNPJs por endereço"),
@@ -143,14 +931,8 @@ async def enderecos_duplicados(
     
     async with AsyncSessionLocal() as session:
         result = await session.execute(
-            text("""
-                SELECT id2, valor 
-                FROM links.link_ete 
-                WHERE descricao = 'end' AND valor >= :minimo
-                ORDER BY valor DESC
-                LIMIT :limite
-            """),
-            {"minimo": minimo, "limite": limite}
+            SQL_ATRIBUTOS_DUPLICADOS,
+            {"tipo": "end", "minimo": minimo, "limite": limite}
         )
         rows = result.fetchall()
         dados = []
@@ -178,14 +960,8 @@ async def telefones_duplicados(
     
     async with AsyncSessionLocal() as session:
         result = await session.execute(
-            text("""
-                SELECT id2, valor 
-                FROM links.link_ete 
-                WHERE descricao = 'tel' AND valor >= :minimo
-                ORDER BY valor DESC
-                LIMIT :limite
-            """),
-            {"minimo": minimo, "limite": limite}
+            SQL_ATRIBUTOS_DUPLICADOS,
+            {"tipo": "tel", "minimo": minimo, "limite": limite}
         )
         rows = result.fetchall()
         dados = []
@@ -213,14 +989,8 @@ async def emails_duplicados(
     
     async with AsyncSessionLocal() as session:
         result = await session.execute(
-            text("""
-                SELECT id2, valor 
-                FROM links.link_ete 
-                WHERE descricao = 'email' AND valor >= :minimo
-                ORDER BY valor DESC
-                LIMIT :limite
-            """),
-            {"minimo": minimo, "limite": limite}
+            SQL_ATRIBUTOS_DUPLICADOS,
+            {"tipo": "email", "minimo": minimo, "limite": limite}
         )
         rows = result.fetchall()
         dados = []
@@ -239,48 +1009,70 @@ async def emails_duplicados(
 
 # ============ VÍNCULOS E REDE ============
 
-@router.get("/vinculos/{cnpj}")
-async def vinculos_do_cnpj(
-    cnpj: str,
-    user: dict = Depends(require_active_user)
-):
-    """Retorna todos os vínculos (endereço, telefone, email, societários) de um CNPJ"""
-    await check_and_update_rate_limit(user, qtd_reqs=1)
-    
-    # Remove formatação do CNPJ
-    cnpj_limpo = re.sub(r'\D', '', cnpj)
-    
+# Centralidade pré-calculada pelo importador (rede.centralidade)
+SQL_CENTRALIDADE = text("""
+    SELECT pagerank, posicao, grau, grau_ete
+    FROM rede.centralidade
+    WHERE chave = :chave
+""")
+
+def formatar_centralidade(row):
+    if row is None:
+        return None
+    return {
+        "pagerank": row[0],
+        "posicao": row[1],
+        "grau": row[2],
+        "grau_ete": row[3]
+    }
+
+async def montar_vinculos(cnpj_limpo):
+    """Monta os vínculos (endereço, telefone, email, societários) de um CNPJ"""
     async with AsyncSessionLocal() as session:
         # Busca vínculos ETE (endereço, telefone, email)
-        result = await session.execute(
-            text("SELECT id2, descricao, valor FROM links.link_ete WHERE id1 = :id1"),
-            {"id1": f"PJ_{cnpj_limpo}"}
-        )
-        rows_ete = result.fetchall()
-        
-        # Busca ligações societárias (saída - onde o CNPJ é origem)
         result = await session.execute(
             text("""
-                SELECT id2, descricao, comentario 
-                FROM rede.ligacao 
-                WHERE id1 = :id1
-                LIMIT 100
+                SELECT a.id2, le.descricao, le.valor
+                FROM links.link_ete le
+                JOIN links.atributo a ON a.chave = le.id2
+                WHERE le.id1 = :id1
             """),
             {"id1": f"PJ_{cnpj_limpo}"}
         )
-        rows_ligacao_saida = result.fetchall()
+        rows_ete = result.fetchall()
         
-        # Busca ligações societárias (entrada - onde o CNPJ é destino)
-        result = await session.execute(
-            text("""
-                SELECT id1, descricao, comentario 
-                FROM rede.ligacao 
-                WHERE id2 = :id2
-                LIMIT 100
-            """),
-            {"id2": f"PJ_{cnpj_limpo}"}
-        )
-        rows_ligacao_entrada = result.fetchall()
+        if grafo_csr is not None:
+            # Ligações societárias a partir do grafo em memória
+            rows_ligacao_saida = grafo_csr.vizinhos(f"PJ_{cnpj_limpo}", "saida", 100)
+            rows_ligacao_entrada = grafo_csr.vizinhos(f"PJ_{cnpj_limpo}", "entrada", 100)
+        else:
+            # Busca ligações societárias (saída - onde o CNPJ é origem)
+            result = await session.execute(
+                text("""
+                    SELECT id2, descricao, comentario 
+                    FROM rede.ligacao 
+                    WHERE id1 = :id1
+                    LIMIT 100
+                """),
+                {"id1": f"PJ_{cnpj_limpo}"}
+            )
+            rows_ligacao_saida = result.fetchall()
+            
+            # Busca ligações societárias (entrada - onde o CNPJ é destino)
+            result = await session.execute(
+                text("""
+                    SELECT id1, descricao, comentario 
+                    FROM rede.ligacao 
+                    WHERE id2 = :id2
+                    LIMIT 100
+                """),
+                {"id2": f"PJ_{cnpj_limpo}"}
+            )
+            rows_ligacao_entrada = result.fetchall()
+        
+        centralidade = (await session.execute(
+            SQL_CENTRALIDADE, {"chave": f"PJ_{cnpj_limpo}"}
+        )).first()
         
         # Processa vínculos ETE
         vinculos_ete = []
@@ -342,286 +1134,999 @@ async def vinculos_do_cnpj(
             "entrada": ligacoes_entrada[:50],  # Limita a 50
             "total_saida": len(ligacoes_saida),
             "total_entrada": len(ligacoes_entrada)
-        }
+        },
+        "centralidade": formatar_centralidade(centralidade)
     }
 
-@router.get("/rede/{cnpj}")
-async def rede_do_cnpj(
+@router.get("/vinculos/{cnpj}")
+async def vinculos_do_cnpj(
     cnpj: str,
-    nivel: int = Query(1, ge=1, le=3, description="Nível de profundidade da rede"),
     user: dict = Depends(require_active_user)
 ):
-    """Retorna a rede de relacionamentos de um CNPJ até o nível especificado"""
-    # Rate limit baseado no nível de profundidade
-    await check_and_update_rate_limit(user, qtd_reqs=nivel)
+    """Retorna todos os vínculos (endereço, telefone, email, societários) de um CNPJ"""
+    await check_and_update_rate_limit(user, qtd_reqs=1)
     
+    # Remove formatação do CNPJ
     cnpj_limpo = re.sub(r'\D', '', cnpj)
     
-    async with AsyncSessionLocal() as session:
-        nodes = set()
-        edges = []
-        visitados = set()
-        
-        async def buscar_ligacoes(id_origem, nivel_atual):
-            if nivel_atual > nivel or id_origem in visitados:
-                return
-            
-            visitados.add(id_origem)
-            nodes.add(id_origem)
-            
-            # Busca ligações de saída
-            result = await session.execute(
-                text("""
-                    SELECT id2, descricao 
-                    FROM rede.ligacao 
-                    WHERE id1 = :id1
-                    LIMIT 50
-                """),
-                {"id1": id_origem}
-            )
-            rows_saida = result.fetchall()
-            
-            # Busca ligações de entrada
-            result = await session.execute(
-                text("""
-                    SELECT id1, descricao 
-                    FROM rede.ligacao 
-                    WHERE id2 = :id2
-                    LIMIT 50
-                """),
-                {"id2": id_origem}
-            )
-            rows_entrada = result.fetchall()
-            
-            # Processa ligações de saída
-            for row in rows_saida:
-                destino = row[0]
-                tipo = row[1]
-                nodes.add(destino)
-                edge_id = f"{id_origem}->{destino}"
-                edges.append({
-                    "id": edge_id,
-                    "origem": id_origem,
-                    "destino": destino,
-                    "tipo": tipo,
-                    "direcao": "saida"
-                })
-                
-                if nivel_atual < nivel:
-                    await buscar_ligacoes(destino, nivel_atual + 1)
-            
-            # Processa ligações de entrada
-            for row in rows_entrada:
-                origem = row[0]
-                tipo = row[1]
-                nodes.add(origem)
-                edge_id = f"{origem}->{id_origem}"
-                edges.append({
-                    "id": edge_id,
-                    "origem": origem,
-                    "destino": id_origem,
-                    "tipo": tipo,
-                    "direcao": "entrada"
-                })
-                
-                if nivel_atual < nivel:
-                    await buscar_ligacoes(origem, nivel_atual + 1)
-        
-        # Inicia busca recursiva
-        await buscar_ligacoes(f"PJ_{cnpj_limpo}", 1)
-        
-        # Formata nodes para incluir tipo e nome
-        nodes_formatados = []
-        for node in nodes:
-            if node.startswith("PJ_"):
-                tipo_node = "Pessoa Jurídica"
-                label = node[3:]
-            elif node.startswith("PF_"):
-                tipo_node = "Pessoa Física"
-                label = node[3:]
-            elif node.startswith("PE_"):
-                tipo_node = "Pessoa Estrangeira"
-                label = node[3:]
-            else:
-                tipo_node = "Desconhecido"
-                label = node
-            
-            nodes_formatados.append({
-                "id": node,
-                "tipo": tipo_node,
-                "label": label
-            })
+    return await responder_com_cache(("vinculos", cnpj_limpo), lambda: montar_vinculos(cnpj_limpo))
+
+# Enriquecimento dos nós PJ (enriquecer=true): uma consulta = ANY por lote
+LOTE_ENRIQUECIMENTO = 10000
+
+SQL_ENRIQUECER_PJ = text("""
+    SELECT e.cnpj, emp.razao_social, e.situacao_cadastral, e.uf, m.descricao
+    FROM cnpj.estabelecimento e
+    LEFT JOIN cnpj.empresas emp ON emp.cnpj_basico = e.cnpj_basico
+    LEFT JOIN cnpj.municipio m ON m.codigo = e.municipio
+    WHERE e.cnpj = ANY(:cnpjs)
+""")
+
+async def enriquecer_nodes(session, nodes_formatados):
+    """Acrescenta razão social (como label), situação, UF e município aos nós PJ"""
+    cnpjs = [node["id"][3:] for node in nodes_formatados if node["id"].startswith("PJ_")]
+    dados = {}
+    for inicio in range(0, len(cnpjs), LOTE_ENRIQUECIMENTO):
+        result = await session.execute(
+            SQL_ENRIQUECER_PJ, {"cnpjs": cnpjs[inicio:inicio + LOTE_ENRIQUECIMENTO]}
+        )
+        dados.update((row[0], row[1:]) for row in result.fetchall())
+    
+    for node in nodes_formatados:
+        if not node["id"].startswith("PJ_"):
+            continue
+        linha = dados.get(node["id"][3:])
+        if linha is None:
+            continue
+        razao_social, situacao, uf, municipio = linha
+        node["label"] = razao_social or node["label"]
+        node["razao_social"] = razao_social
+        node["situacao_cadastral"] = SITUACAO_CADASTRAL_MAP.get(situacao, situacao)
+        node["uf"] = uf
+        node["municipio"] = municipio
+    return nodes_formatados
+
+async def montar_rede(buscar_rede, origem, nivel, limite_por_no, grau_max_hub, sessoes=None,
+                      enriquecer=False):
+    """Travessia a partir da chave `origem` no formato de resposta de /rede"""
+    async with (sessoes or AsyncSessionLocal)() as session:
+        nodes, edges, hubs = await buscar_rede(
+            session, [origem], nivel, limite_por_no, grau_max_hub
+        )
         
-        # Remove duplicatas de edges
-        edges_unicos = []
-        edges_ids = set()
-        for edge in edges:
-            if edge["id"] not in edges_ids:
-                edges_ids.add(edge["id"])
-                edges_unicos.append(edge)
+        nodes_formatados = formatar_nodes(nodes)
+        if enriquecer:
+            await enriquecer_nodes(session, nodes_formatados)
     
     return {
-        "cnpj_origem": cnpj_limpo,
         "nivel_profundidade": nivel,
         "total_nodes": len(nodes_formatados),
-        "total_edges": len(edges_unicos),
+        "total_edges": len(edges),
         "nodes": nodes_formatados,
-        "edges": edges_unicos
+        "edges": edges,
+        "total_hubs": len(hubs),
+        "hubs": [{"id": no, "grau": grau} for no, grau in sorted(hubs.items(), key=lambda h: -h[1])]
     }
 
-# ============ ANÁLISES AVANÇADAS ============
+# Pessoas: PF_{cpf_mascarado}-{nome} (sócio/representante) e PE_{nome}
+# (sócio no exterior). A busca por prefixo é um intervalo [prefixo,
+# prefixo_fim) com os operadores de text_pattern_ops (~>=~, ~<~), que usam o
+# índice parcial idx_no_pessoa_prefixo de rede.no mesmo em plano genérico
+# (LIKE com parâmetro pode cair em seq scan).
+LIMITE_CANDIDATOS_PESSOA = 20
 
-@router.get("/analise/grupo_economico/{cnpj}")
-async def analisar_grupo_economico(
+SQL_PESSOAS_POR_PREFIXO = text("""
+    SELECT chave
+    FROM rede.no
+    WHERE tipo IN (2, 3)
+      AND chave ~>=~ :prefixo
+      AND chave ~<~ :prefixo_fim
+    ORDER BY chave
+    LIMIT :limite
+""")
+
+def cpf_mascarado_de_entrada(valor):
+    """Aceita '***123456**', '123.456' ou '123456' e devolve o formato da Receita"""
+    digitos = re.sub(r'\D', '', valor or '')
+    if len(digitos) != 6:
+        raise HTTPException(422, "CPF mascarado inválido: informe os 6 dígitos visíveis (ex.: ***123456**).")
+    return f"***{digitos}**"
+
+async def resolver_pessoa(cpf_mascarado, nome):
+    """Chaves de pessoa cujo prefixo corresponde ao CPF mascarado e/ou nome"""
+    nome = ' '.join((nome or '').upper().split())
+    if cpf_mascarado:
+        prefixo = f"PF_{cpf_mascarado_de_entrada(cpf_mascarado)}-{nome}"
+    elif nome:
+        prefixo = f"PE_{nome}"
+    else:
+        raise HTTPException(422, "Informe 'cpf_mascarado' e/ou 'nome'.")
+    
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(SQL_PESSOAS_POR_PREFIXO, {
+            "prefixo": prefixo,
+            "prefixo_fim": prefixo[:-1] + chr(ord(prefixo[-1]) + 1),
+            "limite": LIMITE_CANDIDATOS_PESSOA
+        })
+        chaves = [row[0] for row in result.fetchall()]
+    
+    # Nome completo informado: a chave exata tem precedência sobre homônimos
+    # com sobrenomes a mais
+    if prefixo in chaves:
+        return [prefixo]
+    return chaves
+
+@router.get("/rede/pessoa")
+async def rede_da_pessoa(
+    cpf_mascarado: str = Query(None, description="CPF mascarado do sócio (ex.: ***123456**)"),
+    nome: str = Query(None, description="Nome (ou início do nome); sem CPF, busca sócio no exterior (PE_)"),
+    nivel: int = Query(1, ge=1, le=3, description="Nível de profundidade da rede"),
+    limite_por_no: int = Query(
+        LIMITE_LIGACOES_POR_NO, ge=1, le=LIMITE_LIGACOES_POR_NO,
+        description="Máximo de ligações por direção expandidas a partir de cada nó"
+    ),
+    motor: str = Query(None, description="Motor de travessia: bfs, cte ou csr (padrão: csr se carregado, senão REDE_MOTOR)"),
+    grau_max_hub: int = Query(
+        None, ge=0,
+        description="Nós com mais ligações que isso não são expandidos (0 desativa; padrão: REDE_GRAU_MAX_HUB)"
+    ),
+    enriquecer: bool = Query(False, description="Inclui razão social, situação, UF e município dos nós PJ"),
+    user: dict = Depends(require_active_user)
+):
+    """
+    Retorna a rede de relacionamentos de uma pessoa (PF_ ou PE_).
+
+    Se o CPF mascarado/nome corresponder a mais de uma pessoa, retorna só
+    os candidatos, sem travessia, para que a busca seja refinada.
+    """
+    buscar_rede = obter_motor_rede(motor)
+    if grau_max_hub is None:
+        grau_max_hub = REDE_GRAU_MAX_HUB
+    
+    await check_and_update_rate_limit(user, qtd_reqs=nivel)
+    
+    chaves = await resolver_pessoa(cpf_mascarado, nome)
+    if not chaves:
+        raise HTTPException(404, "Pessoa não encontrada na rede.")
+    if len(chaves) > 1:
+        return {
+            "ambiguo": True,
+            "total_candidatos": len(chaves),
+            "candidatos": formatar_nodes(chaves)
+        }
+    
+    origem = chaves[0]
+    
+    async def montar_rede_pessoa():
+        return {
+            "pessoa_origem": origem,
+            **await montar_rede(
+                buscar_rede, origem, nivel, limite_por_no, grau_max_hub, enriquecer=enriquecer
+            )
+        }
+    
+    return await responder_com_cache(
+        ("rede", origem, nivel, limite_por_no, grau_max_hub, enriquecer), montar_rede_pessoa
+    )
+
+@router.get("/rede/{cnpj}")
+async def rede_do_cnpj(
     cnpj: str,
+    nivel: int = Query(1, ge=1, le=3, description="Nível de profundidade da rede"),
+    limite_por_no: int = Query(
+        LIMITE_LIGACOES_POR_NO, ge=1, le=LIMITE_LIGACOES_POR_NO,
+        description="Máximo de ligações por direção expandidas a partir de cada nó"
+    ),
+    motor: str = Query(None, description="Motor de travessia: bfs, cte ou csr (padrão: csr se carregado, senão REDE_MOTOR)"),
+    grau_max_hub: int = Query(
+        None, ge=0,
+        description="Nós com mais ligações que isso não são expandidos (0 desativa; padrão: REDE_GRAU_MAX_HUB)"
+    ),
+    enriquecer: bool = Query(False, description="Inclui razão social, situação, UF e município dos nós PJ"),
     user: dict = Depends(require_active_user)
 ):
-    """Analisa o grupo econômico de um CNPJ através de conexões diretas e indiretas"""
-    await check_and_update_rate_limit(user, qtd_reqs=5)
+    """Retorna a rede de relacionamentos de um CNPJ até o nível especificado"""
+    buscar_rede = obter_motor_rede(motor)
+    if grau_max_hub is None:
+        grau_max_hub = REDE_GRAU_MAX_HUB
+    
+    # Rate limit baseado no nível de profundidade
+    await check_and_update_rate_limit(user, qtd_reqs=nivel)
     
     cnpj_limpo = re.sub(r'\D', '', cnpj)
     
-    async with AsyncSessionLocal() as session:
-        grupo = {
-            "empresas_controladas": [],
-            "empresas_controladoras": [],
-            "socios_pf": [],
-            "socios_pj": [],
-            "enderecos_compartilhados": [],
-            "telefones_compartilhados": [],
-            "emails_compartilhados": []
+    async def montar_rede_cnpj():
+        return {
+            "cnpj_origem": cnpj_limpo,
+            **await montar_rede(
+                buscar_rede, f"PJ_{cnpj_limpo}", nivel, limite_por_no, grau_max_hub, enriquecer=enriquecer
+            )
         }
-        
-        # Busca empresas onde o CNPJ é sócio (controladas)
-        result = await session.execute(
-            text("""
-                SELECT DISTINCT id2, descricao 
-                FROM rede.ligacao 
-                WHERE id1 = :id1 
-                  AND id2 LIKE 'PJ_%'
-                  AND descricao NOT IN ('filial')
-                LIMIT 100
-            """),
-            {"id1": f"PJ_{cnpj_limpo}"}
-        )
-        for row in result.fetchall():
-            grupo["empresas_controladas"].append({
-                "cnpj": row[0][3:] if row[0].startswith('PJ_') else row[0],
-                "tipo_vinculo": row[1]
-            })
-        
-        # Busca empresas que são sócias do CNPJ (controladoras)
-        result = await session.execute(
-            text("""
-                SELECT DISTINCT id1, descricao 
-                FROM rede.ligacao 
-                WHERE id2 = :id2 
-                  AND id1 LIKE 'PJ_%'
-                  AND descricao NOT IN ('filial')
-                LIMIT 100
-            """),
-            {"id2": f"PJ_{cnpj_limpo}"}
+    
+    return await responder_com_cache(
+        ("rede", cnpj_limpo, nivel, limite_por_no, grau_max_hub, enriquecer), montar_rede_cnpj
+    )
+
+# Exportação em streaming: eventos por bloco da fronteira da travessia BFS
+# (SQL), sem montar o grafo em memória. Os ids de nós e arestas já emitidos
+# (para não repetir) ficam em memória, então a exportação para ao atingir
+# EXPORTACAO_MAX_NOS nós ou EXPORTACAO_MAX_ARESTAS arestas; os limites vão
+# nos cabeçalhos da resposta.
+LIMITE_EXPORTACAO_POR_NO = 200
+LOTE_FRONTEIRA_EXPORTACAO = 500
+EXPORTACAO_MAX_NOS = int(os.getenv("EXPORTACAO_MAX_NOS", "100000"))
+EXPORTACAO_MAX_ARESTAS = int(os.getenv("EXPORTACAO_MAX_ARESTAS", "500000"))
+
+async def eventos_rede(origem, nivel, limite_por_no, grau_max_hub=0):
+    """Gera ("node", dict) e ("edge", dict) à medida que os níveis são lidos"""
+    async with AsyncSessionLocal() as session:
+        sql_saida, sql_entrada, sql_hubs = sqls_bfs(REDE_IDS_INTEIROS, grau_max_hub)
+        origens = [origem]
+        if REDE_IDS_INTEIROS:
+            origens = list((await chaves_para_ids(session, origens)).values())
+            tipos = await obter_tipos_ligacao(session)
+
+        nos_emitidos = {origem}
+        edges_ids = set()
+        yield "node", formatar_node(origem)
+
+        niveis = _niveis_bfs(
+            session, sql_saida, sql_entrada, origens, nivel, limite_por_no, sql_hubs, grau_max_hub,
+            lote_fronteira=LOTE_FRONTEIRA_EXPORTACAO
         )
-        for row in result.fetchall():
-            grupo["empresas_controladoras"].append({
-                "cnpj": row[0][3:] if row[0].startswith('PJ_') else row[0],
-                "tipo_vinculo": row[1]
-            })
-        
-        # Busca sócios pessoas físicas
+        try:
+            async for arestas, _ in niveis:
+                if REDE_IDS_INTEIROS:
+                    chaves = await ids_para_chaves(session, {no for a in arestas for no in a[:2]})
+                    arestas = [(chaves[o], chaves[d], tipos.get(t), direcao) for o, d, t, direcao in arestas]
+
+                for no_origem, no_destino, tipo, direcao in arestas:
+                    novos = [no for no in dict.fromkeys((no_origem, no_destino)) if no not in nos_emitidos]
+                    if len(nos_emitidos) + len(novos) > EXPORTACAO_MAX_NOS:
+                        return
+                    edge_id = f"{no_origem}->{no_destino}"
+                    if edge_id in edges_ids:
+                        continue
+                    if len(edges_ids) >= EXPORTACAO_MAX_ARESTAS:
+                        return
+                    for no in novos:
+                        nos_emitidos.add(no)
+                        yield "node", formatar_node(no)
+                    edges_ids.add(edge_id)
+                    yield "edge", {
+                        "id": edge_id,
+                        "origem": no_origem,
+                        "destino": no_destino,
+                        "tipo": tipo,
+                        "direcao": direcao
+                    }
+        finally:
+            await niveis.aclose()
+
+@router.get("/rede/{cnpj}/export")
+async def exportar_rede_do_cnpj(
+    cnpj: str,
+    formato: str = Query("graphml", description="Formato: graphml, gexf, cytoscape ou ndjson"),
+    nivel: int = Query(1, ge=1, le=3, description="Nível de profundidade da rede"),
+    limite_por_no: int = Query(
+        LIMITE_LIGACOES_POR_NO, ge=1, le=LIMITE_EXPORTACAO_POR_NO,
+        description="Máximo de ligações por direção expandidas a partir de cada nó"
+    ),
+    grau_max_hub: int = Query(
+        None, ge=0,
+        description="Nós com mais ligações que isso não são expandidos (0 desativa; padrão: REDE_GRAU_MAX_HUB)"
+    ),
+    user: dict = Depends(require_active_user)
+):
+    """
+    Exporta a rede de um CNPJ em streaming (GraphML, GEXF, Cytoscape JSON ou NDJSON).
+
+    A memória cresce com o número de nós e arestas exportados (ids já
+    emitidos); a exportação para em EXPORTACAO_MAX_NOS nós ou
+    EXPORTACAO_MAX_ARESTAS arestas, informados nos cabeçalhos
+    X-Limite-Nos e X-Limite-Arestas.
+    """
+    if formato not in FORMATOS_EXPORTACAO:
+        raise HTTPException(422, f"Formato inválido: {formato}. Opções: {', '.join(FORMATOS_EXPORTACAO)}")
+    if grau_max_hub is None:
+        grau_max_hub = REDE_GRAU_MAX_HUB
+    
+    # Rate limit baseado no nível de profundidade
+    await check_and_update_rate_limit(user, qtd_reqs=nivel)
+    
+    cnpj_limpo = re.sub(r'\D', '', cnpj)
+    exportador = FORMATOS_EXPORTACAO[formato]()
+    
+    return StreamingResponse(
+        exportar_stream(exportador, eventos_rede(f"PJ_{cnpj_limpo}", nivel, limite_por_no, grau_max_hub)),
+        media_type=exportador.media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="rede_{cnpj_limpo}.{exportador.extensao}"',
+            "X-Limite-Nos": str(EXPORTACAO_MAX_NOS),
+            "X-Limite-Arestas": str(EXPORTACAO_MAX_ARESTAS)
+        }
+    )
+
+@router.get("/caminho")
+async def caminho_entre_entidades(
+    origem: str = Query(..., description="CNPJ ou chave do nó (PJ_, PF_, PE_, EN_, TE_, EM_)"),
+    destino: str = Query(..., description="CNPJ ou chave do nó (PJ_, PF_, PE_, EN_, TE_, EM_)"),
+    max_saltos: int = Query(4, ge=1, le=6, description="Número máximo de ligações no caminho"),
+    incluir_ete: bool = Query(False, description="Inclui ligações por endereço, telefone e email"),
+    user: dict = Depends(require_active_user)
+):
+    """Retorna o(s) menor(es) caminho(s) entre duas entidades da rede (BFS bidirecional)"""
+    chave_origem = chave_no(origem)
+    chave_destino = chave_no(destino)
+
+    # Rate limit baseado no número máximo de saltos
+    await check_and_update_rate_limit(user, qtd_reqs=max_saltos)
+
+    prazo = time.monotonic() + CAMINHO_TEMPO_MAX_S
+
+    async with AsyncSessionLocal() as session:
+        if grafo_csr is None or incluir_ete:
+            await session.execute(text(f"SET LOCAL statement_timeout = {int(CAMINHO_TEMPO_MAX_S * 1000)}"))
+
+        async def vizinhos(fronteira):
+            return await vizinhos_caminho(session, fronteira, incluir_ete)
+
+        try:
+            resultado = await buscar_caminhos(
+                vizinhos, chave_origem, chave_destino, max_saltos,
+                CAMINHO_MAX_FRONTEIRA, prazo, CAMINHO_MAX_CAMINHOS
+            )
+        except DBAPIError as e:
+            if "statement timeout" not in str(e):
+                raise
+            resultado = {"distancia": None, "caminhos": [], "limite_atingido": "tempo"}
+
+    return {
+        "origem": chave_origem,
+        "destino": chave_destino,
+        "max_saltos": max_saltos,
+        "encontrado": resultado["distancia"] is not None,
+        "distancia": resultado["distancia"],
+        "total_caminhos": len(resultado["caminhos"]),
+        "caminhos": resultado["caminhos"],
+        "limite_atingido": resultado["limite_atingido"]
+    }
+
+async def montar_grupo(cnpj_basico, limite):
+    """Membros do grupo econômico (rede.grupo) de uma empresa"""
+    async with AsyncSessionLocal() as session:
         result = await session.execute(
             text("""
-                SELECT DISTINCT id1, descricao 
-                FROM rede.ligacao 
-                WHERE id2 = :id2 
-                  AND id1 LIKE 'PF_%'
-                LIMIT 100
+                SELECT g.grupo_id, g.tamanho, m.cnpj_basico, emp.razao_social
+                FROM rede.grupo g
+                CROSS JOIN LATERAL (
+                    SELECT cnpj_basico
+                    FROM rede.grupo
+                    WHERE grupo_id = g.grupo_id
+                    ORDER BY cnpj_basico
+                    LIMIT :limite
+                ) m
+                LEFT JOIN cnpj.empresas emp ON emp.cnpj_basico = m.cnpj_basico
+                WHERE g.cnpj_basico = :cnpj_basico
+                ORDER BY m.cnpj_basico
             """),
-            {"id2": f"PJ_{cnpj_limpo}"}
+            {"cnpj_basico": cnpj_basico, "limite": limite}
         )
-        for row in result.fetchall():
-            grupo["socios_pf"].append({
-                "socio": row[0][3:] if row[0].startswith('PF_') else row[0],
-                "tipo_vinculo": row[1]
-            })
-        
-        # Busca sócios pessoas jurídicas
-        result = await session.execute(
-            text("""
-                SELECT DISTINCT id1, descricao 
-                FROM rede.ligacao 
-                WHERE id2 = :id2 
-                  AND id1 LIKE 'PJ_%'
-                  AND descricao IN ('Sócio', 'Administrador', 'Diretor', 'Presidente')
-                LIMIT 100
-            """),
-            {"id2": f"PJ_{cnpj_limpo}"}
+        rows = result.fetchall()
+
+    if not rows:
+        # Sem ligações societárias: a empresa é o próprio grupo
+        return {
+            "cnpj_basico": cnpj_basico,
+            "grupo_id": None,
+            "tamanho": 1,
+            "total_retornado": 1,
+            "empresas": [{"cnpj_basico": cnpj_basico, "razao_social": None}]
+        }
+
+    return {
+        "cnpj_basico": cnpj_basico,
+        "grupo_id": rows[0][0],
+        "tamanho": rows[0][1],
+        "total_retornado": len(rows),
+        "empresas": [
+            {"cnpj_basico": row[2], "razao_social": row[3]}
+            for row in rows
+        ]
+    }
+
+@router.get("/grupo/{cnpj}")
+async def grupo_do_cnpj(
+    cnpj: str,
+    limite: int = Query(1000, ge=1, le=10000, description="Máximo de empresas retornadas"),
+    user: dict = Depends(require_active_user)
+):
+    """Retorna o grupo econômico completo (componente conexo pré-calculado em rede.grupo)"""
+    await check_and_update_rate_limit(user, qtd_reqs=1)
+
+    cnpj_basico = re.sub(r'\D', '', cnpj)[:8]
+
+    return await responder_com_cache(
+        ("grupo", cnpj_basico, limite), lambda: montar_grupo(cnpj_basico, limite)
+    )
+
+# ============ JOBS ASSÍNCRONOS ============
+
+# Travessias mais profundas/largas que as de /rede, executadas fora do
+# processo da API (ver app/jobs.py)
+JOBS_NIVEL_MAX = 6
+JOBS_LIMITE_POR_NO_MAX = 500
+
+class JobEntrada(BaseModel):
+    tipo: str = "rede"
+    origem: str
+    nivel: int = 4
+    limite_por_no: int = LIMITE_LIGACOES_POR_NO
+    grau_max_hub: Optional[int] = None
+    enriquecer: bool = False
+
+async def job_rede(sessoes, origem, nivel, limite_por_no, grau_max_hub, enriquecer=False):
+    """Job "rede": mesma resposta de /rede, a partir de qualquer chave de nó"""
+    return {
+        "origem": origem,
+        **await montar_rede(
+            obter_motor_rede(), origem, nivel, limite_por_no, grau_max_hub, sessoes, enriquecer
         )
-        for row in result.fetchall():
-            grupo["socios_pj"].append({
-                "cnpj_socio": row[0][3:] if row[0].startswith('PJ_') else row[0],
-                "tipo_vinculo": row[1]
+    }
+
+# Tipos de job -> coroutine executada no processo filho
+TIPOS_JOB = {
+    "rede": job_rede,
+}
+
+@router.post("/jobs", status_code=202)
+async def submeter_job(
+    entrada: JobEntrada,
+    user: dict = Depends(require_active_user)
+):
+    """Agenda uma análise pesada; acompanhe em GET /jobs/{id}"""
+    if entrada.tipo not in TIPOS_JOB:
+        raise HTTPException(422, f"Tipo de job inválido: {entrada.tipo}. Use: {', '.join(TIPOS_JOB)}")
+    if not 1 <= entrada.nivel <= JOBS_NIVEL_MAX:
+        raise HTTPException(422, f"nivel deve estar entre 1 e {JOBS_NIVEL_MAX}")
+    if not 1 <= entrada.limite_por_no <= JOBS_LIMITE_POR_NO_MAX:
+        raise HTTPException(422, f"limite_por_no deve estar entre 1 e {JOBS_LIMITE_POR_NO_MAX}")
+    
+    # Valida a origem antes de consumir o limite de uso
+    origem = chave_no(entrada.origem)
+    await check_and_update_rate_limit(user, qtd_reqs=entrada.nivel)
+    
+    parametros = {
+        "origem": origem,
+        "nivel": entrada.nivel,
+        "limite_por_no": entrada.limite_por_no,
+        "grau_max_hub": REDE_GRAU_MAX_HUB if entrada.grau_max_hub is None else entrada.grau_max_hub,
+        "enriquecer": entrada.enriquecer,
+    }
+    async with AsyncSessionLocal() as session:
+        job_id = await jobs.criar_job(session, user["email"], entrada.tipo, parametros)
+    if job_id is None:
+        raise HTTPException(429, f"Máximo de {jobs.JOBS_MAX_POR_USUARIO} jobs em andamento por usuário.")
+    
+    return {"id": job_id, "status": "pendente", "tipo": entrada.tipo, "parametros": parametros}
+
+@router.get("/jobs/{job_id}")
+async def status_job(
+    job_id: str,
+    user: dict = Depends(require_active_user)
+):
+    """Status de um job (pendente, executando, concluido ou erro)"""
+    async with AsyncSessionLocal() as session:
+        row = (await session.execute(
+            jobs.SQL_STATUS_JOB, {"id": job_id, "email": user["email"]}
+        )).first()
+    if row is None:
+        raise HTTPException(404, "Job não encontrado")
+    
+    job = dict(row._mapping)
+    job["parametros"] = json.loads(job["parametros"]) if job["parametros"] else None
+    return job
+
+@router.get("/jobs/{job_id}/resultado")
+async def resultado_job(
+    job_id: str,
+    user: dict = Depends(require_active_user)
+):
+    """Resultado de um job concluído"""
+    async with AsyncSessionLocal() as session:
+        row = (await session.execute(
+            jobs.SQL_RESULTADO_JOB, {"id": job_id, "email": user["email"]}
+        )).first()
+    if row is None:
+        raise HTTPException(404, "Job não encontrado")
+    status, resultado = row
+    if status != "concluido":
+        raise HTTPException(409, f"Job ainda não concluído (status: {status})")
+    
+    return Response(content=gzip.decompress(resultado), media_type="application/json")
+
+# ============ RANKING ============
+
+TIPOS_RANKING = {"pj": 1, "pf": 2, "pe": 3}
+
+SQL_RANKING_TIPO = text("""
+    SELECT chave, pagerank, posicao, grau, grau_ete
+    FROM rede.centralidade
+    WHERE tipo = :tipo
+    ORDER BY pagerank DESC
+    LIMIT :limite
+""")
+
+SQL_RANKING_GERAL = text("""
+    SELECT chave, pagerank, posicao, grau, grau_ete
+    FROM rede.centralidade
+    ORDER BY posicao
+    LIMIT :limite
+""")
+
+@router.get("/ranking")
+async def ranking_centralidade(
+    tipo: str = Query("pj", description="pj, pf, pe ou todos"),
+    limite: int = Query(100, ge=1, le=1000, description="Quantidade de entidades"),
+    user: dict = Depends(require_active_user)
+):
+    """Entidades com maior centralidade (PageRank) na rede de relacionamentos"""
+    if tipo != "todos" and tipo not in TIPOS_RANKING:
+        raise HTTPException(422, f"Tipo inválido: {tipo}. Use {', '.join(TIPOS_RANKING)} ou todos")
+    
+    await check_and_update_rate_limit(user, qtd_reqs=1)
+    
+    async with AsyncSessionLocal() as session:
+        if tipo == "todos":
+            result = await session.execute(SQL_RANKING_GERAL, {"limite": limite})
+        else:
+            result = await session.execute(SQL_RANKING_TIPO, {"tipo": TIPOS_RANKING[tipo], "limite": limite})
+        rows = result.fetchall()
+    
+    return {
+        "tipo": tipo,
+        "total": len(rows),
+        "ranking": [
+            {**formatar_node(row[0]), **formatar_centralidade(row[1:])}
+            for row in rows
+        ]
+    }
+
+# ============ EMPRESAS SIMILARES ============
+
+# Pontuação de cada CNPJ que compartilha algo com o consultado: soma de
+# 1/valor por endereço/telefone/email em comum (valor = CNPJs com o mesmo
+# dado) e de 1/grau_saida por sócio em comum. Atributos e sócios com mais de
+# SIMILARES_VALOR_MAX CNPJs (endereços de domiciliação, telefones de
+# contabilidade) não são expandidos: pontuariam quase nada e custariam
+# dezenas de milhares de linhas. São retornados como hubs, como em /rede.
+# 0 desativa o corte.
+SIMILARES_VALOR_MAX = int(os.getenv("SIMILARES_VALOR_MAX", "1000"))
+
+SQL_SIMILARES = text("""
+    WITH atributos AS (
+        SELECT descricao, id2, valor
+        FROM links.link_ete
+        WHERE id1 = :id
+          AND (:grau_max = 0 OR valor <= :grau_max)
+    ),
+    ete AS (
+        SELECT le.id1 AS cnpj, a.descricao AS tipo, 1.0 / a.valor AS peso
+        FROM atributos a
+        JOIN links.link_ete le ON le.descricao = a.descricao AND le.id2 = a.id2
+        WHERE le.id1 <> :id
+    ),
+    socios AS (
+        SELECT l2.id2 AS cnpj, 'socio' AS tipo, 1.0 / g.grau_saida AS peso
+        FROM rede.ligacao l1
+        JOIN rede.grau g ON g.chave = l1.id1
+        JOIN rede.ligacao l2 ON l2.id1 = l1.id1
+        WHERE l1.id2 = :id
+          AND l1.comentario = 'socios'
+          AND l2.comentario = 'socios'
+          AND l2.id2 <> :id
+          AND (:grau_max = 0 OR g.grau_saida <= :grau_max)
+    )
+    SELECT cnpj,
+           SUM(peso) AS pontuacao,
+           COUNT(*) FILTER (WHERE tipo = 'end') AS enderecos,
+           COUNT(*) FILTER (WHERE tipo = 'tel') AS telefones,
+           COUNT(*) FILTER (WHERE tipo = 'email') AS emails,
+           COUNT(*) FILTER (WHERE tipo = 'socio') AS socios
+    FROM (
+        SELECT cnpj, tipo, peso FROM ete
+        UNION ALL
+        SELECT cnpj, tipo, peso FROM socios
+    ) t
+    GROUP BY cnpj
+    ORDER BY pontuacao DESC, cnpj
+    LIMIT :limite
+""")
+
+# Atributos e sócios do CNPJ ignorados pelo corte (hubs)
+SQL_SIMILARES_HUBS = text("""
+    SELECT a.id2, le.valor
+    FROM links.link_ete le
+    JOIN links.atributo a ON a.chave = le.id2
+    WHERE le.id1 = :id AND le.valor > :grau_max
+    UNION ALL
+    SELECT l.id1, g.grau_saida
+    FROM rede.ligacao l
+    JOIN rede.grau g ON g.chave = l.id1
+    WHERE l.id2 = :id
+      AND l.comentario = 'socios'
+      AND g.grau_saida > :grau_max
+""")
+
+async def buscar_similares(cnpj_limpo, limite):
+    """CNPJs mais parecidos pelo que compartilham com `cnpj_limpo`"""
+    parametros = {
+        "id": f"PJ_{cnpj_limpo}",
+        "grau_max": SIMILARES_VALOR_MAX,
+        "limite": limite
+    }
+    hubs = []
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(SQL_SIMILARES, parametros)
+        rows = result.fetchall()
+        if SIMILARES_VALOR_MAX:
+            result = await session.execute(SQL_SIMILARES_HUBS, {
+                "id": parametros["id"], "grau_max": SIMILARES_VALOR_MAX
             })
-        
-        # Busca endereços compartilhados
-        result = await session.execute(
-            text("""
-                SELECT DISTINCT le2.id1, le1.id2
-                FROM links.link_ete le1
-                JOIN links.link_ete le2 ON le1.id2 = le2.id2
-                WHERE le1.id1 = :id1 
-                  AND le1.descricao = 'end'
-                  AND le2.id1 != :id1
-                  AND le2.id1 LIKE 'PJ_%'
-                LIMIT 50
-            """),
-            {"id1": f"PJ_{cnpj_limpo}"}
-        )
-        for row in result.fetchall():
-            grupo["enderecos_compartilhados"].append({
+            hubs = sorted(result.fetchall(), key=lambda h: -h[1])
+    
+    return {
+        "cnpj": cnpj_limpo,
+        "total": len(rows),
+        "total_hubs": len(hubs),
+        "hubs": [{"id": no, "grau": grau} for no, grau in hubs],
+        "similares": [
+            {
                 "cnpj": row[0][3:] if row[0].startswith('PJ_') else row[0],
-                "endereco": row[1][3:] if row[1].startswith('EN_') else row[1]
-            })
-        
-        # Busca telefones compartilhados
+                "pontuacao": round(float(row[1]), 6),
+                "enderecos": row[2],
+                "telefones": row[3],
+                "emails": row[4],
+                "socios": row[5]
+            }
+            for row in rows
+        ]
+    }
+
+@router.get("/similares/{cnpj}")
+async def similares_do_cnpj(
+    cnpj: str,
+    limite: int = Query(20, ge=1, le=200, description="Quantidade de CNPJs retornados"),
+    user: dict = Depends(require_active_user)
+):
+    """Retorna os CNPJs mais ligados a um CNPJ, ponderando pela raridade do que compartilham"""
+    await check_and_update_rate_limit(user, qtd_reqs=1)
+    
+    cnpj_limpo = re.sub(r'\D', '', cnpj)
+    
+    return await responder_com_cache(
+        ("similares", cnpj_limpo, limite, SIMILARES_VALOR_MAX),
+        lambda: buscar_similares(cnpj_limpo, limite)
+    )
+
+# ============ SUBGRAFO DE UMA LISTA DE CNPJS ============
+
+# Ligações entre os CNPJs informados em no máximo três consultas: societárias
+# diretas, atributos compartilhados (ETE) e, opcionalmente, intermediários a
+# um salto (nós fora da lista ligados a dois ou mais CNPJs dela)
+LIMITE_CNPJS_SUBGRAFO = 500
+LIMITE_ARESTAS_SUBGRAFO = 50000
+
+TIPOS_ETE = {"end": "endereco", "tel": "telefone", "email": "email"}
+
+SQL_SUBGRAFO_LIGACOES = text("""
+    SELECT id1, id2, descricao, comentario
+    FROM rede.ligacao
+    WHERE id1 = ANY(:ids) AND id2 = ANY(:ids)
+    LIMIT :limite
+""")
+
+# (id2, id1) = ANY no índice da partição: só os pares dentro da lista
+SQL_SUBGRAFO_ETE = text("""
+    SELECT le1.id1, le2.id1, le1.descricao, a.id2, le1.valor
+    FROM links.link_ete le1
+    JOIN links.link_ete le2
+      ON le2.descricao = le1.descricao
+     AND le2.id2 = le1.id2
+     AND le2.id1 = ANY(:ids)
+     AND le2.id1 > le1.id1
+    JOIN links.atributo a ON a.chave = le1.id2
+    WHERE le1.id1 = ANY(:ids)
+    LIMIT :limite
+""")
+
+SQL_SUBGRAFO_INTERMEDIARIOS = text("""
+    WITH membros AS (
+        SELECT unnest(CAST(:ids AS TEXT[])) AS id
+    ),
+    vizinhos AS (
+        SELECT l.id1 AS intermediario, m.id AS membro, l.id1 AS origem, m.id AS destino,
+               l.descricao, l.comentario
+        FROM membros m
+        CROSS JOIN LATERAL (
+            SELECT id1, descricao, comentario FROM rede.ligacao WHERE id2 = m.id LIMIT :limite_por_no
+        ) l
+        UNION ALL
+        SELECT l.id2, m.id, m.id, l.id2, l.descricao, l.comentario
+        FROM membros m
+        CROSS JOIN LATERAL (
+            SELECT id2, descricao, comentario FROM rede.ligacao WHERE id1 = m.id LIMIT :limite_por_no
+        ) l
+    ),
+    externos AS (
+        SELECT * FROM vizinhos WHERE intermediario <> ALL(:ids)
+    )
+    SELECT origem, destino, descricao, comentario, intermediario
+    FROM externos
+    WHERE intermediario IN (
+        SELECT intermediario FROM externos
+        GROUP BY intermediario
+        HAVING COUNT(DISTINCT membro) >= 2
+    )
+    LIMIT :limite
+""")
+
+class SubgrafoEntrada(BaseModel):
+    cnpjs: List[str]
+    incluir_ete: bool = True
+    intermediarios: bool = False
+    limite_por_no: int = LIMITE_LIGACOES_POR_NO
+    enriquecer: bool = False
+
+def ids_subgrafo(entrada: SubgrafoEntrada):
+    """Valida a entrada e retorna os ids PJ_ (sem repetição) dos CNPJs informados"""
+    ids = list(dict.fromkeys(
+        f"PJ_{cnpj}" for cnpj in (re.sub(r'\D', '', c) for c in entrada.cnpjs) if cnpj
+    ))
+    if len(ids) < 2:
+        raise HTTPException(422, "Informe ao menos dois CNPJs.")
+    if len(ids) > LIMITE_CNPJS_SUBGRAFO:
+        raise HTTPException(422, f"Máximo de {LIMITE_CNPJS_SUBGRAFO} CNPJs por requisição.")
+    if not 1 <= entrada.limite_por_no <= LIMITE_LIGACOES_POR_NO:
+        raise HTTPException(422, f"limite_por_no deve estar entre 1 e {LIMITE_LIGACOES_POR_NO}")
+    return ids
+
+async def montar_subgrafo(session, entrada: SubgrafoEntrada):
+    """Subgrafo induzido pelos CNPJs da entrada (até três consultas)"""
+    ids = ids_subgrafo(entrada)
+    edges = []
+    intermediarios = []
+    truncado = False
+    result = await session.execute(
+        SQL_SUBGRAFO_LIGACOES, {"ids": ids, "limite": LIMITE_ARESTAS_SUBGRAFO}
+    )
+    rows = result.fetchall()
+    truncado |= len(rows) >= LIMITE_ARESTAS_SUBGRAFO
+    for id1, id2, descricao, comentario in rows:
+        edges.append({
+            "id": f"{id1}->{id2}",
+            "origem": id1,
+            "destino": id2,
+            "tipo": descricao,
+            "base": comentario
+        })
+    
+    if entrada.incluir_ete:
         result = await session.execute(
-            text("""
-                SELECT DISTINCT le2.id1, le1.id2
-                FROM links.link_ete le1
-                JOIN links.link_ete le2 ON le1.id2 = le2.id2
-                WHERE le1.id1 = :id1 
-                  AND le1.descricao = 'tel'
-                  AND le2.id1 != :id1
-                  AND le2.id1 LIKE 'PJ_%'
-                LIMIT 50
-            """),
-            {"id1": f"PJ_{cnpj_limpo}"}
+            SQL_SUBGRAFO_ETE, {"ids": ids, "limite": LIMITE_ARESTAS_SUBGRAFO}
         )
-        for row in result.fetchall():
-            grupo["telefones_compartilhados"].append({
-                "cnpj": row[0][3:] if row[0].startswith('PJ_') else row[0],
-                "telefone": row[1][3:] if row[1].startswith('TE_') else row[1]
+        rows = result.fetchall()
+        truncado |= len(rows) >= LIMITE_ARESTAS_SUBGRAFO
+        for id1, id2, descricao, atributo, valor in rows:
+            edges.append({
+                "id": f"{id1}<->{id2}|{atributo}",
+                "origem": id1,
+                "destino": id2,
+                "tipo": TIPOS_ETE.get(descricao, descricao),
+                "base": "ete",
+                "dado": atributo[3:],
+                "compartilhado_por": valor
             })
-        
-        # Busca emails compartilhados
-        result = await session.execute(
-            text("""
-                SELECT DISTINCT le2.id1, le1.id2
-                FROM links.link_ete le1
-                JOIN links.link_ete le2 ON le1.id2 = le2.id2
-                WHERE le1.id1 = :id1 
-                  AND le1.descricao = 'email'
-                  AND le2.id1 != :id1
-                  AND le2.id1 LIKE 'PJ_%'
-                LIMIT 50
-            """),
-            {"id1": f"PJ_{cnpj_limpo}"}
-        )
-        for row in result.fetchall():
-            grupo["emails_compartilhados"].append({
-                "cnpj": row[0][3:] if row[0].startswith('PJ_') else row[0],
-                "email": row[1][3:] if row[1].startswith('EM_') else row[1]
+    
+    if entrada.intermediarios:
+        result = await session.execute(SQL_SUBGRAFO_INTERMEDIARIOS, {
+            "ids": ids, "limite_por_no": entrada.limite_por_no, "limite": LIMITE_ARESTAS_SUBGRAFO
+        })
+        rows = result.fetchall()
+        truncado |= len(rows) >= LIMITE_ARESTAS_SUBGRAFO
+        vistos = set()
+        for origem, destino, descricao, comentario, intermediario in rows:
+            edge_id = f"{origem}->{destino}"
+            if edge_id in vistos:
+                continue
+            vistos.add(edge_id)
+            edges.append({
+                "id": edge_id,
+                "origem": origem,
+                "destino": destino,
+                "tipo": descricao,
+                "base": comentario
             })
+        intermediarios = list(dict.fromkeys(row[4] for row in rows))
+    
+    nodes = formatar_nodes(ids + intermediarios)
+    for node in nodes[len(ids):]:
+        node["intermediario"] = True
+    if entrada.enriquecer:
+        await enriquecer_nodes(session, nodes)
+    
+    conectados = {edge["origem"] for edge in edges} | {edge["destino"] for edge in edges}
+    return {
+        "total_cnpjs": len(ids),
+        "total_nodes": len(nodes),
+        "total_edges": len(edges),
+        "truncado": truncado,
+        "nodes": nodes,
+        "edges": edges,
+        "isolados": [id_pj[3:] for id_pj in ids if id_pj not in conectados]
+    }
+
+@router.post("/subgrafo")
+async def subgrafo_de_cnpjs(
+    entrada: SubgrafoEntrada,
+    user: dict = Depends(require_active_user)
+):
+    """Retorna as ligações societárias e os atributos compartilhados entre os CNPJs informados"""
+    ids = ids_subgrafo(entrada)
+    await check_and_update_rate_limit(user, qtd_reqs=-(-len(ids) // VALORES_POR_UNIDADE_LOTE))
+    
+    async with AsyncSessionLocal() as session:
+        return await montar_subgrafo(session, entrada)
+
+# ============ ANÁLISES AVANÇADAS ============
+
+# Seções da análise de grupo econômico: consulta (parâmetro :id = chave PJ_
+# do CNPJ) e (campo, prefixo removido) de cada coluna retornada. As seções
+# são independentes e rodam em paralelo, com no máximo
+# GRUPO_ECONOMICO_CONEXOES conexões do pool por requisição (sem o limite,
+# cada requisição ocuparia uma conexão por seção).
+# Com REDE_GRAU_MAX_HUB, endereços/telefones/emails compartilhados por mais
+# CNPJs que o limite (:grau_max) ficam fora dos self-joins.
+GRUPO_ECONOMICO_CONEXOES = int(os.getenv("GRUPO_ECONOMICO_CONEXOES", "3"))
+
+SECOES_GRUPO_ECONOMICO = {
+    # Empresas onde o CNPJ é sócio (controladas)
+    "empresas_controladas": ("""
+        SELECT DISTINCT id2, descricao
+        FROM rede.ligacao
+        WHERE id1 = :id
+          AND id2 LIKE 'PJ_%'
+          AND descricao NOT IN ('filial')
+        LIMIT 100
+    """, [("cnpj", "PJ_"), ("tipo_vinculo", None)]),
+
+    # Empresas que são sócias do CNPJ (controladoras)
+    "empresas_controladoras": ("""
+        SELECT DISTINCT id1, descricao
+        FROM rede.ligacao
+        WHERE id2 = :id
+          AND id1 LIKE 'PJ_%'
+          AND descricao NOT IN ('filial')
+        LIMIT 100
+    """, [("cnpj", "PJ_"), ("tipo_vinculo", None)]),
+
+    # Sócios pessoas físicas
+    "socios_pf": ("""
+        SELECT DISTINCT id1, descricao
+        FROM rede.ligacao
+        WHERE id2 = :id
+          AND id1 LIKE 'PF_%'
+        LIMIT 100
+    """, [("socio", "PF_"), ("tipo_vinculo", None)]),
+
+    # Sócios pessoas jurídicas
+    "socios_pj": ("""
+        SELECT DISTINCT id1, descricao
+        FROM rede.ligacao
+        WHERE id2 = :id
+          AND id1 LIKE 'PJ_%'
+          AND descricao IN ('Sócio', 'Administrador', 'Diretor', 'Presidente')
+        LIMIT 100
+    """, [("cnpj_socio", "PJ_"), ("tipo_vinculo", None)]),
+
+    # Endereços compartilhados
+    "enderecos_compartilhados": ("""
+        SELECT DISTINCT le2.id1, a.id2
+        FROM links.link_ete le1
+        JOIN links.link_ete le2 ON le2.descricao = le1.descricao AND le2.id2 = le1.id2
+        JOIN links.atributo a ON a.chave = le1.id2
+        WHERE le1.id1 = :id
+          AND le1.descricao = 'end'
+          AND (:grau_max = 0 OR le1.valor <= :grau_max)
+          AND le2.id1 != :id
+          AND le2.id1 LIKE 'PJ_%'
+        LIMIT 50
+    """, [("cnpj", "PJ_"), ("endereco", "EN_")]),
+
+    # Telefones compartilhados
+    "telefones_compartilhados": ("""
+        SELECT DISTINCT le2.id1, a.id2
+        FROM links.link_ete le1
+        JOIN links.link_ete le2 ON le2.descricao = le1.descricao AND le2.id2 = le1.id2
+        JOIN links.atributo a ON a.chave = le1.id2
+        WHERE le1.id1 = :id
+          AND le1.descricao = 'tel'
+          AND (:grau_max = 0 OR le1.valor <= :grau_max)
+          AND le2.id1 != :id
+          AND le2.id1 LIKE 'PJ_%'
+        LIMIT 50
+    """, [("cnpj", "PJ_"), ("telefone", "TE_")]),
+
+    # Emails compartilhados
+    "emails_compartilhados": ("""
+        SELECT DISTINCT le2.id1, a.id2
+        FROM links.link_ete le1
+        JOIN links.link_ete le2 ON le2.descricao = le1.descricao AND le2.id2 = le1.id2
+        JOIN links.atributo a ON a.chave = le1.id2
+        WHERE le1.id1 = :id
+          AND le1.descricao = 'email'
+          AND (:grau_max = 0 OR le1.valor <= :grau_max)
+          AND le2.id1 != :id
+          AND le2.id1 LIKE 'PJ_%'
+        LIMIT 50
+    """, [("cnpj", "PJ_"), ("email", "EM_")]),
+}
+
+async def consultar_secao_grupo(session, secao, id_pj):
+    """Executa uma seção da análise de grupo econômico"""
+    sql, campos = SECOES_GRUPO_ECONOMICO[secao]
+    params = {"id": id_pj}
+    if ":grau_max" in sql:
+        params["grau_max"] = REDE_GRAU_MAX_HUB
+    result = await session.execute(text(sql), params)
+    itens = []
+    for row in result.fetchall():
+        item = {}
+        for valor, (campo, prefixo) in zip(row, campos):
+            if prefixo and valor.startswith(prefixo):
+                valor = valor[len(prefixo):]
+            item[campo] = valor
+        itens.append(item)
+    return itens
+
+async def _consultar_secao_em_sessao(secao, id_pj, conexoes):
+    async with conexoes:
+        async with AsyncSessionLocal() as session:
+            return await consultar_secao_grupo(session, secao, id_pj)
+
+async def buscar_grupo_economico(cnpj_limpo, paralelo=True):
+    """
+    Executa todas as seções para o CNPJ.
+
+    Em paralelo (padrão) usa até GRUPO_ECONOMICO_CONEXOES sessões ao mesmo
+    tempo; com paralelo=False as seções rodam em sequência em uma única
+    sessão.
+    """
+    id_pj = f"PJ_{cnpj_limpo}"
+    if paralelo:
+        conexoes = asyncio.Semaphore(GRUPO_ECONOMICO_CONEXOES)
+        resultados = await asyncio.gather(*(
+            _consultar_secao_em_sessao(secao, id_pj, conexoes) for secao in SECOES_GRUPO_ECONOMICO
+        ))
+    else:
+        async with AsyncSessionLocal() as session:
+            resultados = [
+                await consultar_secao_grupo(session, secao, id_pj) for secao in SECOES_GRUPO_ECONOMICO
+            ]
+    return dict(zip(SECOES_GRUPO_ECONOMICO, resultados))
+
+@router.get("/analise/grupo_economico/{cnpj}")
+async def analisar_grupo_economico(
+    cnpj: str,
+    user: dict = Depends(require_active_user)
+):
+    """Analisa o grupo econômico de um CNPJ através de conexões diretas e indiretas"""
+    await check_and_update_rate_limit(user, qtd_reqs=5)
+    
+    cnpj_limpo = re.sub(r'\D', '', cnpj)
+    
+    async def montar_analise():
+        grupo = await buscar_grupo_economico(cnpj_limpo)
         
         # Calcula totais
         totais = {
@@ -633,9 +2138,13 @@ async def analisar_grupo_economico(
             "total_telefones_compartilhados": len(grupo["telefones_compartilhados"]),
             "total_emails_compartilhados": len(grupo["emails_compartilhados"])
         }
+        
+        return {
+            "cnpj_analisado": cnpj_limpo,
+            "totais": totais,
+            "detalhes": grupo
+        }
     
-    return {
-        "cnpj_analisado": cnpj_limpo,
-        "totais": totais,
-        "detalhes": grupo
-    }
\ No newline at end of file
+    return await responder_com_cache(
+        ("grupo_economico", cnpj_limpo, REDE_GRAU_MAX_HUB), montar_analise
+    )
@@ -67,6 +67,26 @@ async def init_db():
             )
         """))
         
+        # Jobs assíncronos de cruzamentos (app/jobs.py)
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS security.jobs (
+                id TEXT PRIMARY KEY,
+                user_email TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                parametros JSONB,
+                status TEXT NOT NULL,
+                erro TEXT,
+                resultado BYTEA,
+                criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                iniciado_em TIMESTAMP,
+                concluido_em TIMESTAMP,
+                processo TEXT
+            )
+        """))
+        await conn.execute(text("ALTER TABLE security.jobs ADD COLUMN IF NOT EXISTS processo TEXT"))
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS idx_jobs_user_status ON security.jobs(user_email, status)"))
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS idx_jobs_criado_em ON security.jobs(criado_em)"))
+        
         print("✅ Tabelas de segurança criadas/garantidas no schema 'security'")
         print(f"📍 Banco de dados: {DB_NAME}")
         print(f"📍 Schema: security")
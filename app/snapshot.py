@@ -0,0 +1,104 @@
+"""
+app/snapshot.py
+Snapshot somente-leitura de documentos CNPJ (SQLite chave-valor)
+
+O arquivo contém uma única tabela `documento(cnpj TEXT PRIMARY KEY, doc BLOB)
+WITHOUT ROWID`, ordenada por CNPJ, em que `doc` é o JSON completo retornado
+por /api/cnpj/{cnpj} comprimido com zlib. A consulta é uma busca O(log n) na
+B-tree do SQLite, sem conexão com o PostgreSQL.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import zlib
+
+NIVEL_COMPRESSAO = 6
+LOTE_ESCRITA = 10_000
+
+def codificar_documento(documento: dict) -> bytes:
+    """Serializa e comprime o documento do CNPJ"""
+    dados = json.dumps(documento, ensure_ascii=False, separators=(",", ":"), default=str)
+    return zlib.compress(dados.encode("utf-8"), NIVEL_COMPRESSAO)
+
+def decodificar_documento(blob: bytes) -> dict:
+    """Descomprime e desserializa o documento do CNPJ"""
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+def escrever_snapshot(caminho: str, documentos, metadados: dict = None) -> int:
+    """
+    Grava o snapshot a partir de um iterável de (cnpj, documento).
+
+    Os documentos devem vir ordenados por CNPJ (inserção sequencial na
+    B-tree). O arquivo é escrito em `caminho + '.tmp'` e só substitui o
+    snapshot anterior ao final, de forma atômica.
+    """
+    caminho_tmp = caminho + ".tmp"
+    if os.path.exists(caminho_tmp):
+        os.remove(caminho_tmp)
+
+    conn = sqlite3.connect(caminho_tmp)
+    total = 0
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA page_size = 8192")
+        conn.execute("CREATE TABLE documento (cnpj TEXT PRIMARY KEY, doc BLOB NOT NULL) WITHOUT ROWID")
+        conn.execute("CREATE TABLE metadados (chave TEXT PRIMARY KEY, valor TEXT)")
+
+        lote = []
+        for cnpj, documento in documentos:
+            lote.append((cnpj, codificar_documento(documento)))
+            if len(lote) >= LOTE_ESCRITA:
+                conn.executemany("INSERT OR REPLACE INTO documento VALUES (?, ?)", lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            conn.executemany("INSERT OR REPLACE INTO documento VALUES (?, ?)", lote)
+            total += len(lote)
+
+        metadados = dict(metadados or {})
+        metadados["total_documentos"] = total
+        conn.executemany(
+            "INSERT OR REPLACE INTO metadados VALUES (?, ?)",
+            [(chave, str(valor)) for chave, valor in metadados.items()]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(caminho_tmp, caminho)
+    return total
+
+class SnapshotCNPJ:
+    """Leitor do snapshot somente-leitura (uma conexão por thread)"""
+
+    def __init__(self, caminho: str):
+        if not os.path.exists(caminho):
+            raise FileNotFoundError(f"Snapshot não encontrado: {caminho}")
+        self.caminho = caminho
+        self._local = threading.local()
+
+    def _conexao(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            uri = f"file:{self.caminho}?mode=ro&immutable=1"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.execute("PRAGMA mmap_size = 268435456")
+            self._local.conn = conn
+        return conn
+
+    def buscar(self, cnpj: str):
+        """Retorna o documento do CNPJ ou None"""
+        row = self._conexao().execute(
+            "SELECT doc FROM documento WHERE cnpj = ?", (cnpj,)
+        ).fetchone()
+        if not row:
+            return None
+        return decodificar_documento(row[0])
+
+    def metadados(self) -> dict:
+        """Retorna os metadados gravados na geração do snapshot"""
+        rows = self._conexao().execute("SELECT chave, valor FROM metadados").fetchall()
+        return dict(rows)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos motores de cruzamentos contra o banco configurado no .env.
+
+Executa cada cenário para uma lista de CNPJs, repetindo N vezes, e imprime a
+mediana/p95 de latência e o tamanho do resultado.
+
+Uso:
+    python benchmark_cruzamentos.py 60409075000152 33000167000101 -r 5
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from sqlalchemy import text
+from tabulate import tabulate
+
+# Módulos da API (app/)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from app.routers import cruzamentos
+
+# ============ CENÁRIOS ============
+
+def cenario_rede(motor, nivel, ids_inteiros=False):
+    """Cria cenário de travessia da rede para o motor/nível informados"""
+    buscar_rede = cruzamentos.MOTORES_REDE[motor]
+
+    async def executar(cnpj):
+        anterior = cruzamentos.REDE_IDS_INTEIROS
+        cruzamentos.REDE_IDS_INTEIROS = ids_inteiros
+        try:
+            async with cruzamentos.AsyncSessionLocal() as session:
+                nodes, edges, _ = await buscar_rede(session, [f"PJ_{cnpj}"], nivel)
+        finally:
+            cruzamentos.REDE_IDS_INTEIROS = anterior
+        return f"{len(nodes)} nós / {len(edges)} arestas"
+
+    sufixo = " (ids inteiros)" if ids_inteiros else ""
+    return f"rede {motor} nivel={nivel}{sufixo}", executar
+
+def cenario_grupo_economico(paralelo):
+    """Cria cenário da análise de grupo econômico (seções em sequência ou em paralelo)"""
+    async def executar(cnpj):
+        grupo = await cruzamentos.buscar_grupo_economico(cnpj, paralelo=paralelo)
+        return f"{sum(len(itens) for itens in grupo.values())} itens"
+
+    modo = "paralelo" if paralelo else "sequencial"
+    return f"grupo_economico {modo}", executar
+
+def cenario_compartilhados():
+    """Cria cenário de busca, pelo texto, dos CNPJs que compartilham cada atributo do CNPJ"""
+    async def executar(cnpj):
+        async with cruzamentos.AsyncSessionLocal() as session:
+            result = await session.execute(text("""
+                SELECT le.descricao, a.id2
+                FROM links.link_ete le
+                JOIN links.atributo a ON a.chave = le.id2
+                WHERE le.id1 = :id1
+            """), {"id1": f"PJ_{cnpj}"})
+            atributos = result.fetchall()
+        total = 0
+        for descricao, id2 in atributos:
+            pagina = await cruzamentos.pagina_compartilhados(descricao, id2, None, 100)
+            total += len(pagina["cnpjs"])
+        return f"{len(atributos)} atributos / {total} cnpjs"
+
+    return "compartilhados (chave por hash)", executar
+
+def cenario_similares(limite=20):
+    """Cria cenário do ranking de CNPJs similares (consulta única)"""
+    async def executar(cnpj):
+        resultado = await cruzamentos.buscar_similares(cnpj, limite)
+        return f"{resultado['total']} similares"
+
+    return f"similares top {limite}", executar
+
+def cenario_subgrafo(intermediarios):
+    """Cria cenário do subgrafo induzido pelos CNPJs informados (todos de uma vez)"""
+    async def executar(cnpjs):
+        entrada = cruzamentos.SubgrafoEntrada(cnpjs=cnpjs, intermediarios=intermediarios)
+        async with cruzamentos.AsyncSessionLocal() as session:
+            resultado = await cruzamentos.montar_subgrafo(session, entrada)
+        return f"{resultado['total_nodes']} nós / {resultado['total_edges']} arestas"
+
+    sufixo = " + intermediários" if intermediarios else ""
+    return f"subgrafo{sufixo}", executar
+
+def montar_cenarios():
+    """Lista de (nome, função async(cnpj) -> descrição do resultado)"""
+    cenarios = []
+    for nivel in (1, 2, 3):
+        for motor in ("bfs", "cte"):
+            cenarios.append(cenario_rede(motor, nivel))
+            cenarios.append(cenario_rede(motor, nivel, ids_inteiros=True))
+        if cruzamentos.grafo_csr is not None:
+            cenarios.append(cenario_rede("csr", nivel))
+    cenarios.append(cenario_grupo_economico(paralelo=False))
+    cenarios.append(cenario_grupo_economico(paralelo=True))
+    cenarios.append(cenario_compartilhados())
+    cenarios.append(cenario_similares())
+    return cenarios
+
+# ============ RELATÓRIO DE TAMANHOS ============
+
+# Tabelas comparadas no relatório de tamanho (heap + índices)
+TABELAS_RELATORIO = [
+    "rede.ligacao",
+    "rede.ligacao_id",
+    "rede.no",
+    "rede.tipo_ligacao",
+    "links.link_ete_end",
+    "links.link_ete_tel",
+    "links.link_ete_email",
+    "links.atributo",
+]
+
+async def relatorio_tamanhos():
+    """Imprime o tamanho em disco das tabelas de rede e de seus índices"""
+    linhas = []
+    async with cruzamentos.AsyncSessionLocal() as session:
+        for tabela in TABELAS_RELATORIO:
+            result = await session.execute(text("""
+                SELECT pg_relation_size(to_regclass(:tabela)),
+                       pg_indexes_size(to_regclass(:tabela)),
+                       pg_total_relation_size(to_regclass(:tabela))
+            """), {"tabela": tabela})
+            heap, indices, total = result.first()
+            if total is None:
+                linhas.append([tabela, "-", "-", "-"])
+                continue
+            linhas.append([tabela] + [f"{v / 1024 / 1024:,.1f}" for v in (heap, indices, total)])
+    print(tabulate(linhas, headers=["tabela", "heap (MB)", "índices (MB)", "total (MB)"]))
+    print()
+
+# ============ EXECUÇÃO ============
+
+async def medir(executar, cnpj, repeticoes):
+    """Executa o cenário `repeticoes` vezes e retorna (tempos_ms, resultado)"""
+    tempos = []
+    resultado = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = await executar(cnpj)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos, resultado
+
+def p95(valores):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(0.95 * (len(ordenados) - 1))))]
+
+async def main_async(cnpjs, repeticoes, filtro, tamanhos):
+    if tamanhos:
+        await relatorio_tamanhos()
+
+    linhas = []
+    # Cenários de lista recebem todos os CNPJs em uma única execução
+    if len(cnpjs) >= 2:
+        for nome, executar in (cenario_subgrafo(False), cenario_subgrafo(True)):
+            if filtro and filtro not in nome:
+                continue
+            await executar(cnpjs)
+            tempos, resultado = await medir(executar, cnpjs, repeticoes)
+            linhas.append([
+                nome, f"{len(cnpjs)} cnpjs",
+                f"{statistics.median(tempos):.1f}",
+                f"{p95(tempos):.1f}",
+                resultado,
+            ])
+    for nome, executar in montar_cenarios():
+        if filtro and filtro not in nome:
+            continue
+        for cnpj in cnpjs:
+            # Aquecimento (cache do PostgreSQL e pool de conexões)
+            await executar(cnpj)
+            tempos, resultado = await medir(executar, cnpj, repeticoes)
+            linhas.append([
+                nome, cnpj,
+                f"{statistics.median(tempos):.1f}",
+                f"{p95(tempos):.1f}",
+                resultado,
+            ])
+    print(tabulate(linhas, headers=["cenário", "cnpj", "mediana (ms)", "p95 (ms)", "resultado"]))
+    await cruzamentos.engine.dispose()
+
+def main():
+    """Função principal do script."""
+    parser = argparse.ArgumentParser(description="Benchmark dos endpoints de cruzamentos")
+    parser.add_argument("cnpjs", nargs="+", help="CNPJs (somente dígitos) usados nos cenários")
+    parser.add_argument("-r", "--repeticoes", type=int, default=5, help="Repetições por cenário")
+    parser.add_argument("-f", "--filtro", default="", help="Executa só cenários cujo nome contém o texto")
+    parser.add_argument("-t", "--tamanhos", action="store_true",
+                        help="Imprime antes o relatório de tamanho das tabelas")
+    args = parser.parse_args()
+
+    asyncio.run(main_async(args.cnpjs, args.repeticoes, args.filtro, args.tamanhos))
+
+if __name__ == "__main__":
+    main()
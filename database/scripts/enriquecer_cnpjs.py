@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Enriquecimento offline em lote de planilhas CSV/Parquet com CNPJs.
+
+Em vez de uma chamada HTTP por CNPJ, o script:
+1. ordena externamente os CNPJs da entrada (blocos ordenados em disco + merge);
+2. lê estabelecimento/empresas/simples do PostgreSQL com cursor no servidor,
+   ordenado por cnpj;
+3. faz merge-join entre os dois fluxos ordenados e grava a saída em lotes.
+
+A memória usada é limitada pelo tamanho do bloco, independente do tamanho da
+entrada. A saída é gravada na ordem dos CNPJs (não na ordem original).
+
+Uso:
+    python enriquecer_cnpjs.py entrada.csv saida.csv --coluna cnpj
+    python enriquecer_cnpjs.py entrada.parquet saida.parquet
+"""
+
+import csv
+import heapq
+import logging
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuração de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+# ============ CONFIGURAÇÕES ============
+DB_USER = os.getenv("DB_USER", "admin")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "admin123")
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = os.getenv("DB_PORT", "5432")
+DB_NAME = os.getenv("DB_NAME", "cnpj_rede")
+
+PG_CONNECTION_STRING = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+TAMANHO_BLOCO = 1_000_000  # Linhas por bloco ordenado em memória
+LOTE_CURSOR = 50_000       # Linhas buscadas por ida ao cursor do servidor
+
+COLUNA_CHAVE = "_cnpj"
+
+# Colunas acrescentadas à saída (ordem da query abaixo, sem o cnpj)
+COLUNAS_ENRIQUECIMENTO = [
+    "razao_social", "nome_fantasia", "matriz_filial", "situacao_cadastral",
+    "data_situacao_cadastral", "data_inicio_atividades", "cnae_fiscal",
+    "cnae_fiscal_secundaria", "natureza_juridica", "porte_empresa",
+    "capital_social", "uf", "municipio", "cep", "opcao_simples", "opcao_mei",
+]
+
+QUERY_EXPORTACAO = """
+SELECT e.cnpj,
+       emp.razao_social, e.nome_fantasia, e.matriz_filial, e.situacao_cadastral,
+       e.data_situacao_cadastral, e.data_inicio_atividades, e.cnae_fiscal,
+       e.cnae_fiscal_secundaria, emp.natureza_juridica, emp.porte_empresa,
+       emp.capital_social, e.uf, m.descricao AS municipio, e.cep,
+       simp.opcao_simples, simp.opcao_mei
+FROM cnpj.estabelecimento e
+LEFT JOIN cnpj.empresas emp ON emp.cnpj_basico = e.cnpj_basico
+LEFT JOIN cnpj.simples simp ON simp.cnpj_basico = e.cnpj_basico
+LEFT JOIN cnpj.municipio m ON m.codigo = e.municipio
+WHERE e.cnpj BETWEEN :cnpj_min AND :cnpj_max
+ORDER BY e.cnpj
+"""
+
+# ============ LEITURA E ORDENAÇÃO EXTERNA ============
+
+def normalizar_cnpj(valor) -> str:
+    """Remove formatação; CNPJs inválidos viram string vazia"""
+    digitos = re.sub(r"\D", "", str(valor or ""))
+    if not digitos or len(digitos) > 14:
+        return ""
+    return digitos.zfill(14)
+
+def ler_blocos(caminho: str, tamanho_bloco: int, separador: str = ","):
+    """Lê a entrada (CSV ou Parquet) em blocos de DataFrame com colunas texto"""
+    if caminho.lower().endswith(".parquet"):
+        import pyarrow.parquet as pq
+        arquivo = pq.ParquetFile(caminho)
+        for lote in arquivo.iter_batches(batch_size=tamanho_bloco):
+            # Nulos viram "" (astype(str) os transformaria em 'None'/'nan')
+            yield lote.to_pandas().fillna("").astype(str)
+    else:
+        yield from pd.read_csv(caminho, dtype=str, keep_default_na=False,
+                               chunksize=tamanho_bloco, sep=separador)
+
+def gerar_blocos_ordenados(caminho: str, coluna: str, tamanho_bloco: int, pasta_tmp: str,
+                           separador: str = ","):
+    """
+    Primeira fase da ordenação externa: grava blocos ordenados por CNPJ.
+
+    Linhas com CNPJ vazio ou inválido ficam nos blocos com chave "" (no
+    início da ordem) e saem com encontrado='N', para que toda linha da
+    entrada apareça na saída.
+
+    Retorna (arquivos, colunas da entrada, menor cnpj, maior cnpj, total de
+    linhas, total de CNPJs válidos).
+    """
+    arquivos = []
+    colunas = None
+    cnpj_min, cnpj_max = None, None
+    total = 0
+    validos = 0
+
+    for k, df in enumerate(ler_blocos(caminho, tamanho_bloco, separador)):
+        if coluna not in df.columns:
+            raise ValueError(f"Coluna '{coluna}' não encontrada. Colunas: {list(df.columns)}")
+        if colunas is None:
+            colunas = list(df.columns)
+
+        df.insert(0, COLUNA_CHAVE, df[coluna].map(normalizar_cnpj))
+        df = df.sort_values(COLUNA_CHAVE, kind="mergesort")
+        if df.empty:
+            continue
+
+        chaves_validas = df[COLUNA_CHAVE][df[COLUNA_CHAVE] != ""]
+        if not chaves_validas.empty:
+            bloco_min, bloco_max = chaves_validas.iloc[0], chaves_validas.iloc[-1]
+            cnpj_min = bloco_min if cnpj_min is None else min(cnpj_min, bloco_min)
+            cnpj_max = bloco_max if cnpj_max is None else max(cnpj_max, bloco_max)
+            validos += len(chaves_validas)
+
+        arquivo = os.path.join(pasta_tmp, f"bloco_{k:05d}.csv")
+        df.to_csv(arquivo, index=False, header=False)
+        arquivos.append(arquivo)
+        total += len(df)
+        logger.info(f"Bloco {k} ordenado: {len(df):,} linhas")
+
+    return arquivos, colunas or [], cnpj_min, cnpj_max, total, validos
+
+def ler_bloco_ordenado(arquivo: str):
+    """Itera as linhas de um bloco ordenado (primeira coluna = cnpj)"""
+    with open(arquivo, newline="", encoding="utf-8") as f:
+        yield from csv.reader(f)
+
+def mesclar_blocos(arquivos):
+    """Segunda fase da ordenação externa: merge k-way dos blocos"""
+    return heapq.merge(*(ler_bloco_ordenado(a) for a in arquivos), key=lambda linha: linha[0])
+
+# ============ EXPORTAÇÃO DO BANCO (CURSOR NO SERVIDOR) ============
+
+def exportar_ordenado(engine, cnpj_min: str, cnpj_max: str):
+    """Itera (cnpj, *colunas) do banco, ordenado por cnpj, com cursor no servidor"""
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=LOTE_CURSOR).execute(
+            text(QUERY_EXPORTACAO), {"cnpj_min": cnpj_min, "cnpj_max": cnpj_max}
+        )
+        for row in result:
+            yield tuple(row)
+
+# ============ MERGE-JOIN E SAÍDA ============
+
+def merge_join(linhas_entrada, linhas_banco):
+    """
+    Junta dois fluxos ordenados por cnpj.
+
+    Gera (linha_entrada, linha_banco ou None). CNPJs repetidos na entrada
+    reutilizam a mesma linha do banco.
+    """
+    banco = iter(linhas_banco)
+    atual = next(banco, None)
+    for linha in linhas_entrada:
+        cnpj = linha[0]
+        while atual is not None and atual[0] < cnpj:
+            atual = next(banco, None)
+        if atual is not None and atual[0] == cnpj:
+            yield linha, atual
+        else:
+            yield linha, None
+
+class EscritorSaida:
+    """Grava a saída em lotes (CSV ou Parquet) com memória limitada"""
+
+    def __init__(self, caminho: str, colunas: list, tamanho_lote: int):
+        self.caminho = caminho
+        self.colunas = colunas
+        self.tamanho_lote = tamanho_lote
+        self.parquet = caminho.lower().endswith(".parquet")
+        self.lote = []
+        self.total = 0
+        self._writer = None
+
+        if not self.parquet:
+            self._arquivo = open(caminho, "w", newline="", encoding="utf-8")
+            self._csv = csv.writer(self._arquivo)
+            self._csv.writerow(colunas)
+
+    def escrever(self, linha: list):
+        self.lote.append(linha)
+        if len(self.lote) >= self.tamanho_lote:
+            self.descarregar()
+
+    def descarregar(self):
+        if not self.lote:
+            return
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            tabela = pa.Table.from_pandas(
+                pd.DataFrame(self.lote, columns=self.colunas).fillna("").astype(str), preserve_index=False
+            )
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.caminho, tabela.schema)
+            self._writer.write_table(tabela)
+        else:
+            self._csv.writerows(self.lote)
+        self.total += len(self.lote)
+        self.lote = []
+
+    def fechar(self):
+        self.descarregar()
+        if self.parquet:
+            if self._writer is not None:
+                self._writer.close()
+        else:
+            self._arquivo.close()
+
+def enriquecer(entrada: str, saida: str, coluna: str = "cnpj",
+               tamanho_bloco: int = TAMANHO_BLOCO, separador: str = ","):
+    """Executa ordenação externa + merge-join + gravação da saída"""
+    inicio = time.time()
+    pasta_tmp = tempfile.mkdtemp(prefix="enriquecer_cnpjs_")
+    engine = create_engine(PG_CONNECTION_STRING)
+
+    try:
+        arquivos, colunas, cnpj_min, cnpj_max, total, validos = gerar_blocos_ordenados(
+            entrada, coluna, tamanho_bloco, pasta_tmp, separador
+        )
+        logger.info(f"{total:,} linhas ({validos:,} CNPJs válidos) em {len(arquivos)} blocos "
+                    f"({time.time() - inicio:.1f}s)")
+
+        colunas_saida = colunas + ["cnpj_normalizado", "encontrado"] + COLUNAS_ENRIQUECIMENTO
+        escritor = EscritorSaida(saida, colunas_saida, tamanho_bloco)
+        vazio = [""] * len(COLUNAS_ENRIQUECIMENTO)
+        encontrados = 0
+
+        if total:
+            # Sem CNPJ válido, todas as linhas saem como não encontradas
+            linhas_banco = exportar_ordenado(engine, cnpj_min, cnpj_max) if validos else iter(())
+            for linha, dados in merge_join(mesclar_blocos(arquivos), linhas_banco):
+                if dados is not None:
+                    encontrados += 1
+                    extra = ["" if v is None else v for v in dados[1:]]
+                    escritor.escrever(linha[1:] + [linha[0], "S"] + extra)
+                else:
+                    escritor.escrever(linha[1:] + [linha[0], "N"] + vazio)
+        escritor.fechar()
+
+        logger.info(
+            f"Saída gravada em {saida}: {escritor.total:,} linhas, "
+            f"{encontrados:,} encontradas ({time.time() - inicio:.1f}s)"
+        )
+    finally:
+        shutil.rmtree(pasta_tmp, ignore_errors=True)
+        engine.dispose()
+
+def main():
+    """Função principal do script."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Enriquece um CSV/Parquet de CNPJs com dados da base (merge-join ordenado)"
+    )
+    parser.add_argument("entrada", help="Arquivo de entrada (.csv ou .parquet)")
+    parser.add_argument("saida", help="Arquivo de saída (.csv ou .parquet)")
+    parser.add_argument(
+        "-c", "--coluna", default="cnpj", help="Nome da coluna com o CNPJ (padrão: cnpj)"
+    )
+    parser.add_argument(
+        "-b", "--tamanho-bloco", type=int, default=TAMANHO_BLOCO,
+        help=f"Linhas por bloco ordenado em memória (padrão: {TAMANHO_BLOCO})",
+    )
+    parser.add_argument(
+        "-s", "--separador", default=",", help="Separador do CSV de entrada (padrão: ,)"
+    )
+    args = parser.parse_args()
+
+    if not os.path.exists(args.entrada):
+        logger.error(f"Arquivo não encontrado: {args.entrada}")
+        sys.exit(1)
+
+    enriquecer(args.entrada, args.saida, args.coluna, args.tamanho_bloco, args.separador)
+
+if __name__ == "__main__":
+    main()
@@ -11,15 +11,25 @@ if os.getenv("NON_INTERACTIVE") == "true":
 import pandas as pd
 import sqlalchemy
 from sqlalchemy import create_engine, text
-import glob, time, os, sys, zipfile
+import glob, io, time, os, sys, zipfile
 import dask.dataframe as dd
 import dask
 import gc
 import psutil
-import re, string, unicodedata
+import re
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# Módulos compartilhados com a API (app/)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from app.formatacao import codigos_necessarios, formatar_cnpj_completo, formatar_descricao
+from app.normalizacao import ajustaTelefone, ajusta_email, normalizaEndereco
+from app.snapshot import escrever_snapshot
+from app.rede.centralidade import pagerank
+from app.rede.componentes import UniaoBusca
+from app.rede.grafo_csr import GrafoCSR
+
 # ============ CONFIGURAÇÕES ============
 # Configurações de conexão PostgreSQL
 PG_HOST = 'localhost'
@@ -40,6 +50,27 @@ pasta_compactados = r"../dados-publicos-zip"
 pasta_saida = r"../dados-publicos"
 bApagaDescompactadosAposUso = True
 
+# Snapshot somente-leitura para servir GET /api/cnpj/{cnpj} sem PostgreSQL
+GERAR_SNAPSHOT = os.getenv("GERAR_SNAPSHOT", "false") == "true"
+CAMINHO_SNAPSHOT = os.getenv("CAMINHO_SNAPSHOT", r"../cnpj_snapshot.sqlite")
+
+# Grafo CSR de rede.ligacao para a API (GRAFO_CSR_PATH)
+GERAR_GRAFO_CSR = os.getenv("GERAR_GRAFO_CSR", "false") == "true"
+CAMINHO_GRAFO_CSR = os.getenv("CAMINHO_GRAFO_CSR", r"../grafo_csr")
+
+# Grupos econômicos (rede.grupo): nós com mais ligações que isso não unem
+# componentes; 0 desativa o corte
+GRUPO_GRAU_MAX_HUB = int(os.getenv("GRUPO_GRAU_MAX_HUB", "1000"))
+
+# Centralidade (rede.centralidade): inclui no grafo os endereços, telefones e
+# emails compartilhados (links.link_ete) como nós intermediários
+CENTRALIDADE_INCLUIR_ETE = os.getenv("CENTRALIDADE_INCLUIR_ETE", "true") == "true"
+
+# Links ETE incrementais: guarda os valores normalizados e o hash de cada
+# estabelecimento; na próxima carga, só os estabelecimentos alterados são
+# normalizados de novo (ver atualizar_links_ete_incremental)
+ETE_INCREMENTAL = os.getenv("ETE_INCREMENTAL", "false") == "true"
+
 # String de conexão PostgreSQL
 PG_CONNECTION_STRING = f'postgresql://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DATABASE}'
 
@@ -85,6 +116,12 @@ def executar_sql(engine, sql_commands):
                     print(f"Erro ao executar SQL: {e}")
                     raise
 
+def executar_vacuum(engine, tabela):
+    """VACUUM ANALYZE fora de transação (habilita index-only scans)"""
+    print(f"Executando: VACUUM ANALYZE {tabela}...")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"VACUUM ANALYZE {tabela}"))
+
 # ============ PARTE 1: IMPORTAÇÃO DA BASE CNPJ ============
 
 def descompactar_arquivos():
@@ -215,6 +252,17 @@ def criar_tabelas_principais(engine):
     """
     executar_sql(engine, sql)
 
+def limpar_tabelas_principais(engine):
+    """Esvazia as tabelas principais antes de carregar uma nova base"""
+    # carregar_arquivo_tipo acrescenta linhas (if_exists='append'): sem isso,
+    # uma nova carga duplicaria cada CNPJ e o modo incremental compararia
+    # linhas da base anterior com as da nova
+    print("Esvaziando tabelas principais da carga anterior...")
+    sql = """
+    TRUNCATE cnpj.empresas, cnpj.estabelecimento, cnpj.socios, cnpj.simples
+    """
+    executar_sql(engine, sql)
+
 def carregar_arquivo_tipo(engine, nome_tabela, tipo, colunas):
     """Carrega arquivos por tipo (EMPRESAS, ESTABELECIMENTOS, etc)"""
     arquivos = list(glob.glob(os.path.join(pasta_saida, '*' + tipo)))
@@ -276,132 +324,10 @@ def criar_indices_principais(engine):
 
 # ============ PARTE 2: NORMALIZAÇÃO E LINKS (ETE) ============
 
-dicAbreviaturas = {
-    "A":"AREA", "AC":"ACESSO", "ACA":"ACAMPAMENTO", "AD":"ADRO",
-    "AE":"AREA ESPECIAL", "AER":"AEROPORTO", "AL":"ALAMEDA", "AR":"AREA",
-    "ART":"ARTERIA", "AT":"ALTO", "ATL":"ATALHO", "AV":"AVENIDA",
-    "AVEN":"AVENIDA", "AVC":"AVENIDA CONTORNO", "BAL":"BALNEARIO", "BC":"BECO",
-    "BEL":"BELVEDERE", "BL":"BLOCO", "BSQ":"BOSQUE", "BVD":"BOULEVARD",
-    "BX":"BAIXA", "CAL":"CALCADA", "CAM":"CAMINHO", "CAN":"CANAL",
-    "CH":"CHACARA", "CHA":"CHAPADAO", "CIR":"CIRCULAR", "CJ":"CONJUNTO",
-    "CMP":"COMPLEXO VIARIO", "CND":"CONDOMINIO", "COL":"COLONIA",
-    "CON":"CONDOMINIO", "COR":"CORREDOR", "CPO":"CAMPO", "CRG":"CORREGO",
-    "DSC":"DESCIDA", "DSV":"DESVIO", "DT":"DISTRITO", "ENT":"ENTRADA PARTICULAR",
-    "EQ":"ENTREQUADRA", "ESC":"ESCADA", "ESP":"ESPLANADA", "EST":"ESTRADA",
-    "ETC":"ESTACAO", "ETD":"ESTADIO", "ETN":"ESTANCIA", "EVD":"ELEVADA",
-    "FAV":"FAVELA", "FAZ":"FAZENDA", "FER":"FERROVIA", "FNT":"FONTE",
-    "FRA":"FEIRA", "FTE":"FORTE", "GJA":"GRANJA", "HAB":"HABITACIONAL",
-    "IA":"ILHA", "JD":"JARDIM", "LAD":"LADEIRA", "LD":"LADEIRA",
-    "LG":"LAGO", "LGA":"LAGO", "LGO":"LARGO", "LOT":"LOTEAMENTO",
-    "LRG":"LARGO", "MNA":"MARINA", "MOD":"MODULO", "MRO":"MORRO",
-    "MTE":"MONTE", "NUC":"NUCLEO", "OTR":"OUTROS", "PAR":"PARALELA",
-    "PAS":"PASSARELA", "PAT":"PATIO", "PC":"PRACA", "PCA":"PRACA",
-    "PDA":"PARADA", "PDO":"PARADOURO", "PNT":"PONTA", "PQ":"PARQUE",
-    "PR":"PRAIA", "PRL":"PROLONGAMENTO", "PRQ":"PARQUE", "PSA":"PASSARELA",
-    "PSG":"PASSAGEM", "PTE":"PONTE", "PTO":"PATIO", "Q":"QUADRA",
-    "QD":"QUADRA", "QTA":"QUINTAS", "R":"RUA", "RAM":"RAMAL",
-    "RDV":"RODOVIA", "REC":"RECANTO", "RER":"RETIRO", "RES":"RESIDENCIAL",
-    "RET":"RETA", "RMP":"RAMPA", "ROD":"RODOVIA", "ROT":"ROTULA",
-    "RTN":"RETORNO", "RTT":"ROTATORIA", "SIT":"SITIO", "SRV":"SERVIDAO",
-    "ST":"SETOR", "SUB":"SUBIDA", "TCH":"TRINCHEIRA", "TER":"TERMINAL",
-    "TR":"TRAVESSA", "TRV":"TREVO", "TV":"TRAVESSA", "UNI":"UNIDADE",
-    "V":"VIA", "VAL":"VALE", "VD":"VIADUTO", "VER":"VEREDA",
-    "VEV":"VIELA", "VEX":"VIAEXPRESSA", "VIA":"VIA", "VL":"VILA",
-    "VLA":"VIELA", "VLE":"VALE", "VRT":"VARIANTE"
-}
-
-def soCaracteres(data):
-    if data is None:
-        return ''
-    t = ''.join(x for x in unicodedata.normalize('NFKD', data) if x in string.printable)
-    return re.sub(r'\W', ' ', t)
-
-def normalizaEndereco(enderecoIn, ignoraEnderecoSoComNumeros=True, ignoraEnderecoSemNumeros=True):
-    if not enderecoIn:
-        return ''
-    
-    enderecoAux = re.sub(r'([0-9]+)[.]([0-9]+)', '\\1\\2', enderecoIn).upper()
-    enderecoAux = re.sub(r'([A-Z])(\d)', '\\1 \\2', enderecoAux)
-    enderecoAux = re.sub(r'(\d)([A-Z])', '\\1 \\2', enderecoAux)
-    
-    enderecoAux = " %s " % (soCaracteres(enderecoAux))
-    enderecoAux = enderecoAux.replace(' S N ', ' ')
-    lendereco = enderecoAux.split()
-    
-    if len(lendereco) == 0:
-        return ''
-    
-    if lendereco[0] == 'LOC':
-        lendereco[0] = ''
-    
-    palavras = set()
-    numeros = []
-    
-    for k, pedaco in enumerate(lendereco):
-        pedacoAjustado = pedaco
-        if pedaco in dicAbreviaturas:
-            if len(pedaco) > 1 or k <= 1:
-                pedacoAjustado = dicAbreviaturas[pedaco]
-        
-        if pedacoAjustado:
-            if pedacoAjustado.isdigit():
-                pedacoAjustado = pedacoAjustado.lstrip('0')
-                if pedacoAjustado:
-                    numeros.append(pedacoAjustado)
-            else:
-                palavras.add(pedacoAjustado)
-    
-    palavrasOrdenadas = sorted(list(palavras))
-    
-    if ignoraEnderecoSemNumeros and not numeros:
-        return ''
-    
-    if ignoraEnderecoSoComNumeros and not palavrasOrdenadas:
-        return ''
-    
-    palavrasOrdenadas.extend(numeros)
-    endereco = ' '.join(palavrasOrdenadas)
-    return endereco
-
-def ajustaTelefone(telefoneIn):
-    if not telefoneIn or telefoneIn == '0 0':
-        return ''
-    
-    telefoneIn = ' '.join(telefoneIn.split()).strip()
-    
-    if telefoneIn[-7:] in ('0000000', '1111111', '2222222', '3333333', '4444444',
-                           '5555555', '6666666', '7777777', '8888888', '9999999'):
-        return ''
-    
-    if ' ' in telefoneIn:
-        pos = telefoneIn.find(' ')
-        ddd, t = telefoneIn[:pos], re.sub(' ', '', telefoneIn[pos:])
-        if len(ddd) > 2:
-            ddd = ddd[-2:]
-        if len(t) < 4:
-            return ''
-        return ddd + ' ' + t
-    elif len(telefoneIn) < 9:
-        return ''
-    else:
-        return telefoneIn
-
-def ajusta_email(emailin):
-    if not emailin:
-        return ''
-    
-    emailin = str(emailin).strip()
-    if emailin.startswith("'"):
-        emailin = emailin[1:]
-    if emailin.endswith("'"):
-        emailin = emailin[:-1]
-    
-    if '@' not in emailin:
-        return ''
-    
-    return emailin.lower()
+# Restringe o processamento aos estabelecimentos alterados (modo incremental)
+FILTRO_ALTERADOS = "cnpj IN (SELECT cnpj FROM links.cnpj_alterado)"
 
-def processar_enderecos(engine):
+def processar_enderecos(engine, somente_alterados=False):
     """Processa e normaliza endereços"""
     print("Processando endereços...")
     
@@ -416,7 +342,8 @@ def processar_enderecos(engine):
     executar_sql(engine, sql)
     
     # Processar em lotes
-    query = """
+    filtro = f"WHERE {FILTRO_ALTERADOS}" if somente_alterados else ""
+    query = f"""
     SELECT cnpj, situacao_cadastral as situacao,
            CONCAT(logradouro, ' ', numero, ' ', complemento) as logradouro_completo,
            COALESCE(m.descricao, nome_cidade_exterior) as municipio,
@@ -424,6 +351,7 @@ def processar_enderecos(engine):
     FROM cnpj.estabelecimento e
     LEFT JOIN cnpj.municipio m ON m.codigo = e.municipio
     LEFT JOIN cnpj.pais p ON p.codigo = e.pais
+    {filtro}
     LIMIT %s OFFSET %s
     """
     
@@ -454,7 +382,7 @@ def processar_enderecos(engine):
         gc.collect()
         print(f"  Processados {offset} registros...")
 
-def processar_telefones(engine):
+def processar_telefones(engine, somente_alterados=False):
     """Processa e normaliza telefones"""
     print("Processando telefones...")
     
@@ -467,10 +395,12 @@ def processar_telefones(engine):
     """
     executar_sql(engine, sql)
     
-    query = """
+    filtro = f"WHERE {FILTRO_ALTERADOS}" if somente_alterados else ""
+    query = f"""
     SELECT cnpj, situacao_cadastral as situacao,
            ddd1, telefone1, ddd2, telefone2, ddd_fax, fax
     FROM cnpj.estabelecimento
+    {filtro}
     LIMIT %s OFFSET %s
     """
     
@@ -506,7 +436,7 @@ def processar_telefones(engine):
         gc.collect()
         print(f"  Processados {offset} registros...")
 
-def processar_emails(engine):
+def processar_emails(engine, somente_alterados=False):
     """Processa e normaliza emails"""
     print("Processando emails...")
     
@@ -519,10 +449,12 @@ def processar_emails(engine):
     """
     executar_sql(engine, sql)
     
-    query = """
+    filtro = f"AND {FILTRO_ALTERADOS}" if somente_alterados else ""
+    query = f"""
     SELECT cnpj, situacao_cadastral as situacao, correio_eletronico as email
     FROM cnpj.estabelecimento
     WHERE correio_eletronico IS NOT NULL AND correio_eletronico != ''
+    {filtro}
     LIMIT %s OFFSET %s
     """
     
@@ -549,72 +481,326 @@ def processar_emails(engine):
         gc.collect()
         print(f"  Processados {offset} registros...")
 
+# Partições de links.link_ete: (descricao, prefixo do id2, tabela temporária, coluna)
+PARTICOES_LINK_ETE = [
+    ('end', 'EN_', 'endereco_temp', 'endereco'),
+    ('tel', 'TE_', 'telefone_temp', 'telefone'),
+    ('email', 'EM_', 'email_temp', 'email'),
+]
+
+# links.link_ete.id2 guarda uma chave BIGINT em vez do texto (EN_..., TE_...,
+# EM_...): o índice por id2 fica com 8 bytes por entrada em vez de dezenas.
+# links.atributo mapeia chave -> texto; a chave é hashtextextended(texto, 0)
+# e, nos raros textos com hash repetido, hashtextextended(texto, n) com n =
+# posição do texto entre os que colidiram. A busca pelo texto usa o índice
+# de `hash` e confere o texto.
+
+def criar_atributos_particao(engine, descricao, prefixo, tabela_temp, coluna):
+    """Insere em links.atributo os valores compartilhados de um tipo"""
+    sql = f"""
+    INSERT INTO links.atributo (chave, hash, descricao, id2, qtd)
+    SELECT hashtextextended('{prefixo}' || {coluna}, 0),
+           hashtextextended('{prefixo}' || {coluna}, 0),
+           '{descricao}',
+           '{prefixo}' || {coluna},
+           COUNT(*)
+    FROM links.{tabela_temp}
+    WHERE situacao = '02'
+    GROUP BY {coluna}
+    HAVING COUNT(*) > 1
+    """
+    executar_sql(engine, sql)
+
+def criar_particao_link_ete(engine, descricao, prefixo, tabela_temp, coluna):
+    """Popula e indexa uma partição de links.link_ete (executada em paralelo)"""
+    particao = f"links.link_ete_{descricao}"
+    sql = f"""
+    INSERT INTO {particao}
+    SELECT 
+        'PJ_' || t.cnpj as id1,
+        a.chave as id2,
+        '{descricao}' as descricao,
+        a.qtd as valor
+    FROM links.{tabela_temp} t
+    INNER JOIN links.atributo a
+        ON a.hash = hashtextextended('{prefixo}' || t.{coluna}, 0)
+       AND a.id2 = '{prefixo}' || t.{coluna};
+    
+    -- Índices cobrindo as consultas por id1 e por id2 (index-only scan);
+    -- (id2, id1) também serve a paginação por cursor dos compartilhados
+    CREATE INDEX IF NOT EXISTS idx_link_ete_{descricao}_id1 ON {particao}(id1) INCLUDE (id2, valor);
+    CREATE INDEX IF NOT EXISTS idx_link_ete_{descricao}_id2 ON {particao}(id2, id1) INCLUDE (valor)
+    """
+    executar_sql(engine, sql)
+    executar_vacuum(engine, particao)
+
+def executar_por_particao(engine, funcao):
+    """Executa `funcao` para cada partição de link_ete, cada uma em uma conexão"""
+    with ThreadPoolExecutor(max_workers=len(PARTICOES_LINK_ETE)) as executor:
+        futuros = [
+            executor.submit(funcao, engine, *particao)
+            for particao in PARTICOES_LINK_ETE
+        ]
+        for futuro in futuros:
+            futuro.result()
+
 def criar_links_ete(engine):
-    """Cria tabela de links ETE"""
+    """Cria tabela de links ETE particionada por tipo (end, tel, email)"""
     print("Criando links ETE...")
     
+    # A carga completa recria link_ete e atributo (senão a nova carga
+    # duplicaria as chaves e o ADD PRIMARY KEY falharia); em bases anteriores
+    # ao particionamento link_ete é uma tabela comum (id2 TEXT), que CREATE
+    # TABLE IF NOT EXISTS manteria. CASCADE remove a view cnpj.estatisticas,
+    # recriada adiante
+    executar_sql(engine, "DROP TABLE IF EXISTS links.link_ete, links.atributo CASCADE")
+    
     sql = """
-    -- Links de endereço
-    CREATE TABLE IF NOT EXISTS links.link_ete AS
-    WITH endereco_count AS (
-        SELECT endereco, COUNT(*) as contagem
-        FROM links.endereco_temp
-        WHERE situacao = '02'
-        GROUP BY endereco
-        HAVING COUNT(*) > 1
-    )
-    SELECT 
-        'PJ_' || e.cnpj as id1,
-        'EN_' || e.endereco as id2,
-        'end' as descricao,
-        ec.contagem as valor
-    FROM links.endereco_temp e
-    INNER JOIN endereco_count ec ON e.endereco = ec.endereco;
-    
-    -- Links de telefone
-    INSERT INTO links.link_ete
-    WITH telefone_count AS (
-        SELECT telefone, COUNT(*) as contagem
-        FROM links.telefone_temp
-        WHERE situacao = '02'
-        GROUP BY telefone
-        HAVING COUNT(*) > 1
-    )
-    SELECT 
-        'PJ_' || t.cnpj as id1,
-        'TE_' || t.telefone as id2,
-        'tel' as descricao,
-        tc.contagem as valor
-    FROM links.telefone_temp t
-    INNER JOIN telefone_count tc ON t.telefone = tc.telefone;
-    
-    -- Links de email
-    INSERT INTO links.link_ete
-    WITH email_count AS (
-        SELECT email, COUNT(*) as contagem
-        FROM links.email_temp
-        WHERE situacao = '02'
-        GROUP BY email
-        HAVING COUNT(*) > 1
-    )
-    SELECT 
-        'PJ_' || e.cnpj as id1,
-        'EM_' || e.email as id2,
-        'email' as descricao,
-        ec.contagem as valor
-    FROM links.email_temp e
-    INNER JOIN email_count ec ON e.email = ec.email;
+    CREATE TABLE links.atributo (
+        chave BIGINT,
+        hash BIGINT,
+        descricao TEXT,
+        id2 TEXT,
+        qtd BIGINT
+    );
+    CREATE TABLE links.link_ete (
+        id1 TEXT,
+        id2 BIGINT,
+        descricao TEXT,
+        valor BIGINT
+    ) PARTITION BY LIST (descricao)
+    """
+    for descricao, _, _, _ in PARTICOES_LINK_ETE:
+        sql += f""";
+    CREATE TABLE links.link_ete_{descricao}
+        PARTITION OF links.link_ete FOR VALUES IN ('{descricao}')"""
+    executar_sql(engine, sql)
     
-    -- Criar índices
-    CREATE INDEX IF NOT EXISTS idx_link_ete_id1 ON links.link_ete(id1);
-    CREATE INDEX IF NOT EXISTS idx_link_ete_id2 ON links.link_ete(id2);
+    executar_por_particao(engine, criar_atributos_particao)
+    
+    sql = """
+    CREATE INDEX IF NOT EXISTS idx_atributo_hash ON links.atributo(hash);
+    
+    -- Colisões de hash: a partir do segundo texto, nova chave com outra semente
+    UPDATE links.atributo a
+    SET chave = hashtextextended(a.id2, c.ordem)
+    FROM (
+        SELECT hash, id2, ROW_NUMBER() OVER (PARTITION BY hash ORDER BY id2) - 1 AS ordem
+        FROM links.atributo
+        WHERE hash IN (SELECT hash FROM links.atributo GROUP BY hash HAVING COUNT(*) > 1)
+    ) c
+    WHERE a.hash = c.hash AND a.id2 = c.id2 AND c.ordem > 0;
+    
+    ALTER TABLE links.atributo ADD PRIMARY KEY (chave)
+    """
+    executar_sql(engine, sql)
+    executar_vacuum(engine, 'links.atributo')
     
-    -- Limpar tabelas temporárias
-    DROP TABLE IF EXISTS links.endereco_temp;
-    DROP TABLE IF EXISTS links.telefone_temp;
-    DROP TABLE IF EXISTS links.email_temp;
+    # Cada partição é populada e indexada em uma conexão própria
+    executar_por_particao(engine, criar_particao_link_ete)
+    
+    sql = """
+    -- Índices da tabela pai: reaproveitam os índices já criados nas partições
+    CREATE INDEX IF NOT EXISTS idx_link_ete_id1 ON links.link_ete(id1) INCLUDE (id2, valor);
+    CREATE INDEX IF NOT EXISTS idx_link_ete_id2 ON links.link_ete(id2, id1) INCLUDE (valor)
     """
     executar_sql(engine, sql)
+    
+    if ETE_INCREMENTAL:
+        guardar_estado_ete(engine)
+    else:
+        # Limpar tabelas temporárias
+        executar_sql(engine, """
+        DROP TABLE IF EXISTS links.endereco_temp;
+        DROP TABLE IF EXISTS links.telefone_temp;
+        DROP TABLE IF EXISTS links.email_temp
+        """)
+
+# ============ LINKS ETE INCREMENTAIS ============
+
+# Estado guardado entre cargas (ETE_INCREMENTAL=true):
+# - links.valor_<descricao>: todos os valores normalizados por CNPJ (as
+#   tabelas *_temp renomeadas), inclusive os não compartilhados, que podem
+#   passar a ser compartilhados na carga seguinte;
+# - links.estabelecimento_hash: hash das colunas de cada estabelecimento que
+#   entram na normalização. Na carga seguinte, só os CNPJs com hash diferente
+#   (novos, alterados ou removidos) são normalizados de novo, e só os valores
+#   que eles tinham ou passaram a ter são recontados em link_ete.
+
+COLUNAS_HASH_ESTABELECIMENTO = [
+    'situacao_cadastral', 'logradouro', 'numero', 'complemento', 'municipio', 'uf',
+    'pais', 'nome_cidade_exterior', 'ddd1', 'telefone1', 'ddd2', 'telefone2',
+    'ddd_fax', 'fax', 'correio_eletronico',
+]
+
+EXPR_HASH_ESTABELECIMENTO = "hashtextextended(concat_ws('|', {}), 0)".format(
+    ", ".join(f"COALESCE({coluna}, '')" for coluna in COLUNAS_HASH_ESTABELECIMENTO)
+)
+
+def tabela_valores(descricao):
+    return f"valor_{descricao}"
+
+def estado_ete_existe(engine):
+    """True se uma carga anterior guardou o estado para o modo incremental"""
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT to_regclass('links.estabelecimento_hash') IS NOT NULL
+               AND to_regclass('links.atributo') IS NOT NULL
+        """)).scalar()
+
+def guardar_estado_ete(engine):
+    """Guarda valores normalizados e hashes dos estabelecimentos (carga completa)"""
+    print("Guardando estado para links ETE incrementais...")
+    for descricao, _, tabela_temp, coluna in PARTICOES_LINK_ETE:
+        tabela = tabela_valores(descricao)
+        executar_sql(engine, f"""
+        DROP TABLE IF EXISTS links.{tabela};
+        ALTER TABLE links.{tabela_temp} RENAME TO {tabela};
+        CREATE INDEX idx_{tabela}_cnpj ON links.{tabela}(cnpj);
+        CREATE INDEX idx_{tabela}_{coluna} ON links.{tabela}({coluna})
+        """)
+    
+    executar_sql(engine, f"""
+    DROP TABLE IF EXISTS links.estabelecimento_hash;
+    CREATE TABLE links.estabelecimento_hash AS
+    SELECT cnpj, {EXPR_HASH_ESTABELECIMENTO} AS hash
+    FROM cnpj.estabelecimento;
+    ALTER TABLE links.estabelecimento_hash ADD PRIMARY KEY (cnpj)
+    """)
+
+def atualizar_particao_link_ete(engine, descricao, prefixo, tabela_temp, coluna):
+    """Reconta, em link_ete e links.atributo, os valores afetados de um tipo"""
+    particao = f"links.link_ete_{descricao}"
+    tabela = f"links.{tabela_valores(descricao)}"
+    sql = f"""
+    -- Valores afetados: os que os CNPJs alterados tinham e os que passaram a ter
+    DROP TABLE IF EXISTS links.afetado_{descricao};
+    CREATE TABLE links.afetado_{descricao} AS
+    SELECT v.{coluna} FROM {tabela} v
+    WHERE v.cnpj IN (SELECT cnpj FROM links.cnpj_alterado)
+    UNION
+    SELECT {coluna} FROM links.{tabela_temp};
+    
+    DELETE FROM {tabela} v USING links.cnpj_alterado c WHERE v.cnpj = c.cnpj;
+    INSERT INTO {tabela} (cnpj, {coluna}, situacao)
+    SELECT cnpj, {coluna}, situacao FROM links.{tabela_temp};
+    
+    -- Nova contagem de CNPJs ativos de cada valor afetado
+    DROP TABLE IF EXISTS links.contagem_{descricao};
+    CREATE TABLE links.contagem_{descricao} AS
+    SELECT f.{coluna},
+           '{prefixo}' || f.{coluna} AS id2,
+           hashtextextended('{prefixo}' || f.{coluna}, 0) AS hash,
+           (SELECT COUNT(*) FROM {tabela} v
+            WHERE v.{coluna} = f.{coluna} AND v.situacao = '02') AS qtd
+    FROM links.afetado_{descricao} f;
+    
+    DELETE FROM {particao} le
+    USING links.atributo a, links.contagem_{descricao} c
+    WHERE le.id2 = a.chave AND a.hash = c.hash AND a.id2 = c.id2;
+    
+    DELETE FROM links.atributo a
+    USING links.contagem_{descricao} c
+    WHERE a.hash = c.hash AND a.id2 = c.id2 AND c.qtd <= 1;
+    
+    UPDATE links.atributo a SET qtd = c.qtd
+    FROM links.contagem_{descricao} c
+    WHERE a.hash = c.hash AND a.id2 = c.id2;
+    
+    -- Valores que passaram a ser compartilhados; se o hash já é chave de
+    -- outro texto, usa a semente seguinte (como na carga completa)
+    INSERT INTO links.atributo (chave, hash, descricao, id2, qtd)
+    SELECT c.hash, c.hash, '{descricao}', c.id2, c.qtd
+    FROM links.contagem_{descricao} c
+    WHERE c.qtd > 1
+      AND NOT EXISTS (SELECT 1 FROM links.atributo a WHERE a.hash = c.hash AND a.id2 = c.id2)
+    ON CONFLICT (chave) DO NOTHING;
+    
+    INSERT INTO links.atributo (chave, hash, descricao, id2, qtd)
+    SELECT hashtextextended(c.id2, (SELECT COUNT(*) FROM links.atributo a WHERE a.hash = c.hash)),
+           c.hash, '{descricao}', c.id2, c.qtd
+    FROM links.contagem_{descricao} c
+    WHERE c.qtd > 1
+      AND NOT EXISTS (SELECT 1 FROM links.atributo a WHERE a.hash = c.hash AND a.id2 = c.id2);
+    
+    INSERT INTO {particao}
+    SELECT 'PJ_' || v.cnpj as id1,
+           a.chave as id2,
+           '{descricao}' as descricao,
+           a.qtd as valor
+    FROM links.contagem_{descricao} c
+    JOIN links.atributo a ON a.hash = c.hash AND a.id2 = c.id2
+    JOIN {tabela} v ON v.{coluna} = c.{coluna};
+    
+    DROP TABLE links.afetado_{descricao};
+    DROP TABLE links.contagem_{descricao};
+    DROP TABLE links.{tabela_temp}
+    """
+    executar_sql(engine, sql)
+    executar_vacuum(engine, particao)
+
+def atualizar_links_ete_incremental(engine):
+    """
+    Atualiza links ETE a partir do estado da carga anterior.
+
+    Compara o hash atual de cada estabelecimento com o guardado, normaliza
+    só os CNPJs alterados e reconta os valores afetados em link_ete e
+    links.atributo, sem reconstruir as tabelas.
+    """
+    print("Atualizando links ETE (incremental)...")
+    
+    executar_sql(engine, f"""
+    DROP TABLE IF EXISTS links.estabelecimento_hash_novo;
+    CREATE TABLE links.estabelecimento_hash_novo AS
+    SELECT cnpj, {EXPR_HASH_ESTABELECIMENTO} AS hash
+    FROM cnpj.estabelecimento;
+    
+    -- Novos, alterados e removidos
+    DROP TABLE IF EXISTS links.cnpj_alterado;
+    CREATE TABLE links.cnpj_alterado AS
+    SELECT COALESCE(n.cnpj, a.cnpj) AS cnpj
+    FROM links.estabelecimento_hash_novo n
+    FULL JOIN links.estabelecimento_hash a ON a.cnpj = n.cnpj
+    WHERE a.hash IS DISTINCT FROM n.hash;
+    ALTER TABLE links.cnpj_alterado ADD PRIMARY KEY (cnpj)
+    """)
+    
+    with engine.connect() as conn:
+        alterados = conn.execute(text("SELECT COUNT(*) FROM links.cnpj_alterado")).scalar()
+    print(f"  Estabelecimentos alterados: {alterados:,}")
+    
+    processar_enderecos(engine, somente_alterados=True)
+    processar_telefones(engine, somente_alterados=True)
+    processar_emails(engine, somente_alterados=True)
+    
+    executar_por_particao(engine, atualizar_particao_link_ete)
+    executar_vacuum(engine, 'links.atributo')
+    
+    executar_sql(engine, """
+    DROP TABLE links.estabelecimento_hash;
+    ALTER TABLE links.estabelecimento_hash_novo RENAME TO estabelecimento_hash;
+    ALTER TABLE links.estabelecimento_hash ADD PRIMARY KEY (cnpj);
+    DROP TABLE links.cnpj_alterado
+    """)
+
+def criar_atributos_compartilhados(engine):
+    """Cria tabela com uma linha por endereço/telefone/email compartilhado"""
+    print("Criando tabela de atributos compartilhados...")
+    
+    sql = """
+    DROP TABLE IF EXISTS links.atributo_compartilhado;
+    CREATE TABLE links.atributo_compartilhado AS
+    SELECT descricao as tipo,
+           id2 as chave,
+           qtd as qtd_cnpjs
+    FROM links.atributo;
+    
+    -- Top-k por tipo (endpoints de duplicados) com index-only scan
+    CREATE INDEX IF NOT EXISTS idx_atributo_compartilhado_tipo_qtd
+        ON links.atributo_compartilhado(tipo, qtd_cnpjs DESC) INCLUDE (chave)
+    """
+    executar_sql(engine, sql)
+    executar_vacuum(engine, 'links.atributo_compartilhado')
 
 # ============ PARTE 3: CRIAÇÃO DA REDE DE LIGAÇÕES ============
 
@@ -724,6 +910,269 @@ def criar_tabela_ligacao(engine):
     
     executar_sql(engine, sql)
 
+def criar_ids_inteiros_rede(engine):
+    """Cria dicionário de nós/tipos e a versão de rede.ligacao com ids inteiros"""
+    print("Criando ids inteiros da rede...")
+    
+    sql = """
+    -- Dicionário de tipos de ligação (descricao + comentario)
+    DROP TABLE IF EXISTS rede.tipo_ligacao;
+    CREATE TABLE rede.tipo_ligacao AS
+    SELECT (ROW_NUMBER() OVER (ORDER BY descricao, comentario))::SMALLINT as id,
+           descricao,
+           comentario
+    FROM (SELECT DISTINCT descricao, comentario FROM rede.ligacao) t;
+    ALTER TABLE rede.tipo_ligacao ADD PRIMARY KEY (id);
+    
+    -- Dicionário de nós: chave de texto -> id BIGINT
+    -- tipo: 1 = PJ, 2 = PF, 3 = PE, 0 = outros
+    DROP TABLE IF EXISTS rede.no;
+    CREATE TABLE rede.no AS
+    SELECT (ROW_NUMBER() OVER (ORDER BY chave))::BIGINT as id,
+           chave,
+           (CASE SUBSTRING(chave, 1, 3)
+                WHEN 'PJ_' THEN 1
+                WHEN 'PF_' THEN 2
+                WHEN 'PE_' THEN 3
+                ELSE 0
+            END)::SMALLINT as tipo
+    FROM (
+        SELECT id1 as chave FROM rede.ligacao
+        UNION
+        SELECT id2 as chave FROM rede.ligacao
+    ) t;
+    ALTER TABLE rede.no ADD PRIMARY KEY (id);
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_no_chave ON rede.no(chave);
+    -- Busca de pessoas (PF_/PE_) por prefixo da chave: CPF mascarado e nome
+    CREATE INDEX IF NOT EXISTS idx_no_pessoa_prefixo
+        ON rede.no(chave text_pattern_ops) WHERE tipo IN (2, 3);
+    
+    -- Ligações com ids inteiros
+    DROP TABLE IF EXISTS rede.ligacao_id;
+    CREATE TABLE rede.ligacao_id AS
+    SELECT n1.id as id1,
+           n2.id as id2,
+           t.id as tipo
+    FROM rede.ligacao l
+    INNER JOIN rede.no n1 ON n1.chave = l.id1
+    INNER JOIN rede.no n2 ON n2.chave = l.id2
+    INNER JOIN rede.tipo_ligacao t
+        ON t.descricao IS NOT DISTINCT FROM l.descricao
+        AND t.comentario IS NOT DISTINCT FROM l.comentario;
+    
+    -- Índices cobrindo a travessia (index-only scan)
+    CREATE INDEX IF NOT EXISTS idx_ligacao_id_id1 ON rede.ligacao_id(id1) INCLUDE (id2, tipo);
+    CREATE INDEX IF NOT EXISTS idx_ligacao_id_id2 ON rede.ligacao_id(id2) INCLUDE (id1, tipo);
+    """
+    
+    executar_sql(engine, sql)
+    executar_vacuum(engine, 'rede.ligacao_id')
+
+def criar_tabela_grau(engine):
+    """Cria tabela com o grau (saída, entrada e total) de cada nó da rede"""
+    print("Criando tabela de graus da rede...")
+    
+    sql = """
+    DROP TABLE IF EXISTS rede.grau;
+    CREATE TABLE rede.grau AS
+    SELECT n.id,
+           n.chave,
+           COALESCE(s.qtd, 0)::INTEGER as grau_saida,
+           COALESCE(e.qtd, 0)::INTEGER as grau_entrada,
+           (COALESCE(s.qtd, 0) + COALESCE(e.qtd, 0))::INTEGER as grau
+    FROM rede.no n
+    LEFT JOIN (SELECT id1 as id, COUNT(*) as qtd FROM rede.ligacao_id GROUP BY id1) s ON s.id = n.id
+    LEFT JOIN (SELECT id2 as id, COUNT(*) as qtd FROM rede.ligacao_id GROUP BY id2) e ON e.id = n.id;
+    ALTER TABLE rede.grau ADD PRIMARY KEY (id);
+    
+    -- Consultas por chave de texto e por id sem acessar o heap
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_grau_chave ON rede.grau(chave) INCLUDE (grau);
+    CREATE INDEX IF NOT EXISTS idx_grau_id ON rede.grau(id) INCLUDE (grau)
+    """
+    
+    executar_sql(engine, sql)
+    executar_vacuum(engine, 'rede.grau')
+
+def copiar_dataframe(engine, df, tabela):
+    """Grava o DataFrame em uma tabela existente via COPY (CSV em memória)"""
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            for inicio in range(0, len(df), CHUNK_SIZE * 10):
+                buffer = io.StringIO()
+                df.iloc[inicio:inicio + CHUNK_SIZE * 10].to_csv(buffer, index=False, header=False)
+                buffer.seek(0)
+                cur.copy_expert(f"COPY {tabela} FROM STDIN WITH (FORMAT csv)", buffer)
+        conn.commit()
+    finally:
+        conn.close()
+
+def criar_grupos_economicos(engine):
+    """
+    Calcula os grupos econômicos (componentes conexos de rede.ligacao_id)
+    com union-find e grava rede.grupo(cnpj_basico, grupo_id, tamanho)
+    """
+    print("Calculando grupos econômicos...")
+    wait_for_ram()
+
+    with engine.connect() as conn:
+        n = conn.execute(text("SELECT COALESCE(MAX(id), 0) + 1 FROM rede.no")).scalar()
+
+    def lotes_arestas():
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, max_row_buffer=CHUNK_SIZE * 10).execute(
+                text("SELECT id1, id2 FROM rede.ligacao_id")
+            )
+            for rows in result.partitions(CHUNK_SIZE * 10):
+                arestas = np.array(rows, dtype=np.int64)
+                yield arestas[:, 0], arestas[:, 1]
+
+    # Nós com grau acima do limite (ex.: contadores e representantes de
+    # milhares de empresas) não unem componentes
+    eh_hub = np.zeros(n, dtype=bool)
+    if GRUPO_GRAU_MAX_HUB > 0:
+        with engine.connect() as conn:
+            hubs = conn.execute(
+                text("SELECT id FROM rede.grau WHERE grau > :grau_max"),
+                {"grau_max": GRUPO_GRAU_MAX_HUB}
+            ).scalars().all()
+        eh_hub[np.array(hubs, dtype=np.int64)] = True
+        print(f"  {int(eh_hub.sum()):,} nós acima de {GRUPO_GRAU_MAX_HUB} ligações ignorados")
+
+    uniao = UniaoBusca(n)
+    for id1, id2 in lotes_arestas():
+        validas = ~(eh_hub[id1] | eh_hub[id2])
+        uniao.unir(id1[validas], id2[validas])
+
+    # Estabelecimentos da mesma empresa (cnpj_basico) ficam no mesmo grupo
+    with engine.connect() as conn:
+        pj = pd.read_sql(
+            text("SELECT id, SUBSTRING(chave, 4, 8) AS cnpj_basico FROM rede.no WHERE tipo = 1"),
+            conn
+        )
+    primeiro = pj.groupby('cnpj_basico')['id'].transform('min').to_numpy()
+    uniao.unir(pj['id'].to_numpy(), primeiro)
+
+    grupos = pd.DataFrame({
+        'cnpj_basico': pj['cnpj_basico'],
+        'grupo_id': uniao.raizes(pj['id'].to_numpy()),
+    }).drop_duplicates('cnpj_basico')
+    del pj, primeiro, uniao
+    grupos['tamanho'] = grupos.groupby('grupo_id')['cnpj_basico'].transform('size').astype(np.int64)
+    grupos = grupos.sort_values(['grupo_id', 'cnpj_basico'])
+
+    executar_sql(engine, """
+    DROP TABLE IF EXISTS rede.grupo;
+    CREATE TABLE rede.grupo (
+        cnpj_basico TEXT NOT NULL,
+        grupo_id BIGINT NOT NULL,
+        tamanho INTEGER NOT NULL
+    )
+    """)
+    copiar_dataframe(engine, grupos, 'rede.grupo')
+    print(f"  {len(grupos):,} empresas em {grupos['grupo_id'].nunique():,} grupos "
+          f"(maior: {int(grupos['tamanho'].max() if len(grupos) else 0):,})")
+    del grupos
+    gc.collect()
+
+    executar_sql(engine, """
+    ALTER TABLE rede.grupo ADD PRIMARY KEY (cnpj_basico);
+    CREATE INDEX IF NOT EXISTS idx_grupo_grupo_id ON rede.grupo(grupo_id) INCLUDE (cnpj_basico)
+    """)
+    executar_vacuum(engine, 'rede.grupo')
+
+def criar_centralidade(engine):
+    """
+    Calcula PageRank e graus de cada nó de rede.no e grava rede.centralidade
+
+    O grafo é tratado como não direcionado (ligações societárias nos dois
+    sentidos). Com CENTRALIDADE_INCLUIR_ETE, cada endereço/telefone/email
+    compartilhado vira um nó extra ligado aos CNPJs que o usam; esses nós só
+    participam do cálculo e não são gravados.
+    """
+    print("Calculando centralidade da rede...")
+    wait_for_ram()
+
+    with engine.connect() as conn:
+        n = conn.execute(text("SELECT COALESCE(MAX(id), 0) + 1 FROM rede.no")).scalar()
+
+    def ler_arestas(sql):
+        lotes1, lotes2 = [], []
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, max_row_buffer=CHUNK_SIZE * 10).execute(text(sql))
+            for rows in result.partitions(CHUNK_SIZE * 10):
+                arestas = np.array(rows, dtype=np.int64)
+                lotes1.append(arestas[:, 0])
+                lotes2.append(arestas[:, 1])
+        if not lotes1:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(lotes1), np.concatenate(lotes2)
+
+    id1, id2 = ler_arestas("SELECT id1, id2 FROM rede.ligacao_id")
+    grau_ete = np.zeros(n, dtype=np.int64)
+    total = n
+    if CENTRALIDADE_INCLUIR_ETE:
+        # Só CNPJs presentes em rede.no; as chaves de atributo viram ids n, n+1, ...
+        pj, chave = ler_arestas("""
+            SELECT n.id, le.id2
+            FROM links.link_ete le
+            JOIN rede.no n ON n.chave = le.id1
+        """)
+        _, atributo = np.unique(chave, return_inverse=True)
+        del chave
+        grau_ete = np.bincount(pj, minlength=n).astype(np.int64)
+        total = n + (int(atributo.max()) + 1 if len(atributo) else 0)
+        id1 = np.concatenate([id1, pj])
+        id2 = np.concatenate([id2, atributo + n])
+        del pj, atributo
+    print(f"  {total:,} nós, {len(id1):,} arestas")
+
+    rank = pagerank(np.concatenate([id1, id2]), np.concatenate([id2, id1]), total)[:n]
+    del id1, id2
+    gc.collect()
+
+    centralidade = pd.DataFrame({'id': np.arange(n, dtype=np.int64), 'pagerank': rank, 'grau_ete': grau_ete})
+    del rank, grau_ete
+    executar_sql(engine, """
+    DROP TABLE IF EXISTS rede.centralidade_tmp;
+    CREATE TABLE rede.centralidade_tmp (
+        id BIGINT NOT NULL,
+        pagerank DOUBLE PRECISION NOT NULL,
+        grau_ete INTEGER NOT NULL
+    )
+    """)
+    copiar_dataframe(engine, centralidade, 'rede.centralidade_tmp')
+    del centralidade
+    gc.collect()
+
+    executar_sql(engine, """
+    DROP TABLE IF EXISTS rede.centralidade;
+    CREATE TABLE rede.centralidade AS
+    SELECT g.id,
+           g.chave,
+           n.tipo,
+           c.pagerank,
+           g.grau_saida,
+           g.grau_entrada,
+           g.grau,
+           c.grau_ete,
+           (ROW_NUMBER() OVER (ORDER BY c.pagerank DESC, g.id))::BIGINT as posicao
+    FROM rede.centralidade_tmp c
+    JOIN rede.grau g ON g.id = c.id
+    JOIN rede.no n ON n.id = c.id;
+    DROP TABLE rede.centralidade_tmp;
+    ALTER TABLE rede.centralidade ADD PRIMARY KEY (id);
+    
+    -- /vinculos (por chave) e /ranking (top-k por tipo) sem acessar o heap
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_centralidade_chave
+        ON rede.centralidade(chave) INCLUDE (pagerank, posicao, grau, grau_ete);
+    CREATE INDEX IF NOT EXISTS idx_centralidade_tipo_pagerank
+        ON rede.centralidade(tipo, pagerank DESC) INCLUDE (chave, posicao, grau, grau_ete);
+    CREATE INDEX IF NOT EXISTS idx_centralidade_posicao
+        ON rede.centralidade(posicao) INCLUDE (chave, pagerank, grau, grau_ete)
+    """)
+    executar_vacuum(engine, 'rede.centralidade')
+
 def criar_tabela_busca(engine):
     """Cria tabela para busca textual"""
     print("Criando tabela de busca textual...")
@@ -768,16 +1217,9 @@ def criar_tabela_busca(engine):
         
         UNION
         
-        -- Links ETE
-        SELECT id1 as id_descricao
-        FROM links.link_ete
-        WHERE SUBSTRING(id1, 1, 3) != 'PJ_'
-        
-        UNION
-        
+        -- Links ETE (endereços, telefones e emails compartilhados)
         SELECT id2 as id_descricao
-        FROM links.link_ete
-        WHERE SUBSTRING(id2, 1, 3) != 'PJ_'
+        FROM links.atributo
     ) t;
     
     -- Criar índice GIN para busca rápida
@@ -857,6 +1299,114 @@ def adicionar_estatisticas(engine):
     
     executar_sql(engine, sql)
 
+# ============ PARTE 4: SNAPSHOT SOMENTE-LEITURA ============
+
+TABELAS_CODIGO = ['cnae', 'motivo', 'municipio', 'natureza_juridica', 'pais', 'qualificacao_socio']
+
+def gerar_snapshot_cnpj(engine, caminho=None):
+    """Gera snapshot SQLite (cnpj -> documento completo comprimido)"""
+    caminho = caminho or CAMINHO_SNAPSHOT
+    print(f"Gerando snapshot somente-leitura em {caminho}...")
+
+    # Tabelas de código são pequenas: ficam em memória
+    tabelas = {}
+    with engine.connect() as conn:
+        for tabela in TABELAS_CODIGO:
+            rows = conn.execute(text(f"SELECT codigo, descricao FROM cnpj.{tabela}")).fetchall()
+            tabelas[tabela] = {r[0]: r[1] for r in rows}
+        data_ref = conn.execute(text(
+            "SELECT valor FROM cnpj.referencia WHERE referencia = 'data_atualizacao' LIMIT 1"
+        )).scalar()
+
+    # Cursor no servidor, ordenado por cnpj (inserção sequencial no SQLite)
+    query = """
+    SELECT e.*,
+           to_jsonb(emp) AS emp_json,
+           to_jsonb(simp) AS simp_json,
+           (SELECT COALESCE(json_agg(to_jsonb(s)), '[]'::json)
+              FROM cnpj.socios s WHERE s.cnpj = e.cnpj) AS socios_json
+    FROM cnpj.estabelecimento e
+    LEFT JOIN cnpj.empresas emp ON emp.cnpj_basico = e.cnpj_basico
+    LEFT JOIN cnpj.simples simp ON simp.cnpj_basico = e.cnpj_basico
+    ORDER BY e.cnpj
+    """
+
+    def documentos():
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, max_row_buffer=CHUNK_SIZE).execute(text(query))
+            for k, row in enumerate(result.mappings(), start=1):
+                est_dict = dict(row)
+                emp_dict = est_dict.pop('emp_json') or {}
+                simp_dict = est_dict.pop('simp_json') or {}
+                socios_dicts = est_dict.pop('socios_json') or []
+
+                descricoes = {
+                    (tabela, codigo): formatar_descricao(codigo, tabelas[tabela].get(codigo))
+                    for tabela, codigo in codigos_necessarios(est_dict, emp_dict, socios_dicts)
+                }
+                cnpj = est_dict['cnpj']
+                yield cnpj, formatar_cnpj_completo(cnpj, est_dict, emp_dict, simp_dict, socios_dicts, descricoes)
+
+                if k % 1_000_000 == 0:
+                    print(f"  Processados {k} documentos...")
+
+    total = escrever_snapshot(caminho, documentos(), {
+        'data_atualizacao': data_ref or datetime.now().strftime('%d/%m/%Y'),
+        'gerado_em': datetime.now().isoformat(),
+    })
+    print(f"Snapshot gerado com {total:,} documentos")
+
+def gerar_grafo_csr(engine, pasta=None):
+    """Exporta rede.no/rede.ligacao_id para arrays CSR (.npy) usados pela API"""
+    pasta = pasta or CAMINHO_GRAFO_CSR
+    print(f"Gerando grafo CSR em {pasta}...")
+
+    with engine.connect() as conn:
+        total_nos = conn.execute(text("SELECT COUNT(*) FROM rede.no")).scalar()
+        total_arestas = conn.execute(text("SELECT COUNT(*) FROM rede.ligacao_id")).scalar()
+        tipos = [tuple(row) for row in conn.execute(text(
+            "SELECT descricao, comentario FROM rede.tipo_ligacao ORDER BY id"
+        ))]
+
+    # rede.no.id (1..n, na ordem da collation do banco) -> posição da chave
+    # na ordem de código, que é a usada pela busca binária da API
+    posicao = np.zeros(total_nos + 1, dtype=np.int32)
+
+    def chaves():
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, max_row_buffer=CHUNK_SIZE).execute(
+                text('SELECT id, chave FROM rede.no ORDER BY chave COLLATE "C"')
+            )
+            for i, (id_no, chave) in enumerate(result):
+                posicao[id_no] = i
+                yield chave
+
+    wait_for_ram()
+    blob, offsets = GrafoCSR.codificar_chaves(chaves())
+
+    # Arestas lidas em blocos direto para arrays pré-alocados
+    origem = np.empty(total_arestas, dtype=np.int32)
+    destino = np.empty(total_arestas, dtype=np.int32)
+    tipo = np.empty(total_arestas, dtype=np.int16)
+    lidas = 0
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=CHUNK_SIZE).execute(
+            text("SELECT id1, id2, tipo FROM rede.ligacao_id")
+        )
+        for bloco in result.partitions(CHUNK_SIZE):
+            dados = np.array(bloco, dtype=np.int64)
+            fim = lidas + len(dados)
+            origem[lidas:fim] = posicao[dados[:, 0]]
+            destino[lidas:fim] = posicao[dados[:, 1]]
+            tipo[lidas:fim] = dados[:, 2] - 1
+            lidas = fim
+    del posicao
+
+    grafo = GrafoCSR.construir(blob, offsets, origem[:lidas], destino[:lidas], tipo[:lidas], tipos)
+    grafo.salvar(pasta)
+    print(f"Grafo CSR gerado: {grafo.total_nos:,} nós, {grafo.total_arestas:,} arestas, "
+          f"{GrafoCSR.tamanho_em_disco(pasta) / 1024 / 1024:.0f} MB")
+
 # ============ FUNÇÃO PRINCIPAL ============
 
 def main():
@@ -905,6 +1455,8 @@ def main():
         # Criar tabelas principais
         print("\n[4/10] Criando estrutura das tabelas...")
         criar_tabelas_principais(engine)
+        if ETE_INCREMENTAL:
+            limpar_tabelas_principais(engine)
         
         # Carregar tabelas de código
         print("\n[5/10] Carregando tabelas auxiliares...")
@@ -953,18 +1505,34 @@ def main():
         
         # Processar endereços, telefones e emails
         print("\n[9/10] Processando links ETE...")
-        processar_enderecos(engine)
-        processar_telefones(engine)
-        processar_emails(engine)
-        criar_links_ete(engine)
+        if ETE_INCREMENTAL and estado_ete_existe(engine):
+            atualizar_links_ete_incremental(engine)
+        else:
+            processar_enderecos(engine)
+            processar_telefones(engine)
+            processar_emails(engine)
+            criar_links_ete(engine)
+        criar_atributos_compartilhados(engine)
         
         # Criar tabelas de rede
         print("\n[10/10] Criando rede de relacionamentos...")
         criar_tabela_ligacao(engine)
+        criar_ids_inteiros_rede(engine)
+        criar_tabela_grau(engine)
+        criar_grupos_economicos(engine)
+        criar_centralidade(engine)
         criar_tabela_busca(engine)
         criar_views_auxiliares(engine)
         adicionar_estatisticas(engine)
         
+        if GERAR_SNAPSHOT:
+            print("\nGerando snapshot somente-leitura...")
+            gerar_snapshot_cnpj(engine)
+        
+        if GERAR_GRAFO_CSR:
+            print("\nGerando grafo CSR da rede...")
+            gerar_grafo_csr(engine)
+        
         # Análise e vacuum
         print("\nOtimizando banco de dados...")
         with engine.begin() as conn: